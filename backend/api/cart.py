@@ -0,0 +1,434 @@
+"""
+Add-to-cart engines.
+
+`upsert` (default) gets or creates the cart and increments the item in one
+statement. A data-modifying CTE runs `INSERT ... ON CONFLICT (user_id)` on
+the cart and `INSERT ... ON CONFLICT (cart_id, product_id) DO UPDATE` on the
+item, and the RETURNING clause hands back the product row for the response.
+That makes it a single round trip with no explicit transaction and no retry
+loop: conflicting concurrent adds are resolved by PostgreSQL.
+
+`locking` is the previous implementation. It locks the cart and item rows
+with SELECT ... FOR UPDATE and retries on IntegrityError. It is kept for
+comparison (see benchmark_cart.py).
+
+`apply_cart_batch` applies a list of add / set / remove entries in one
+transaction, with one cart lock and one timestamp update.
+
+`cart_summary` computes the item count and total with one aggregate query.
+
+With STOCK_RESERVATIONS on, the upsert also takes the quantity out of stock
+into a hold (api.reservations) in the same statement. Sharded products
+(api.stock_slots) are checked against the sum of their slots.
+"""
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import BigIntegerField, Count, F, Sum
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from .db_retry import is_retryable
+from .models import Cart, CartItem, Product, StockReservation, StockSlot
+from .reservations import (
+    record_stock_changes,
+    release_reservations,
+    reservation_ttl,
+    reservations_enabled,
+)
+from .stock_slots import available_stock_sql, with_slot_stock
+
+CART_ENGINE_UPSERT = "upsert"
+CART_ENGINE_LOCKING = "locking"
+
+OP_ADD = "add"
+OP_SET = "set"
+OP_REMOVE = "remove"
+CART_OPS = (OP_ADD, OP_SET, OP_REMOVE)
+
+
+class CartError(Exception):
+    """A cart mutation failure with the HTTP status the API reports."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def get_cart_engine():
+    return getattr(settings, "CART_ADD_ENGINE", CART_ENGINE_UPSERT)
+
+
+def cart_batch_max_items():
+    return getattr(settings, "CART_BATCH_MAX_ITEMS", 100)
+
+
+def cart_summary(user):
+    """Item count, distinct products and total of the user's cart (one query)."""
+    return CartItem.objects.filter(cart__user=user).aggregate(
+        item_count=Coalesce(Sum("quantity"), 0),
+        # (cart, product) is unique
+        product_count=Count("id"),
+        # bigint: price * quantity can overflow integer
+        total=Coalesce(Sum(Cast("quantity", BigIntegerField()) * F("product__price")), 0),
+    )
+
+
+def add_to_cart(user, product_id, quantity, engine=None):
+    """
+    Add `quantity` of a product to the user's cart and return the CartItem
+    (with `product` loaded). Raises CartError when the product does not
+    exist (404) or is out of stock (409); deadlocks and lock timeouts are
+    raised as is, for `api.db_retry.retry_on_conflict` to re-run.
+    """
+    engine = engine or get_cart_engine()
+    if engine == CART_ENGINE_LOCKING:
+        return _add_locking(user, product_id, quantity)
+    return _add_upsert(user, product_id, quantity)
+
+
+def _upsert_sql():
+    product = Product._meta.db_table
+    cart = Cart._meta.db_table
+    item = CartItem._meta.db_table
+    available = available_stock_sql("product")
+    # Nothing is written unless the product exists and is in stock: both
+    # inserts select from the `product` CTE.
+    return f"""
+        WITH product AS (
+            SELECT id, name, price, {available} AS stock, category_id
+            FROM {product} AS product
+            WHERE id = %(product_id)s AND {available} > 0
+        ), cart AS (
+            INSERT INTO {cart} (user_id, created_at, updated_at)
+            SELECT %(user_id)s, %(now)s, %(now)s FROM product
+            ON CONFLICT (user_id) DO UPDATE SET updated_at = EXCLUDED.updated_at
+            RETURNING id
+        ), item AS (
+            INSERT INTO {item} (cart_id, product_id, quantity)
+            SELECT cart.id, product.id, %(quantity)s FROM cart, product
+            ON CONFLICT (cart_id, product_id)
+            DO UPDATE SET quantity = {item}.quantity + EXCLUDED.quantity
+            RETURNING id, cart_id, quantity
+        )
+        SELECT item.id, item.cart_id, item.quantity,
+               product.id, product.name, product.price, product.stock, product.category_id,
+               FALSE
+        FROM item, product
+    """
+
+
+def _reserve_sql():
+    product = Product._meta.db_table
+    cart = Cart._meta.db_table
+    item = CartItem._meta.db_table
+    reservation = StockReservation._meta.db_table
+    slot = StockSlot._meta.db_table
+    available = available_stock_sql("product")
+    # The `reserved` CTE takes the quantity out of stock (locking the row),
+    # so nothing is written unless stock covers all of it. Sharded products
+    # (api.stock_slots) are not reserved: checkout takes from their slots.
+    return f"""
+        WITH reserved AS (
+            UPDATE {product}
+            SET stock = stock - %(quantity)s
+            WHERE id = %(product_id)s AND stock >= %(quantity)s
+              AND NOT EXISTS (SELECT 1 FROM {slot} WHERE product_id = %(product_id)s)
+            RETURNING id, name, price, stock, category_id
+        ), product AS (
+            SELECT reserved.*, TRUE AS held FROM reserved
+            UNION ALL
+            SELECT id, name, price, {available}, category_id, FALSE
+            FROM {product} AS product
+            WHERE id = %(product_id)s
+              AND EXISTS (SELECT 1 FROM {slot} WHERE product_id = %(product_id)s)
+              AND {available} > 0
+        ), cart AS (
+            INSERT INTO {cart} (user_id, created_at, updated_at)
+            SELECT %(user_id)s, %(now)s, %(now)s FROM product
+            ON CONFLICT (user_id) DO UPDATE SET updated_at = EXCLUDED.updated_at
+            RETURNING id
+        ), item AS (
+            INSERT INTO {item} (cart_id, product_id, quantity)
+            SELECT cart.id, product.id, %(quantity)s FROM cart, product
+            ON CONFLICT (cart_id, product_id)
+            DO UPDATE SET quantity = {item}.quantity + EXCLUDED.quantity
+            RETURNING id, cart_id, quantity
+        ), hold AS (
+            INSERT INTO {reservation} (cart_id, product_id, quantity, expires_at)
+            SELECT cart.id, product.id, %(quantity)s, %(expires_at)s FROM cart, product
+            WHERE product.held
+            ON CONFLICT (cart_id, product_id)
+            DO UPDATE SET quantity = {reservation}.quantity + EXCLUDED.quantity,
+                          expires_at = EXCLUDED.expires_at
+        )
+        SELECT item.id, item.cart_id, item.quantity,
+               product.id, product.name, product.price, product.stock, product.category_id,
+               product.held
+        FROM item, product
+    """
+
+
+def _add_upsert(user, product_id, quantity):
+    now = timezone.now()
+    params = {
+        "product_id": product_id,
+        "user_id": user.pk,
+        "quantity": quantity,
+        "now": now,
+    }
+    reserve = reservations_enabled()
+    if reserve:
+        params["expires_at"] = now + timedelta(seconds=reservation_ttl())
+    # Autocommit makes the single statement atomic on its own; inside an
+    # outer transaction a savepoint keeps a failure from poisoning it.
+    savepoint = transaction.atomic() if connection.in_atomic_block else nullcontext()
+    try:
+        with savepoint, connection.cursor() as cursor:
+            cursor.execute(_reserve_sql() if reserve else _upsert_sql(), params)
+            row = cursor.fetchone()
+    except IntegrityError:
+        # the product was deleted between the read and the insert
+        raise CartError("Product not found", 404)
+    except DatabaseError as exc:
+        if is_retryable(exc):
+            raise
+        raise CartError("Database conflict, please retry", 409)
+
+    if row is None:
+        if Product.objects.filter(pk=product_id).exists():
+            raise CartError("Not enough stock", 409)
+        raise CartError("Product not found", 404)
+
+    item_id, cart_id, item_quantity, *product_row, held = row
+    product = Product(
+        id=product_row[0],
+        name=product_row[1],
+        price=product_row[2],
+        stock=product_row[3],
+        category_id=product_row[4],
+    )
+    if held:
+        record_stock_changes([(product.id, product.price, product.category_id, -quantity)])
+    return CartItem(id=item_id, cart_id=cart_id, product=product, quantity=item_quantity)
+
+
+def _add_locking(user, product_id, quantity):
+    try:
+        product = Product.objects.get(pk=product_id)
+    except Product.DoesNotExist:
+        raise CartError("Product not found", 404)
+
+    if product.stock <= 0:
+        raise CartError("Not enough stock", 409)
+
+    # Always lock the cart first (consistent lock order, no deadlock)
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                cart = (
+                    Cart.objects
+                    .select_for_update()
+                    .filter(user=user)
+                    .first()
+                )
+                if not cart:
+                    cart = Cart.objects.create(user=user)
+
+                cart_item = (
+                    CartItem.objects
+                    .select_for_update()
+                    .filter(cart=cart, product=product)
+                    .order_by("id")
+                    .first()
+                )
+
+                if cart_item:
+                    CartItem.objects.filter(id=cart_item.id).update(
+                        quantity=F('quantity') + quantity
+                    )
+                    cart_item.refresh_from_db()
+                else:
+                    cart_item = CartItem.objects.create(
+                        cart=cart,
+                        product=product,
+                        quantity=quantity
+                    )
+
+                Cart.objects.filter(id=cart.id).update(updated_at=timezone.now())
+                return cart_item
+
+        except IntegrityError:
+            continue
+        except DatabaseError as exc:
+            if is_retryable(exc):
+                raise
+            raise CartError("Database conflict, please retry", 409)
+
+    raise CartError("Concurrency conflict, please retry", 409)
+
+
+def set_cart_item_quantity(item, quantity):
+    """Set the item's quantity and touch its cart, in one transaction."""
+    with transaction.atomic():
+        item.quantity = quantity
+        item.save()
+        Cart.objects.filter(id=item.cart_id).update(updated_at=timezone.now())
+
+
+def remove_cart_item(item):
+    """Delete the item, touch its cart and give back its stock hold."""
+    with transaction.atomic():
+        item.delete()
+        Cart.objects.filter(id=item.cart_id).update(updated_at=timezone.now())
+        if reservations_enabled():
+            release_reservations([item.cart_id], [item.product_id])
+
+
+# ---- batch mutations ----
+
+def parse_cart_entry(entry):
+    """Validate one batch entry into `(product_id, quantity, op)`."""
+    if not isinstance(entry, dict):
+        raise CartError("entry must be an object", 400)
+
+    op = entry.get("op", OP_ADD)
+    if op not in CART_OPS:
+        raise CartError(f"op must be one of: {', '.join(CART_OPS)}", 400)
+
+    try:
+        product_id = int(entry.get("product_id"))
+    except (TypeError, ValueError):
+        raise CartError("product_id must be a valid integer", 400)
+
+    if op == OP_REMOVE:
+        return product_id, None, op
+
+    try:
+        quantity = int(entry.get("quantity", 0))
+    except (TypeError, ValueError):
+        raise CartError("quantity must be a positive integer", 400)
+    if quantity <= 0:
+        raise CartError("quantity must be a positive integer", 400)
+    return product_id, quantity, op
+
+
+def _batch_error(index, entry, exc):
+    product_id = entry.get("product_id") if isinstance(entry, dict) else None
+    return {"index": index, "product_id": product_id, "error": exc.message, "status": exc.status}
+
+
+def _lock_cart_sql():
+    cart = Cart._meta.db_table
+    # creates the cart or locks its row, setting updated_at once either way
+    return f"""
+        INSERT INTO {cart} (user_id, created_at, updated_at)
+        VALUES (%(user_id)s, %(now)s, %(now)s)
+        ON CONFLICT (user_id) DO UPDATE SET updated_at = EXCLUDED.updated_at
+        RETURNING id
+    """
+
+
+def apply_cart_batch(user, entries, atomic=False):
+    """
+    Apply `entries` (`{product_id, quantity, op}` dicts) to the user's cart in
+    order and return the per-entry errors as `{index, product_id, error,
+    status}` dicts.
+
+    Entries that fail are skipped and the rest are applied. With `atomic`,
+    any error leaves the cart untouched. If nothing is applied, the cart lock
+    and timestamp update are rolled back as well.
+    """
+    errors = []
+    parsed = []
+    for index, entry in enumerate(entries):
+        try:
+            parsed.append((index, entry, *parse_cart_entry(entry)))
+        except CartError as exc:
+            errors.append(_batch_error(index, entry, exc))
+    if atomic and errors:
+        return errors
+
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(_lock_cart_sql(), {"user_id": user.pk, "now": timezone.now()})
+                cart_id = cursor.fetchone()[0]
+
+            product_ids = {product_id for _, _, product_id, _, _ in parsed}
+            # sharded products are checked against their slots' total
+            products = with_slot_stock(Product.objects).in_bulk(product_ids)
+            existing = {
+                item.product_id: item
+                for item in CartItem.objects.filter(cart_id=cart_id, product_id__in=product_ids)
+            }
+            original = {product_id: item.quantity for product_id, item in existing.items()}
+            items = dict(existing)
+
+            applied = 0
+            for index, entry, product_id, quantity, op in parsed:
+                try:
+                    _apply_entry(cart_id, items, existing, products, product_id, quantity, op)
+                    applied += 1
+                except CartError as exc:
+                    errors.append(_batch_error(index, entry, exc))
+
+            if not applied or (atomic and errors):
+                transaction.set_rollback(True)
+                return sorted(errors, key=lambda error: error["index"])
+
+            _write_items(items, existing, original)
+    except DatabaseError as exc:
+        if is_retryable(exc):
+            raise
+        raise CartError("Database conflict, please retry", 409)
+
+    return sorted(errors, key=lambda error: error["index"])
+
+
+def _apply_entry(cart_id, items, existing, products, product_id, quantity, op):
+    item = items.get(product_id)
+    if op == OP_REMOVE:
+        if item is None:
+            raise CartError("Cart item not found", 404)
+        items[product_id] = None
+        return
+
+    product = products.get(product_id)
+    if product is None:
+        raise CartError("Product not found", 404)
+    stock = product.stock if product.slot_stock is None else product.slot_stock
+    if stock <= 0:
+        raise CartError("Not enough stock", 409)
+
+    if item is None and product_id in existing:
+        # removed earlier in the batch: its row is reused, not inserted again
+        item = items[product_id] = existing[product_id]
+        item.quantity = quantity
+    elif item is None:
+        items[product_id] = CartItem(cart_id=cart_id, product=product, quantity=quantity)
+    elif op == OP_ADD:
+        item.quantity += quantity
+    else:
+        item.quantity = quantity
+
+
+def _write_items(items, existing, original):
+    removed = {pid: existing[pid] for pid, item in items.items() if item is None and pid in existing}
+    created = [item for item in items.values() if item is not None and item.pk is None]
+    updated = [
+        item for pid, item in items.items()
+        if item is not None and item.pk is not None and item.quantity != original[pid]
+    ]
+    if removed:
+        CartItem.objects.filter(pk__in=[item.pk for item in removed.values()]).delete()
+        if reservations_enabled():
+            cart_id = next(iter(removed.values())).cart_id
+            release_reservations([cart_id], removed)
+    if created:
+        CartItem.objects.bulk_create(created)
+    if updated:
+        CartItem.objects.bulk_update(updated, ["quantity"])
@@ -0,0 +1,159 @@
+"""
+Checkout: turn the user's cart into an order.
+
+Stock is decremented by one set-based statement whatever the cart size. It
+deletes the cart items, locks their products in id order, and decrements
+every product whose stock covers the quantity
+(`UPDATE ... FROM items WHERE stock >= quantity RETURNING ...`). Each cart
+item comes back with a flag saying whether its product was decremented, so
+a shortfall is detected from the returned rows. The transaction is then
+rolled back and the cart restored.
+
+Stock already held for the cart (api.reservations) is consumed by the same
+statement: only the quantity its holds do not cover is taken from stock, and
+any surplus hold is given back. With every item fully held, no product row
+is written at all.
+
+Sharded products (api.stock_slots) never lock their product row: once the
+statement has run, `take_from_slots` takes their quantities from their
+slots. A shortfall is reported only when the slots' total is short.
+
+Product rows are locked from that statement until commit, which is a
+constant few round trips: the order insert, the order items bulk insert and
+the cart timestamp update.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Cart, CartItem, Order, OrderItem, Product, StockReservation, StockSlot
+from .reservations import record_stock_changes
+from .response_cache import bump_user_version
+from .stock_slots import take_from_slots
+
+
+class CheckoutError(Exception):
+    """A checkout failure with the HTTP status the API reports."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _decrement_sql():
+    product = Product._meta.db_table
+    item = CartItem._meta.db_table
+    reservation = StockReservation._meta.db_table
+    slot = StockSlot._meta.db_table
+    return f"""
+        WITH items AS (
+            DELETE FROM {item} WHERE cart_id = %(cart_id)s
+            RETURNING id, product_id, quantity
+        ), held AS (
+            DELETE FROM {reservation} WHERE cart_id = %(cart_id)s
+            RETURNING product_id, quantity
+        ), needs AS (
+            -- what stock still has to give: negative for a hold larger than
+            -- the cart item (or one without an item), which goes back
+            SELECT COALESCE(items.product_id, held.product_id) AS product_id,
+                   COALESCE(items.quantity, 0) - COALESCE(held.quantity, 0) AS quantity
+            FROM items FULL JOIN held ON held.product_id = items.product_id
+        ), sharded AS (
+            SELECT DISTINCT product_id FROM {slot}
+            WHERE product_id IN (SELECT product_id FROM needs)
+        ), locked AS (
+            -- row locks taken in id order: concurrent checkouts cannot deadlock
+            SELECT id FROM {product}
+            WHERE id IN (
+                SELECT product_id FROM needs
+                WHERE quantity <> 0 AND product_id NOT IN (SELECT product_id FROM sharded)
+            )
+            ORDER BY id
+            FOR UPDATE
+        ), updated AS (
+            UPDATE {product} AS product
+            SET stock = product.stock - needs.quantity
+            FROM needs, locked
+            WHERE product.id = needs.product_id
+              AND locked.id = product.id
+              AND product.stock >= needs.quantity
+            RETURNING product.id
+        )
+        SELECT items.quantity, needs.quantity,
+               needs.quantity = 0 OR updated.id IS NOT NULL,
+               sharded.product_id IS NOT NULL,
+               product.id, product.name, product.price, product.category_id
+        FROM needs
+        JOIN {product} AS product ON product.id = needs.product_id
+        LEFT JOIN items ON items.product_id = needs.product_id
+        LEFT JOIN updated ON updated.id = needs.product_id
+        LEFT JOIN sharded ON sharded.product_id = needs.product_id
+        ORDER BY items.id NULLS LAST
+    """
+
+
+def checkout(user):
+    """
+    Create an order from the user's cart, decrement stock and empty the cart.
+
+    Returns `(order, order_items)`. Raises CheckoutError for an empty cart or
+    a stock shortfall; nothing is changed in either case.
+    """
+    with transaction.atomic():
+        cart = Cart.objects.select_for_update().filter(user=user).first()
+        if not cart:
+            raise CheckoutError("Cart is empty", 400)
+
+        with connection.cursor() as cursor:
+            cursor.execute(_decrement_sql(), {"cart_id": cart.id})
+            rows = cursor.fetchall()
+
+        if not any(quantity for quantity, *_ in rows):
+            raise CheckoutError("Cart is empty", 400)
+
+        uncovered = [
+            (product_id, stock_change, sharded)
+            for _, stock_change, covered, sharded, product_id, *_ in rows
+            if not covered
+        ]
+        if uncovered and all(sharded for *_, sharded in uncovered):
+            taken = take_from_slots({product_id: change for product_id, change, _ in uncovered})
+            uncovered = [entry for entry in uncovered if entry[0] not in taken]
+        if uncovered:
+            # rolls back the decrements and restores the cart items
+            raise CheckoutError("Checkout failed (concurrency/stock)", 400)
+
+        order_items = []
+        total = 0
+        for quantity, _, _, _, _, name, price, _ in rows:
+            if not quantity:
+                # a hold without a cart item, given back above
+                continue
+            order_items.append(OrderItem(product_name=name, price=price, quantity=quantity))
+            total += price * quantity
+
+        order = Order.objects.create(
+            user=user,
+            total=total,
+            item_count=sum(order_item.quantity for order_item in order_items),
+        )
+        for order_item in order_items:
+            order_item.order = order
+        OrderItem.objects.bulk_create(order_items)
+
+        Cart.objects.filter(id=cart.id).update(updated_at=timezone.now())
+
+        # Statistics rows are shared by every checkout: they are updated after
+        # commit so their row locks are not held alongside the product locks.
+        # Sharded products' copies in Product.stock are left to rebalancing.
+        record_stock_changes(
+            [
+                (product_id, price, category_id, -stock_change)
+                for _, stock_change, _, sharded, product_id, _, price, category_id in rows
+                if not sharded
+            ],
+            uncounted=[row[4] for row in rows if row[3] and row[1]],
+        )
+        bump_user_version(user.pk)
+
+    return order, order_items
@@ -0,0 +1,110 @@
+"""
+Asynchronous checkout (CHECKOUT_ASYNC).
+
+`POST /api/orders/` checks that the cart is not empty, inserts a
+CheckoutTicket and answers 202 with it, so the web worker is free at once.
+A user has at most one pending ticket; posting again returns it.
+
+`process_checkout_batch` (run by `manage.py process_checkout_queue`, any
+number of processes or threads) claims up to CHECKOUT_QUEUE_BATCH pending
+tickets with `FOR UPDATE SKIP LOCKED` and runs them in one transaction:
+
+* every product in the claimed carts is locked once, in id order, so the
+  tickets that share a hot product pay for its lock once per batch instead of
+  once per checkout;
+* each ticket then runs `api.checkout.checkout` in a savepoint, so the stock
+  checks and oversell guarantees are those of the synchronous path, and a
+  failing ticket is rolled back alone;
+* one commit covers the whole batch.
+
+Tickets are processed in id order. A ticket records its order, or the error
+and status the synchronous checkout would have returned. A worker that dies
+mid-batch leaves its tickets pending.
+"""
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+
+from .checkout import CheckoutError, checkout
+from .models import CartItem, CheckoutTicket, Product
+
+
+def checkout_async_enabled():
+    return getattr(settings, "CHECKOUT_ASYNC", False)
+
+
+def checkout_batch_size():
+    return getattr(settings, "CHECKOUT_QUEUE_BATCH", 50)
+
+
+def enqueue_checkout(user):
+    """
+    Queue a checkout of the user's cart. Returns `(ticket, created)`; an
+    already pending ticket is returned as is. Raises CheckoutError for an
+    empty cart.
+    """
+    if not CartItem.objects.filter(cart__user=user).exists():
+        raise CheckoutError("Cart is empty", 400)
+    try:
+        with transaction.atomic():
+            return CheckoutTicket.objects.create(user=user), True
+    except IntegrityError:
+        # api_checkoutticket_one_pending
+        pending = CheckoutTicket.objects.filter(user=user, status=CheckoutTicket.PENDING).first()
+        if pending is None:
+            # processed in between: queue a new one
+            return CheckoutTicket.objects.create(user=user), True
+        return pending, False
+
+
+def _process(ticket):
+    try:
+        order, _ = checkout(ticket.user)
+    except CheckoutError as exc:
+        ticket.status = CheckoutTicket.FAILED
+        ticket.error = exc.message
+        ticket.error_status = exc.status
+    except DatabaseError:
+        ticket.status = CheckoutTicket.FAILED
+        ticket.error = "Checkout conflict, please retry"
+        ticket.error_status = 409
+    else:
+        ticket.status = CheckoutTicket.DONE
+        ticket.order = order
+    ticket.processed_at = timezone.now()
+
+
+def process_checkout_batch(batch_size=None):
+    """Process one batch of pending tickets. Returns the number processed."""
+    batch_size = batch_size or checkout_batch_size()
+    with transaction.atomic():
+        tickets = list(
+            CheckoutTicket.objects
+            .select_for_update(skip_locked=True, of=("self",))
+            .select_related("user")
+            .filter(status=CheckoutTicket.PENDING)
+            .order_by("id")[:batch_size]
+        )
+        if not tickets:
+            return 0
+
+        product_ids = (
+            CartItem.objects
+            .filter(cart__user_id__in=[ticket.user_id for ticket in tickets])
+            .values("product_id")
+        )
+        list(
+            Product.objects
+            .select_for_update()
+            .filter(pk__in=product_ids)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+
+        for ticket in tickets:
+            _process(ticket)
+        CheckoutTicket.objects.bulk_update(
+            tickets,
+            ["status", "order", "error", "error_status", "processed_at"],
+        )
+    return len(tickets)
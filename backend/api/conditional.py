@@ -0,0 +1,63 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from .models import CatalogVersion
+
+SAFE_METHODS = ("GET", "HEAD")
+
+
+def bump_catalog_version(*names):
+    """Invalidate ETags of every endpoint depending on the given tables."""
+    now = timezone.now()
+    for name in sorted(names):
+        updated = CatalogVersion.objects.filter(name=name).update(
+            version=F("version") + 1,
+            updated_at=now,
+        )
+        if updated:
+            continue
+        try:
+            with transaction.atomic():
+                CatalogVersion.objects.create(name=name, version=1)
+        except IntegrityError:
+            CatalogVersion.objects.filter(name=name).update(version=F("version") + 1, updated_at=now)
+
+
+def get_catalog_versions(request, names):
+    """Versions for `names`, read once per request."""
+    cache = getattr(request, "_catalog_versions", None)
+    if cache is None or cache[0] != names:
+        rows = {
+            row["name"]: (row["version"], row["updated_at"])
+            for row in CatalogVersion.objects.filter(name__in=names).values("name", "version", "updated_at")
+        }
+        cache = (names, [rows.get(name, (0, None)) for name in names])
+        request._catalog_versions = cache
+    return cache[1]
+
+
+def catalog_condition(*names):
+    """
+    Conditional GET for catalog views.
+
+    The ETag and Last-Modified values come from the CatalogVersion counters of
+    `names`, so a matching If-None-Match / If-Modified-Since is answered with
+    304 before the view queries, serializes or renders anything.
+    """
+    names = tuple(names)
+
+    def etag(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return None
+        versions = get_catalog_versions(request, names)
+        return "-".join(f"{name}.{version}" for name, (version, _) in zip(names, versions))
+
+    def last_modified(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return None
+        timestamps = [ts for _, ts in get_catalog_versions(request, names) if ts is not None]
+        return max(timestamps) if timestamps else None
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
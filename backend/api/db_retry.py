@@ -0,0 +1,152 @@
+"""
+Server-side retry of transactions that lost a lock race.
+
+`retry_on_conflict` re-runs a view whose transaction failed with a
+deadlock (40P01), a serialization failure (40001) or a lock timeout (55P03),
+after a jittered exponential backoff: up to DB_RETRY_ATTEMPTS extra runs,
+sleeping a random time below DB_RETRY_BACKOFF_MS * 2**n, capped at
+DB_RETRY_MAX_BACKOFF_MS. PostgreSQL has already rolled the failed
+transaction back, so the client gets the result of a clean run instead of a
+409 and a network round trip.
+
+The decorated view's writes must be transactions of their own (an atomic
+block, or a single autocommit statement), so that a failed run leaves
+nothing behind. Inside an outer transaction (e.g. `idempotent`) the failed
+block is a savepoint: deadlocks and lock timeouts are still retried, a
+serialization failure is not, as the snapshot would fail again.
+
+Any other DatabaseError, and a conflict still failing after the last retry,
+is answered with 409 as before. Retries are counted per view in the cache
+(`get_retry_counters`).
+"""
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from rest_framework.response import Response
+
+SERIALIZATION_FAILURE = "40001"
+DEADLOCK_DETECTED = "40P01"
+LOCK_NOT_AVAILABLE = "55P03"
+RETRYABLE_SQLSTATES = (SERIALIZATION_FAILURE, DEADLOCK_DETECTED, LOCK_NOT_AVAILABLE)
+
+COUNTER_KEY_PREFIX = "dbretry"
+RETRIED = "retried"
+RECOVERED = "recovered"
+EXHAUSTED = "exhausted"
+COUNTER_EVENTS = (RETRIED, RECOVERED, EXHAUSTED)
+
+# view name -> registered by retry_on_conflict, read by get_retry_counters
+_retrying_views = set()
+
+
+def retry_attempts():
+    return getattr(settings, "DB_RETRY_ATTEMPTS", 3)
+
+
+def retry_backoff():
+    """(base, cap) of the backoff, in seconds."""
+    return (
+        getattr(settings, "DB_RETRY_BACKOFF_MS", 10) / 1000,
+        getattr(settings, "DB_RETRY_MAX_BACKOFF_MS", 200) / 1000,
+    )
+
+
+def sqlstate(exc):
+    """SQLSTATE of the driver error behind a Django DatabaseError, if any."""
+    while exc is not None:
+        code = getattr(exc, "sqlstate", None)
+        if code:
+            return code
+        exc = exc.__cause__
+    return None
+
+
+def is_retryable(exc):
+    return sqlstate(exc) in RETRYABLE_SQLSTATES
+
+
+def _can_retry(exc):
+    if not is_retryable(exc):
+        return False
+    if connection.in_atomic_block:
+        # only the savepoint was rolled back
+        return not connection.needs_rollback and sqlstate(exc) != SERIALIZATION_FAILURE
+    return True
+
+
+def _sleep(attempt):
+    base, cap = retry_backoff()
+    time.sleep(random.uniform(0, min(cap, base * 2 ** attempt)))
+
+
+def _counter_key(view_name, event):
+    return f"{COUNTER_KEY_PREFIX}:{view_name}:{event}"
+
+
+def _record(view_name, event):
+    key = _counter_key(view_name, event)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_retry_counters():
+    """Retried / recovered / exhausted counts per retrying view."""
+    keys = {
+        _counter_key(view_name, event): (view_name, event)
+        for view_name in _retrying_views
+        for event in COUNTER_EVENTS
+    }
+    found = cache.get_many(list(keys))
+    counters = {view_name: dict.fromkeys(COUNTER_EVENTS, 0) for view_name in _retrying_views}
+    for key, (view_name, event) in keys.items():
+        counters[view_name][event] = found.get(key, 0)
+    return counters
+
+
+def reset_retry_counters():
+    cache.delete_many([
+        _counter_key(view_name, event)
+        for view_name in _retrying_views
+        for event in COUNTER_EVENTS
+    ])
+
+
+def retry_on_conflict(message="Database conflict, please retry"):
+    """
+    Re-run the decorated view on deadlock / serialization / lock timeout
+    errors; answer any DatabaseError left with `message` and 409. Apply
+    directly above the view function.
+    """
+    def decorator(view_func):
+        view_name = view_func.__name__
+        _retrying_views.add(view_name)
+
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            attempt = 0
+            while True:
+                try:
+                    response = view_func(request, *args, **kwargs)
+                except DatabaseError as exc:
+                    if not _can_retry(exc):
+                        break
+                    if attempt >= retry_attempts():
+                        _record(view_name, EXHAUSTED)
+                        break
+                    _record(view_name, RETRIED)
+                    _sleep(attempt)
+                    attempt += 1
+                    continue
+                if attempt:
+                    _record(view_name, RECOVERED)
+                return response
+            return Response({"error": message}, status=409)
+        return wrapped
+    return decorator
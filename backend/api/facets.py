@@ -0,0 +1,104 @@
+"""
+Facet counts for the product list (`GET /api/products/?facets=1`).
+
+Counts per category, per price bucket and for in / out of stock come from one
+grouped query over the search hits: rows are grouped by category, price
+bucket, stock flag and whether the price is inside the requested
+`min_price`/`max_price` range. The facets are then summed from those few
+groups in Python.
+
+Each facet ignores its own filter and applies the others, so a storefront
+can show the count of every category next to the selected one, and the
+price histogram is not clipped to the selected range.
+"""
+from django.conf import settings
+from django.db.models import BooleanField, Case, Count, ExpressionWrapper, IntegerField, Q, Value, When
+
+FACETS_QUERY_PARAM = "facets"
+
+# Lower bounds of the price buckets after the first one (VND).
+DEFAULT_PRICE_BUCKETS = (1000000, 5000000, 10000000, 20000000, 50000000)
+
+
+def wants_facets(request):
+    """True when the client asked for facet counts (`?facets=1`)."""
+    value = request.query_params.get(FACETS_QUERY_PARAM, "")
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def price_bucket_bounds():
+    return sorted(getattr(settings, "PRODUCT_FACET_PRICE_BUCKETS", DEFAULT_PRICE_BUCKETS))
+
+
+def _price_bucket(bounds):
+    whens = [When(price__lt=bound, then=Value(index)) for index, bound in enumerate(bounds)]
+    return Case(*whens, default=Value(len(bounds)), output_field=IntegerField())
+
+
+def _price_range(min_price, max_price):
+    condition = Q()
+    if min_price is not None:
+        condition &= Q(price__gte=min_price)
+    if max_price is not None:
+        condition &= Q(price__lte=max_price)
+    if not condition:
+        return Value(True)
+    return ExpressionWrapper(condition, output_field=BooleanField())
+
+
+def product_facets(queryset, category_id=None, min_price=None, max_price=None, in_stock=None):
+    """
+    Return `(count, facets)` for `queryset` (the search hits, before the
+    category / price / stock filters). `count` is the number of products
+    matching every filter.
+    """
+    bounds = price_bucket_bounds()
+    groups = (
+        queryset
+        .annotate(
+            price_bucket=_price_bucket(bounds),
+            is_in_stock=ExpressionWrapper(Q(stock__gt=0), output_field=BooleanField()),
+            in_price_range=_price_range(min_price, max_price),
+        )
+        .values("category_id", "category__name", "price_bucket", "is_in_stock", "in_price_range")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+
+    count = 0
+    categories = {}
+    price_counts = [0] * (len(bounds) + 1)
+    stock_counts = {"true": 0, "false": 0}
+
+    for group in groups:
+        category_ok = category_id is None or group["category_id"] == category_id
+        price_ok = group["in_price_range"]
+        stock_ok = in_stock is None or group["is_in_stock"] == in_stock
+
+        if price_ok and stock_ok:
+            entry = categories.setdefault(
+                group["category_id"],
+                {"id": group["category_id"], "name": group["category__name"], "count": 0},
+            )
+            entry["count"] += group["count"]
+        if category_ok and stock_ok:
+            price_counts[group["price_bucket"]] += group["count"]
+        if category_ok and price_ok:
+            stock_counts["true" if group["is_in_stock"] else "false"] += group["count"]
+        if category_ok and price_ok and stock_ok:
+            count += group["count"]
+
+    edges = [None, *bounds, None]
+    facets = {
+        # uncategorized (id None) last
+        "category": sorted(
+            categories.values(), key=lambda entry: (entry["id"] is None, entry["id"] or 0)
+        ),
+        # `min` inclusive, `max` exclusive; None means unbounded
+        "price": [
+            {"min": edges[index], "max": edges[index + 1], "count": bucket_count}
+            for index, bucket_count in enumerate(price_counts)
+        ],
+        "in_stock": stock_counts,
+    }
+    return count, facets
@@ -0,0 +1,159 @@
+"""
+Read-only fast path for serializers on hot GET endpoints.
+
+DRF resolves every field of every row through generic machinery
+(`get_attribute`, `PKOnlyObject`, `to_representation` dispatch, ReturnDict).
+`compile_serializer()` inspects a serializer's readable fields once and
+generates a plain function that builds the same dict with direct attribute
+reads. Fields it cannot specialize fall back to DRF's own field methods, so
+the rendered JSON is byte-identical to `Serializer(instance).data`.
+
+Use `serialize()` in views; FAST_SERIALIZERS=False switches back to DRF.
+"""
+from functools import cache
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import api_settings
+
+# DRF fields whose to_representation is a no-op for values loaded from
+# these model fields (int(int), str(str)).
+PASSTHROUGH_FIELDS = (
+    (serializers.IntegerField, (models.IntegerField, models.AutoField)),
+    (serializers.CharField, (models.CharField, models.TextField)),
+)
+
+
+def fast_serializers_enabled():
+    return getattr(settings, "FAST_SERIALIZERS", True)
+
+
+def serialize(serializer_class, instance, many=False):
+    """Equivalent of `serializer_class(instance, many=many).data` for reads."""
+    if not fast_serializers_enabled():
+        return serializer_class(instance, many=many).data
+    to_dict = compile_serializer(serializer_class)
+    # resolved once per call instead of once per datetime value
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+    if many:
+        return [to_dict(obj, tz) for obj in _iterable(instance)]
+    return to_dict(instance, tz)
+
+
+def _iterable(data):
+    # same rule as ListSerializer.to_representation
+    return data.all() if isinstance(data, models.manager.BaseManager) else data
+
+
+def _generic(field, obj):
+    # Serializer.to_representation for a single field
+    attribute = field.get_attribute(obj)
+    check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+    if check_for_none is None:
+        return None
+    return field.to_representation(attribute)
+
+
+def _model_field(serializer, source):
+    model = getattr(getattr(serializer, "Meta", None), "model", None)
+    if model is None:
+        return None
+    try:
+        return model._meta.get_field(source)
+    except FieldDoesNotExist:
+        return None
+
+
+def _is_passthrough(field, model_field):
+    return any(
+        type(field) is drf_type and isinstance(model_field, model_types)
+        for drf_type, model_types in PASSTHROUGH_FIELDS
+    )
+
+
+def _datetime_converter(field):
+    """
+    DateTimeField.to_representation taking the current timezone as an
+    argument, so it is looked up once per serialize() call.
+    """
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    if hasattr(field, "timezone") or output_format is None or output_format.lower() != ISO_8601:
+        return lambda value, tz: field.to_representation(value)
+
+    fallback = field.to_representation
+
+    def to_iso(value, tz):
+        if tz is None or isinstance(value, str) or value.utcoffset() is None:
+            return fallback(value)
+        text = value.astimezone(tz).isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+    return to_iso
+
+
+@cache
+def compile_serializer(serializer_class):
+    """
+    Return `to_dict(obj, tz)` producing `serializer_class(obj).data` as a dict;
+    `tz` is the current timezone (None without USE_TZ).
+    """
+    serializer = serializer_class()
+    namespace = {"_generic": _generic, "_iterable": _iterable}
+    body = []
+    items = []
+
+    for index, field in enumerate(serializer._readable_fields):
+        value = f"v{index}"
+        helper = f"c{index}"
+        source = field.source
+        simple = len(field.source_attrs) == 1 and source.isidentifier()
+        model_field = _model_field(serializer, source) if simple else None
+
+        if isinstance(field, serializers.SerializerMethodField):
+            namespace[helper] = getattr(serializer, field.method_name)
+            expr = f"{helper}(obj)"
+        elif isinstance(field, serializers.ListSerializer) and simple:
+            namespace[helper] = compile_serializer(type(field.child))
+            body.append(f"{value} = obj.{source}")
+            expr = f"None if {value} is None else [{helper}(item, tz) for item in _iterable({value})]"
+        elif isinstance(field, serializers.BaseSerializer) and simple:
+            namespace[helper] = compile_serializer(type(field))
+            body.append(f"{value} = obj.{source}")
+            expr = f"None if {value} is None else {helper}({value}, tz)"
+        elif (
+            isinstance(field, serializers.PrimaryKeyRelatedField)
+            and field.pk_field is None
+            and isinstance(model_field, models.ForeignKey)
+        ):
+            # the related pk is already on the row as <field>_id
+            body.append(f"{value} = obj.{model_field.attname}")
+            expr = value
+        elif model_field is not None and not model_field.is_relation:
+            body.append(f"{value} = obj.{model_field.attname}")
+            if _is_passthrough(field, model_field):
+                expr = value
+            else:
+                if type(field) is serializers.DateTimeField:
+                    namespace[helper] = _datetime_converter(field)
+                    expr = f"None if {value} is None else {helper}({value}, tz)"
+                else:
+                    namespace[helper] = field.to_representation
+                    expr = f"None if {value} is None else {helper}({value})"
+        else:
+            namespace[helper] = field
+            expr = f"_generic({helper}, obj)"
+
+        items.append(f"{field.field_name!r}: {expr}")
+
+    lines = ["def to_dict(obj, tz):"]
+    lines.extend(f"    {line}" for line in body)
+    lines.append("    return {" + ", ".join(items) + "}")
+    source_code = "\n".join(lines)
+    exec(compile(source_code, f"<compiled {serializer_class.__name__}>", "exec"), namespace)
+    to_dict = namespace["to_dict"]
+    to_dict.source = source_code
+    return to_dict
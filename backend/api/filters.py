@@ -1,6 +1,10 @@
 import django_filters
 from api.models import Category, Product
 
+# ProductFilter params honoured by GET /api/products/ (category and search
+# are handled by the view itself)
+PRODUCT_LIST_FILTERS = ("min_price", "max_price", "in_stock")
+
 class ProductFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(field_name="name", lookup_expr="icontains")
     min_price = django_filters.NumberFilter(field_name="price", lookup_expr="gte")
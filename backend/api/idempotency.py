@@ -0,0 +1,156 @@
+"""
+`Idempotency-Key` support for POSTs that must not run twice (checkout,
+payment creation).
+
+A POST with the header claims an IdempotencyKey row for (user, scope, key)
+and keeps it locked while the view runs, in the same transaction as the
+view's writes. The response is stored on the row, as compressed JSON, when
+that transaction commits. So:
+
+* a retry within IDEMPOTENCY_KEY_TTL seconds gets the stored response back
+  (with `Idempotent-Replayed: true`) and the view does not run;
+* a concurrent duplicate blocks on the row until the first request commits,
+  then gets its response;
+* if the first request fails with an exception, its claim is rolled back
+  with everything else and the retry runs the view.
+
+Responses that ask the client to retry (5xx, 409, 429) are not stored: the
+key is released so the retry runs the view again. Reusing a key with a
+different request body is rejected with 422.
+"""
+import hashlib
+import json
+import zlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+RETRY_STATUSES = (409, 429)
+
+
+def idempotency_ttl():
+    """Seconds a stored response is replayed for."""
+    return getattr(settings, "IDEMPOTENCY_KEY_TTL", 24 * 60 * 60)
+
+
+def _fingerprint(request):
+    payload = json.dumps(request.data, sort_keys=True, separators=(",", ":"), cls=DjangoJSONEncoder)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _claim_sql():
+    table = IdempotencyKey._meta.db_table
+    # Waits for a concurrent first request holding the same key to finish.
+    return f"""
+        INSERT INTO {table} (user_id, scope, key, fingerprint, created_at, expires_at)
+        VALUES (%(user_id)s, %(scope)s, %(key)s, %(fingerprint)s, %(now)s, %(expires_at)s)
+        ON CONFLICT (user_id, scope, key) DO NOTHING
+    """
+
+
+def _claim(user_id, scope, key, fingerprint):
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=idempotency_ttl())
+    with connection.cursor() as cursor:
+        cursor.execute(_claim_sql(), {
+            "user_id": user_id,
+            "scope": scope,
+            "key": key,
+            "fingerprint": fingerprint,
+            "now": now,
+            "expires_at": expires_at,
+        })
+    record = IdempotencyKey.objects.select_for_update().get(user_id=user_id, scope=scope, key=key)
+    if record.status_code is not None and record.expires_at <= now:
+        # expired: the key starts over
+        record.fingerprint = fingerprint
+        record.status_code = None
+        record.body = None
+        record.created_at = now
+        record.expires_at = expires_at
+    return record
+
+
+def _is_final(response):
+    status = response.status_code
+    return status < 500 and status not in RETRY_STATUSES and not getattr(response, "streaming", False)
+
+
+def _store(record, response):
+    if isinstance(response, Response):
+        # not rendered yet (below @api_view); the same renderer keeps the
+        # replay byte-for-byte equal, raw UTF-8 included
+        content = JSONRenderer().render(response.data)
+    else:
+        content = response.content
+    record.status_code = response.status_code
+    record.body = zlib.compress(content)
+    record.save()
+
+
+def _replay(record):
+    response = HttpResponse(
+        zlib.decompress(bytes(record.body)),
+        status=record.status_code,
+        content_type="application/json",
+    )
+    response[REPLAYED_HEADER] = "true"
+    return response
+
+
+def idempotent(scope):
+    """
+    Honour `Idempotency-Key` on POSTs to the decorated view. Keys are per
+    user and per `scope`. Apply below `@api_view` so the request is
+    authenticated; anonymous requests and requests without the header run
+    as usual.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER, "").strip()
+            if request.method != "POST" or not key or request.user.pk is None:
+                return view_func(request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {"error": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters"},
+                    status=400,
+                )
+
+            fingerprint = _fingerprint(request)
+            with transaction.atomic():
+                record = _claim(request.user.pk, scope, key, fingerprint)
+                if record.status_code is not None:
+                    if record.fingerprint != fingerprint:
+                        return Response(
+                            {"error": f"{IDEMPOTENCY_HEADER} was already used with a different request"},
+                            status=422,
+                        )
+                    return _replay(record)
+
+                response = view_func(request, *args, **kwargs)
+                if _is_final(response):
+                    _store(record, response)
+                else:
+                    record.delete()
+            return response
+        return wrapped
+    return decorator
+
+
+def delete_expired_keys(now=None):
+    """Drop stored responses past their TTL. Returns the number deleted."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
@@ -1,9 +1,14 @@
 from datetime import timedelta
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
 
+from api.idempotency import delete_expired_keys
 from api.models import Cart, CartItem, Payment
+from api.reservations import release_reservations
+from api.response_cache import purge_tags_on_commit, user_tag
+from api.webhook_inbox import delete_processed_events
 
 
 class Command(BaseCommand):
@@ -22,6 +27,12 @@ class Command(BaseCommand):
             default=24,
             help="Pending payment age in hours before marking failed.",
         )
+        parser.add_argument(
+            "--event-age-days",
+            type=int,
+            default=7,
+            help="Age in days of processed webhook inbox events before deletion.",
+        )
         parser.add_argument(
             "--delete-empty-carts",
             action="store_true",
@@ -39,7 +50,8 @@ class Command(BaseCommand):
         payment_cutoff = now - timedelta(hours=options["payment_age_hours"])
 
         stale_carts = Cart.objects.filter(updated_at__lt=cart_cutoff)
-        stale_cart_ids = list(stale_carts.values_list("id", flat=True))
+        stale_carts = list(stale_carts.values_list("id", "user_id"))
+        stale_cart_ids = [cart_id for cart_id, _ in stale_carts]
         stale_items = CartItem.objects.filter(cart_id__in=stale_cart_ids)
 
         pending_payments = Payment.objects.filter(
@@ -55,12 +67,28 @@ class Command(BaseCommand):
             )
             return
 
-        deleted_items, _ = stale_items.delete()
-        self.stdout.write(f"Deleted cart items: {deleted_items}")
+        # holds are given back before their carts can cascade them away
+        released = release_reservations(stale_cart_ids)
+        if released:
+            self.stdout.write(f"Released reserved stock: {released}")
 
+        with transaction.atomic():
+            deleted_items, _ = stale_items.delete()
+            deleted_carts = 0
+            if options["delete_empty_carts"] and stale_cart_ids:
+                deleted_carts, _ = Cart.objects.filter(id__in=stale_cart_ids).delete()
+            if deleted_items or deleted_carts:
+                # the owners' cached cart reads still show the deleted items
+                purge_tags_on_commit(*{user_tag(user_id) for _, user_id in stale_carts})
+        self.stdout.write(f"Deleted cart items: {deleted_items}")
         if options["delete_empty_carts"] and stale_cart_ids:
-            deleted_carts, _ = Cart.objects.filter(id__in=stale_cart_ids).delete()
             self.stdout.write(f"Deleted carts: {deleted_carts}")
 
         updated_payments = pending_payments.update(status="failed")
         self.stdout.write(f"Expired payments: {updated_payments}")
+
+        deleted_keys = delete_expired_keys(now)
+        self.stdout.write(f"Deleted expired idempotency keys: {deleted_keys}")
+
+        deleted_events = delete_processed_events(now - timedelta(days=options["event_age_days"]))
+        self.stdout.write(f"Deleted processed webhook events: {deleted_events}")
@@ -0,0 +1,144 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.catalog_export import (
+    EXPORT_COLUMNS,
+    EXPORT_CSV,
+    EXPORT_FORMATS,
+    export_rows,
+    gzip_stream,
+    iter_export,
+    last_exported_id,
+)
+
+TAIL_BLOCK_SIZE = 64 * 1024
+
+
+class Command(BaseCommand):
+    help = "Stream every product (with its category name) to a CSV or NDJSON file ('-' writes stdout)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Output file (.csv, .ndjson, optionally .gz) or '-' for stdout.")
+        parser.add_argument("--output", choices=EXPORT_FORMATS, help="Format; defaults to the file extension.")
+        parser.add_argument("--gzip", action="store_true", help="Compress; implied by a .gz file name.")
+        parser.add_argument("--after", type=int, help="Only export products with a larger id.")
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Append to an interrupted uncompressed export after its last complete row.",
+        )
+        parser.add_argument("--chunk-size", type=int, help="Rows per cursor fetch and write.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        name = path[:-3] if path.endswith(".gz") else path
+        compress = options["gzip"] or path.endswith(".gz")
+        fmt = options["output"] or os.path.splitext(name)[1].lstrip(".").lower()
+        if fmt not in EXPORT_FORMATS:
+            raise CommandError("Cannot tell the format from the file name; pass --output.")
+
+        after = options["after"]
+        if options["resume"]:
+            if compress or path == "-":
+                raise CommandError("--resume needs an uncompressed output file; use --after instead.")
+            if os.path.exists(path):
+                resumed = self._truncate_to_last_row(path, fmt)
+                if resumed is not None:
+                    after = resumed
+
+        exported = {"rows": 0, "last_id": after}
+
+        def counted(rows):
+            for row in rows:
+                exported["rows"] += 1
+                exported["last_id"] = row[0]
+                yield row
+
+        appending = options["resume"] and os.path.exists(path) and os.path.getsize(path) > 0
+        chunks = iter_export(
+            counted(export_rows(after=after, chunk_size=options["chunk_size"])),
+            fmt,
+            chunk_size=options["chunk_size"],
+            header=not appending,
+        )
+        if compress:
+            chunks = gzip_stream(chunks)
+
+        if path == "-":
+            self._write(sys.stdout.buffer, chunks)
+        else:
+            with open(path, "ab" if appending else "wb") as stream:
+                self._write(stream, chunks)
+
+        self.stderr.write(f"Exported {exported['rows']} product(s); last id {exported['last_id']}.")
+
+    def _write(self, stream, chunks):
+        for chunk in chunks:
+            stream.write(chunk)
+        stream.flush()
+
+    def _truncate_to_last_row(self, path, fmt):
+        """Drop a partially written last row; return the last exported id."""
+        with open(path, "rb+") as stream:
+            if fmt == EXPORT_CSV:
+                previous, end = self._csv_row_ends(stream)
+            else:
+                previous, end = self._ndjson_row_ends(stream)
+            stream.seek(previous)
+            row = stream.read(end - previous)
+            stream.truncate(end)
+
+        row = row[:-1].decode("utf-8")
+        if not row or (fmt == EXPORT_CSV and row == ",".join(EXPORT_COLUMNS)):
+            return None
+        return last_exported_id(row, fmt)
+
+    def _ndjson_row_ends(self, stream):
+        """Offsets past the last two newlines; JSON escapes newlines, so each ends a row."""
+        size = stream.seek(0, os.SEEK_END)
+        block = TAIL_BLOCK_SIZE
+        while True:
+            # read only the tail: the file may hold millions of rows
+            start = max(0, size - block)
+            stream.seek(start)
+            tail = stream.read(size - start)
+            end = tail.rfind(b"\n") + 1
+            previous = tail.rfind(b"\n", 0, max(end - 1, 0)) + 1
+            if start == 0 or previous > 0:
+                return start + previous, start + end
+            block *= 2
+
+    def _csv_row_ends(self, stream):
+        """
+        Offsets past the last two row-ending newlines. A quoted CSV field may
+        hold newlines, so whether one ends a row depends on the quotes before
+        it: the file is scanned from the start.
+        """
+        stream.seek(0)
+        ends = [0, 0]
+        quoted = False
+        offset = 0
+        while block := stream.read(TAIL_BLOCK_SIZE):
+            position = 0
+            while True:
+                quote = block.find(b'"', position)
+                if quoted:
+                    # an escaped quote ("") closes and reopens the field
+                    if quote == -1:
+                        break
+                    quoted = False
+                    position = quote + 1
+                    continue
+                newline = block.find(b"\n", position, quote if quote != -1 else len(block))
+                if newline != -1:
+                    ends = [ends[1], offset + newline + 1]
+                    position = newline + 1
+                elif quote != -1:
+                    quoted = True
+                    position = quote + 1
+                else:
+                    break
+            offset += len(block)
+        return ends[0], ends[1]
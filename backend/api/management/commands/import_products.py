@@ -0,0 +1,56 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.product_import import (
+    FORMATS,
+    MATCH_FIELDS,
+    MATCH_ID,
+    ProductImporter,
+    format_for_filename,
+    iter_rows,
+)
+
+
+class Command(BaseCommand):
+    help = "Bulk import / upsert products from a CSV or NDJSON file ('-' reads stdin)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or NDJSON file, or '-' for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Input format; defaults to the file extension.",
+        )
+        parser.add_argument(
+            "--match",
+            choices=MATCH_FIELDS,
+            default=MATCH_ID,
+            help="Update products matched by id (rows without id are created) or by name.",
+        )
+        parser.add_argument("--batch-size", type=int, help="Rows per transaction.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or format_for_filename(path)
+        if fmt is None:
+            raise CommandError("Cannot tell the format from the file name; pass --format.")
+
+        importer = ProductImporter(match=options["match"], batch_size=options["batch_size"])
+        if path == "-":
+            result = importer.run(iter_rows(sys.stdin.buffer, fmt))
+        else:
+            try:
+                with open(path, "rb") as stream:
+                    result = importer.run(iter_rows(stream, fmt))
+            except OSError as exc:
+                raise CommandError(str(exc))
+
+        for error in result.as_dict()["errors"]:
+            self.stdout.write(f"row {error['row']}: {error['errors']}")
+        if result.error_count > len(result.errors):
+            self.stdout.write(f"... {result.error_count - len(result.errors)} more error(s)")
+        self.stdout.write(
+            f"Imported products: {result.created} created, {result.updated} updated, "
+            f"{result.error_count} error(s)."
+        )
@@ -0,0 +1,97 @@
+import logging
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from api.checkout_queue import process_checkout_batch
+
+logger = logging.getLogger(__name__)
+
+# longest wait, in seconds, between batches that keep failing
+MAX_ERROR_BACKOFF = 30
+
+
+class Command(BaseCommand):
+    help = "Process queued checkouts (CHECKOUT_ASYNC) in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Tickets per transaction (default: CHECKOUT_QUEUE_BATCH).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Worker threads, each with its own connection.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=0.5,
+            help="Seconds to wait when the queue is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Stop when the queue is empty instead of polling.",
+        )
+
+    def work(self, options):
+        processed = 0
+        failures = 0
+        while True:
+            try:
+                done = process_checkout_batch(options["batch_size"])
+            except DatabaseError:
+                # the batch was rolled back and its tickets stay queued
+                logger.exception("Checkout batch failed")
+                if not connection.is_usable():
+                    connection.close()
+                failures += 1
+                self.back_off(options, failures)
+                continue
+            failures = 0
+            processed += done
+            if done:
+                continue
+            if options["once"]:
+                return processed
+            time.sleep(options["poll_interval"])
+
+    def back_off(self, options, failures):
+        # full jitter, doubling from the poll interval
+        cap = min(MAX_ERROR_BACKOFF, options["poll_interval"] * 2 ** min(failures, 16))
+        time.sleep(random.uniform(0, cap))
+
+    def handle(self, *args, **options):
+        if options["workers"] <= 0:
+            raise CommandError("--workers must be a positive integer.")
+
+        if options["workers"] == 1:
+            processed = self.work(options)
+            self.stdout.write(f"Processed tickets: {processed}")
+            return
+
+        counts = []
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                count = self.work(options)
+            finally:
+                connection.close()
+            with lock:
+                counts.append(count)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(options["workers"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.stdout.write(f"Processed tickets: {sum(counts)}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.stock_slots import rebalance_stock_slots
+
+
+class Command(BaseCommand):
+    help = "Even out sharded products' stock slots and refresh Product.stock."
+
+    def handle(self, *args, **options):
+        refreshed = rebalance_stock_slots()
+        self.stdout.write(f"Refreshed products: {refreshed}")
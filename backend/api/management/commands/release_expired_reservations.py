@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.reservations import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Give expired stock reservations back to stock."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Holds released per transaction (default: STOCK_RESERVATION_SWEEP_BATCH).",
+        )
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations(batch_size=options["batch_size"])
+        self.stdout.write(f"Released reserved stock: {released}")
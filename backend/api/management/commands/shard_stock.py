@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Product
+from api.stock_slots import shard_product, unshard_product
+
+
+class Command(BaseCommand):
+    help = "Split hot products' stock across counter slots, or merge it back."
+
+    def add_arguments(self, parser):
+        parser.add_argument("product_ids", nargs="+", type=int, help="Products to shard.")
+        parser.add_argument(
+            "--slots",
+            type=int,
+            default=None,
+            help="Slots per product (default: STOCK_SLOT_COUNT).",
+        )
+        parser.add_argument(
+            "--off",
+            action="store_true",
+            help="Merge the slots back into Product.stock.",
+        )
+
+    def handle(self, *args, **options):
+        if options["slots"] is not None and options["slots"] <= 0:
+            raise CommandError("--slots must be a positive integer.")
+
+        for product_id in options["product_ids"]:
+            try:
+                if options["off"]:
+                    total = unshard_product(product_id)
+                    self.stdout.write(f"Product {product_id}: unsharded, stock {total}")
+                else:
+                    total = shard_product(product_id, slots=options["slots"])
+                    self.stdout.write(f"Product {product_id}: sharded, stock {total}")
+            except Product.DoesNotExist:
+                raise CommandError(f"Product {product_id} not found.")
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-17 09:12
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_add_performance_indexes'),
+    ]
+
+    operations = [
+        # Full-text index backing PRODUCT_SEARCH_ENGINE=fulltext (see api/search.py)
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector('name', config='simple'),
+                name='api_product_name_search_idx',
+            ),
+        ),
+    ]
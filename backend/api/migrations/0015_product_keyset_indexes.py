@@ -0,0 +1,26 @@
+# Generated by Django 5.2.9 on 2026-10-17 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_product_name_search_index'),
+    ]
+
+    operations = [
+        # Composite (sort key, id) indexes for ProductCursorPagination
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='api_product_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='api_product_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name', 'id'], name='api_product_name_id_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.9 on 2026-10-17 10:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import BigIntegerField, Count, F, Sum
+from django.db.models.functions import Cast
+
+
+def backfill_product_statistics(apps, schema_editor):
+    Product = apps.get_model("api", "Product")
+    ProductStatistics = apps.get_model("api", "ProductStatistics")
+
+    fields = ("product_count", "price_sum", "stock_sum", "stock_value")
+    rows = (
+        Product.objects
+        .order_by()
+        .values("category_id")
+        .annotate(
+            product_count=Count("id"),
+            price_sum=Sum("price"),
+            stock_sum=Sum("stock"),
+            stock_value=Sum(Cast("price", BigIntegerField()) * F("stock")),
+        )
+    )
+
+    totals = dict.fromkeys(fields, 0)
+    stats = []
+    for row in rows:
+        counters = {field: row[field] or 0 for field in fields}
+        category_id = row["category_id"]
+        key = "uncategorized" if category_id is None else f"category:{category_id}"
+        stats.append(ProductStatistics(key=key, category_id=category_id, **counters))
+        for field in fields:
+            totals[field] += counters[field]
+    stats.append(ProductStatistics(key="all", **totals))
+    ProductStatistics.objects.bulk_create(stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, unique=True)),
+                ('product_count', models.BigIntegerField(default=0)),
+                ('price_sum', models.BigIntegerField(default=0)),
+                ('stock_sum', models.BigIntegerField(default=0)),
+                ('stock_value', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                (
+                    'category',
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='statistics',
+                        to='api.category',
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(backfill_product_statistics, reverse_code=migrations.RunPython.noop),
+    ]
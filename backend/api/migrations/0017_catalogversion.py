@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-17 11:20
+
+from django.db import migrations, models
+
+
+def create_catalog_versions(apps, schema_editor):
+    CatalogVersion = apps.get_model("api", "CatalogVersion")
+    for name in ("product", "category"):
+        CatalogVersion.objects.get_or_create(name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_productstatistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_catalog_versions, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_stockreservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock', models.PositiveIntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_slots', to='api.product')),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_checkoutticket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE api_order
+                SET item_count = items.quantity
+                FROM (
+                    SELECT order_id, SUM(quantity) AS quantity
+                    FROM api_orderitem
+                    GROUP BY order_id
+                ) AS items
+                WHERE items.order_id = api_order.id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # Keyset pages of one user's history: WHERE user_id = ? AND id < ? ORDER BY id DESC
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-id'], name='api_order_user_id_desc_idx'),
+        ),
+    ]
@@ -61,6 +61,8 @@ class CartItem(models.Model):
 class Order(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     total = models.IntegerField()
+    # sum of the items' quantities, stored at checkout for summary listings
+    item_count = models.PositiveIntegerField(default=0)
     status = models.CharField(max_length=20, default="pending")
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -143,3 +145,196 @@ class Wishlist(models.Model):
 
     class Meta:
         unique_together = ("user", "product")
+
+
+class ProductStatistics(models.Model):
+    """
+    Running product counters maintained by api.signals.
+
+    One row per category (`category:<id>`), one for uncategorized products
+    and one global row (`all`), so statistics reads are a single lookup.
+    """
+    key = models.CharField(max_length=50, unique=True)
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="statistics",
+        null=True,
+        blank=True,
+    )
+    product_count = models.BigIntegerField(default=0)
+    price_sum = models.BigIntegerField(default=0)
+    stock_sum = models.BigIntegerField(default=0)
+    stock_value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.key
+
+
+class CatalogVersion(models.Model):
+    """
+    Per-table change counter used for ETag / Last-Modified on catalog reads.
+
+    Bumped by api.signals on every Product / Category write and by bulk
+    writers that bypass signals.
+    """
+    PRODUCT = "product"
+    CATEGORY = "category"
+
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}@{self.version}"
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for a cart item until `expires_at` (api.reservations).
+
+    The held quantity has already been taken out of `Product.stock`; checkout
+    turns it into a sale and the sweeper gives expired holds back.
+    """
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="reservations")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="reservations")
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ("cart", "product")
+
+    def __str__(self):
+        return f"{self.product_id} x{self.quantity} until {self.expires_at}"
+
+
+class StockSlot(models.Model):
+    """
+    One share of a sharded product's stock (api.stock_slots).
+
+    A product with slots keeps its stock here: the exact total is the sum of
+    its slots, and `Product.stock` is a copy refreshed by rebalancing.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_slots")
+    stock = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.product_id} slot {self.pk}: {self.stock}"
+
+
+class CheckoutTicket(models.Model):
+    """
+    A queued checkout (api.checkout_queue).
+
+    Created by POST /api/orders/ in async mode and turned into an order, or
+    a failure with the error the synchronous checkout would have returned,
+    by the queue worker.
+    """
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="checkout_tickets",
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    order = models.OneToOneField(
+        Order,
+        on_delete=models.SET_NULL,
+        related_name="ticket",
+        null=True,
+        blank=True,
+    )
+    error = models.CharField(max_length=255, blank=True, default="")
+    error_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the worker's queue scan
+            models.Index(
+                fields=["id"],
+                condition=models.Q(status="pending"),
+                name="api_checkoutticket_queue_idx",
+            ),
+        ]
+        constraints = [
+            # one queued checkout per user: the cart is checked out once
+            models.UniqueConstraint(
+                fields=["user"],
+                condition=models.Q(status="pending"),
+                name="api_checkoutticket_one_pending",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Ticket {self.id} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored outcome of a POST sent with an `Idempotency-Key` header
+    (api.idempotency). `status_code` is null while the first request runs.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys",
+    )
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    # zlib-compressed JSON body
+    body = models.BinaryField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ("user", "scope", "key")
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
+
+
+class PaymentEvent(models.Model):
+    """
+    A verified payment webhook call in the inbox (api.webhook_inbox).
+
+    Stored by POST /api/payments/webhook/ in inbox mode and applied by the
+    inbox worker, which records the response the synchronous webhook would
+    have returned in `outcome` / `outcome_status`.
+    """
+    transaction_id = models.CharField(max_length=100)
+    order_id = models.IntegerField()
+    # normalized: paid / failed
+    status = models.CharField(max_length=20)
+    provider = models.CharField(max_length=20, blank=True, default="")
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    outcome = models.JSONField(null=True, blank=True)
+    outcome_status = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the worker's inbox scan
+            models.Index(
+                fields=["id"],
+                condition=models.Q(processed_at__isnull=True),
+                name="api_paymentevent_inbox_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Event {self.id} ({self.transaction_id})"
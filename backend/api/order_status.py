@@ -0,0 +1,118 @@
+"""
+Order status transitions as compare-and-set updates.
+
+Orders move along ORDER_STATUS_FLOW (pending -> paid -> shipped ->
+completed). Every status has one predecessor, so the target status alone
+says which status a row must be in: a transition is one
+`UPDATE ... SET status = <target> WHERE status = <previous>` statement.
+The order is neither read first nor locked; a concurrent transition that
+got there first leaves the row out of the WHERE clause.
+
+`transition_order` moves one order and only reads the row back to explain a
+failure. `bulk_transition` moves a list of ids, or the orders matching a
+filter, in one statement and reports the ids it skipped.
+"""
+from django.conf import settings
+from django.db import connection
+
+from .models import Order
+from .response_cache import purge_tags_on_commit, user_tag
+
+STATUS_PENDING = "pending"
+STATUS_PAID = "paid"
+STATUS_SHIPPED = "shipped"
+STATUS_COMPLETED = "completed"
+
+ORDER_STATUS_FLOW = {
+    STATUS_PENDING: STATUS_PAID,
+    STATUS_PAID: STATUS_SHIPPED,
+    STATUS_SHIPPED: STATUS_COMPLETED,
+}
+PREVIOUS_STATUS = {target: current for current, target in ORDER_STATUS_FLOW.items()}
+
+# bulk filter parameter -> Order lookup
+BULK_FILTERS = {
+    "user_id": "user_id",
+    "created_after": "created_at__gte",
+    "created_before": "created_at__lt",
+}
+
+
+def order_status_bulk_max_ids():
+    return getattr(settings, "ORDER_STATUS_BULK_MAX_IDS", 10000)
+
+
+class OrderStatusError(Exception):
+    """A refused transition with the HTTP status the API reports."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _transition_sql(select_sql):
+    table = Order._meta.db_table
+    return f"""
+        UPDATE {table} SET status = %s
+        WHERE id IN ({select_sql}) AND status = %s
+        RETURNING id, user_id
+    """
+
+
+def _transition(queryset, target):
+    """Move the orders of `queryset` in the previous status to `target`; returns (id, user_id) rows."""
+    select_sql, params = queryset.values("id").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(_transition_sql(select_sql), [target, *params, PREVIOUS_STATUS[target]])
+        rows = cursor.fetchall()
+    if rows:
+        purge_tags_on_commit(*{user_tag(user_id) for _, user_id in rows})
+    return rows
+
+
+def _in_flow(target):
+    return isinstance(target, str) and target in PREVIOUS_STATUS
+
+
+def transition_order(order_id, target):
+    """
+    Move one order to `target`. Raises OrderStatusError: 404 for a missing
+    order, 400 for a completed order or a transition outside the flow.
+    """
+    if _in_flow(target) and _transition(Order.objects.filter(pk=order_id), target):
+        return
+
+    current = Order.objects.filter(pk=order_id).values_list("status", flat=True).first()
+    if current is None:
+        raise OrderStatusError("Order not found", 404)
+    if current not in ORDER_STATUS_FLOW:
+        raise OrderStatusError("Order already completed", 400)
+    raise OrderStatusError("Invalid status transition", 400)
+
+
+def bulk_transition(target, ids=None, filters=None):
+    """
+    Move the orders with `ids`, or those matching `filters` (BULK_FILTERS
+    keys), from the previous status to `target` in one statement. Returns
+    `(updated_ids, skipped_ids)`; ids that are missing or in another status
+    are skipped. With `filters`, only matching orders in the previous status
+    are touched and none are reported skipped.
+    """
+    if not _in_flow(target):
+        raise OrderStatusError("Invalid status transition", 400)
+
+    if ids is not None:
+        queryset = Order.objects.filter(pk__in=ids)
+    else:
+        queryset = Order.objects.filter(
+            status=PREVIOUS_STATUS[target],
+            **{BULK_FILTERS[name]: value for name, value in (filters or {}).items()},
+        )
+
+    updated = sorted(order_id for order_id, _ in _transition(queryset, target))
+    if ids is None:
+        return updated, []
+    moved = set(updated)
+    skipped = sorted({order_id for order_id in ids if order_id not in moved})
+    return updated, skipped
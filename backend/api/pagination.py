@@ -1,4 +1,15 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 10
@@ -7,4 +18,154 @@ class StandardResultsSetPagination(PageNumberPagination):
 
 class ProductPagination(PageNumberPagination):
     page_size = 1
-    page_size_query_param = "page_size"
\ No newline at end of file
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+def product_list_max_rows():
+    """Hard cap for product listings that are not explicitly paginated."""
+    return getattr(settings, "PRODUCT_LIST_MAX_ROWS", 1000)
+
+
+class ProductCursorPagination(BasePagination):
+    """
+    Keyset pagination for the product catalog.
+
+    Pages are addressed by an opaque cursor holding the last seen
+    `(sort value, id)` pair, so every page is a `WHERE (key, id) > (...)`
+    index range scan: no OFFSET and no COUNT(*), deep pages cost the same as
+    the first one. `id` breaks ties for non-unique sort keys.
+    """
+    cursor_query_param = "cursor"
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering_query_param = "ordering"
+    ordering_fields = ("id", "price", "created_at", "name")
+    default_ordering = "id"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request)
+
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = bool(cursor and cursor["r"])
+
+        queryset = queryset.order_by(*self._order_by(reverse))
+        if cursor is not None:
+            queryset = queryset.filter(self._after(cursor["v"], cursor["id"], reverse))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_previous = has_more
+            self.has_next = True
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, TypeError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_query_param) or self.default_ordering
+        field = ordering.lstrip("-")
+        if field not in self.ordering_fields:
+            raise ValidationError(
+                f"ordering must be one of: {', '.join(self.ordering_fields)} (prefix '-' for descending)"
+            )
+        return field, ordering.startswith("-")
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    # ---- cursor encoding ----
+
+    def encode_cursor(self, obj, reverse):
+        value = getattr(obj, self.field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        payload = {"o": self._ordering_key(), "v": value, "id": obj.pk, "r": int(reverse)}
+        token = base64.urlsafe_b64encode(
+            json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        ).decode("ascii")
+        url = remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+            if payload["o"] != self._ordering_key():
+                raise ValueError("cursor ordering mismatch")
+            value = model._meta.get_field(self.field).to_python(payload["v"])
+            if value is None:
+                raise ValueError("cursor value missing")
+            return {"v": value, "id": int(payload["id"]), "r": bool(payload["r"])}
+        except (binascii.Error, DjangoValidationError, TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    # ---- keyset helpers ----
+
+    def _ordering_key(self):
+        return f"-{self.field}" if self.descending else self.field
+
+    def _order_by(self, reverse):
+        descending = self.descending != reverse
+        prefix = "-" if descending else ""
+        if self.field == "id":
+            return [f"{prefix}id"]
+        return [f"{prefix}{self.field}", f"{prefix}id"]
+
+    def _after(self, value, pk, reverse):
+        op = "lt" if self.descending != reverse else "gt"
+        if self.field == "id":
+            return Q(**{f"id__{op}": pk})
+        # the redundant bound gives the (field, id) index a range to start
+        # from; the OR alone is a filter over every row before the cursor
+        bound = Q(**{f"{self.field}__{op}e": value})
+        return bound & (Q(**{f"{self.field}__{op}": value}) | Q(**{self.field: value, f"id__{op}": pk}))
+
+
+class OrderCursorPagination(ProductCursorPagination):
+    """
+    Keyset pagination for a user's order history, newest first.
+
+    The order is fixed to `-id` (`WHERE user_id = ? AND id < ?`, served by
+    the `(user, -id)` index); `?ordering=` is not accepted.
+    """
+    page_size = 20
+
+    def get_ordering(self, request):
+        return "id", True
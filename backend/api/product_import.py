@@ -0,0 +1,359 @@
+"""
+Bulk product import / upsert from CSV or NDJSON streams.
+
+Rows are validated with the same field rules as ProductSerializer
+(`validate_name`, `validate_price`, `validate_stock`, category pk checks) and
+written in batches with bulk_create / bulk_update, one transaction per batch.
+A bad row is reported with its row number and skipped; it never aborts the
+rows around it. That includes rows with invalid UTF-8 or malformed CSV: lines
+are decoded one at a time, so a bad byte only spoils its own row.
+
+Columns / keys: `id` (optional), `name`, `price`, `stock`, `category`
+(category id, optional). Matching on `id` updates the given product and
+creates rows without an id; matching on `name` updates the product with that
+name, or creates it.
+
+bulk_* bypasses model signals, so product statistics, the catalog version
+and the response cache are maintained here per batch. Imported stock of a
+sharded product is respread over its stock slots, as a PUT does.
+"""
+import codecs
+import csv
+import json
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.fields import empty
+
+from .conditional import bump_catalog_version
+from .models import CatalogVersion, Category, Product, StockSlot
+from .product_stats import StatisticsDelta
+from .response_cache import PRODUCT_LIST_TAG, PRODUCT_STATS_TAG, product_tag, purge_tags_on_commit
+from .serializers import ProductSerializer
+from .stock_slots import set_slot_stock
+
+FORMAT_CSV = "csv"
+FORMAT_NDJSON = "ndjson"
+FORMATS = (FORMAT_CSV, FORMAT_NDJSON)
+
+MATCH_ID = "id"
+MATCH_NAME = "name"
+MATCH_FIELDS = (MATCH_ID, MATCH_NAME)
+
+VALIDATED_FIELDS = ("name", "price", "stock")
+UPDATE_FIELDS = ["name", "price", "stock", "category"]
+# errors listed in the result; the count is always exact
+MAX_REPORTED_ERRORS = 1000
+
+INVALID_UTF8 = "Invalid UTF-8."
+MALFORMED_CSV = "Malformed CSV row."
+
+
+def import_batch_size():
+    return getattr(settings, "PRODUCT_IMPORT_BATCH_SIZE", 1000)
+
+
+def format_for_content_type(content_type):
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return FORMAT_CSV
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonlines"):
+        return FORMAT_NDJSON
+    return None
+
+
+def format_for_filename(filename):
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension == "csv":
+        return FORMAT_CSV
+    if extension in ("ndjson", "jsonl"):
+        return FORMAT_NDJSON
+    return None
+
+
+def iter_rows(stream, fmt):
+    """
+    Yield `(row number, data, error)` from a binary line stream. Exactly one
+    of `data` / `error` is set; row numbers count data lines from 1.
+    """
+    # raw lines that failed to decode, appended as the lines are read
+    invalid = []
+    lines = _decode_lines(stream, invalid)
+    if fmt == FORMAT_CSV:
+        yield from _iter_csv(lines, invalid)
+    else:
+        yield from _iter_ndjson(lines, invalid)
+
+
+def _decode_lines(stream, invalid):
+    """Decode line by line; undecodable lines are flagged in `invalid` and yielded with U+FFFD."""
+    first = True
+    for line in stream:
+        if first:
+            line = line.removeprefix(codecs.BOM_UTF8)
+            first = False
+        try:
+            yield line.decode("utf-8")
+        except UnicodeDecodeError:
+            invalid.append(line)
+            yield line.decode("utf-8", "replace")
+
+
+def _iter_csv(lines, invalid):
+    reader = csv.DictReader(lines)
+    number = 0
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error:
+            row = None
+        number += 1
+        if invalid:
+            # the row spans a line that failed to decode
+            invalid.clear()
+            yield number, None, {"non_field_errors": [INVALID_UTF8]}
+            continue
+        if row is None:
+            yield number, None, {"non_field_errors": [MALFORMED_CSV]}
+            continue
+        if None in row:
+            yield number, None, {"non_field_errors": ["Too many columns."]}
+            continue
+        # empty cells mean "not given"
+        yield number, {key: value for key, value in row.items() if value not in ("", None)}, None
+
+
+def _iter_ndjson(lines, invalid):
+    number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        if invalid:
+            invalid.clear()
+            yield number, None, {"non_field_errors": [INVALID_UTF8]}
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield number, None, {"non_field_errors": ["Invalid JSON."]}
+            continue
+        if not isinstance(data, dict):
+            yield number, None, {"non_field_errors": ["Expected a JSON object."]}
+            continue
+        yield number, data, None
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, row, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "errors": errors})
+
+    def as_dict(self):
+        return {
+            "created": self.created,
+            "updated": self.updated,
+            "error_count": self.error_count,
+            # parse errors are found before write-time errors of earlier rows
+            "errors": sorted(self.errors, key=lambda error: error["row"]),
+            "errors_truncated": self.error_count > len(self.errors),
+        }
+
+
+class ProductImporter:
+    def __init__(self, match=MATCH_ID, batch_size=None):
+        if match not in MATCH_FIELDS:
+            raise ValueError(f"match must be one of: {', '.join(MATCH_FIELDS)}")
+        self.match = match
+        self.batch_size = batch_size or import_batch_size()
+        self.serializer = ProductSerializer()
+        self.result = ImportResult()
+
+    def run(self, rows):
+        batch = []
+        for number, data, error in rows:
+            if error is not None:
+                self.result.add_error(number, error)
+                continue
+            batch.append((number, data))
+            if len(batch) >= self.batch_size:
+                self._process(batch)
+                batch = []
+        if batch:
+            self._process(batch)
+        return self.result
+
+    # ---- validation ----
+
+    def _process(self, batch):
+        category_ids = self._existing_categories(batch)
+        cleaned = []
+        for number, data in batch:
+            values, errors = self._validate(data, category_ids)
+            if errors:
+                self.result.add_error(number, errors)
+            else:
+                cleaned.append((number, values))
+        if cleaned:
+            self._write(cleaned)
+
+    def _existing_categories(self, batch):
+        ids = set()
+        for _, data in batch:
+            try:
+                ids.add(int(data["category"]))
+            except (KeyError, TypeError, ValueError):
+                pass
+        if not ids:
+            return set()
+        return set(Category.objects.filter(id__in=ids).values_list("id", flat=True))
+
+    def _validate(self, data, category_ids):
+        fields = self.serializer.fields
+        values = {}
+        errors = {}
+
+        for name in VALIDATED_FIELDS:
+            try:
+                value = fields[name].run_validation(data.get(name, empty))
+                values[name] = getattr(self.serializer, f"validate_{name}")(value)
+            except serializers.ValidationError as exc:
+                errors[name] = [str(message) for message in exc.detail]
+
+        if "category" in data:
+            try:
+                values["category_id"] = self._validate_category(data["category"], category_ids)
+            except serializers.ValidationError as exc:
+                errors["category"] = [str(message) for message in exc.detail]
+
+        if data.get("id") is not None and self.match == MATCH_ID:
+            try:
+                values["id"] = int(data["id"])
+            except (TypeError, ValueError):
+                errors["id"] = ["A valid integer is required."]
+
+        return values, errors
+
+    def _validate_category(self, value, category_ids):
+        field = self.serializer.fields["category"]
+        if value is None:
+            return None
+        if isinstance(value, bool):
+            field.fail("incorrect_type", data_type=type(value).__name__)
+        try:
+            category_id = int(value)
+        except (TypeError, ValueError):
+            field.fail("incorrect_type", data_type=type(value).__name__)
+        if category_id not in category_ids:
+            field.fail("does_not_exist", pk_value=value)
+        return category_id
+
+    # ---- writes ----
+
+    @transaction.atomic
+    def _write(self, cleaned):
+        existing = self._lock_existing(cleaned)
+        creates = {}
+        updates = {}
+        originals = {}
+        delta = StatisticsDelta()
+
+        for number, values in cleaned:
+            product = self._target(number, values, existing, creates)
+            if product is False:
+                continue
+            if product is None:
+                product = Product(
+                    name=values["name"],
+                    price=values["price"],
+                    stock=values["stock"],
+                    category_id=values.get("category_id"),
+                )
+                creates[self._create_key(number, values)] = product
+                continue
+
+            if product.pk is not None and product.pk not in originals:
+                originals[product.pk] = (product.category_id, product.price, product.stock)
+            product.name = values["name"]
+            product.price = values["price"]
+            product.stock = values["stock"]
+            if "category_id" in values:
+                product.category_id = values["category_id"]
+            if product.pk is not None:
+                updates[product.pk] = product
+
+        if creates:
+            Product.objects.bulk_create(creates.values(), batch_size=self.batch_size)
+            for product in creates.values():
+                delta.add_product(product.category_id, product.price, product.stock)
+        if updates:
+            Product.objects.bulk_update(updates.values(), UPDATE_FIELDS, batch_size=self.batch_size)
+            self._respread_slots(updates, originals)
+            for pk, (category_id, price, stock) in originals.items():
+                product = updates[pk]
+                delta.add_product(category_id, price, stock, sign=-1)
+                delta.add_product(product.category_id, product.price, product.stock)
+
+        delta.apply()
+        bump_catalog_version(CatalogVersion.PRODUCT)
+        purge_tags_on_commit(PRODUCT_LIST_TAG, PRODUCT_STATS_TAG, *(product_tag(pk) for pk in updates))
+
+        self.result.created += len(creates)
+        self.result.updated += len(updates)
+
+    def _respread_slots(self, updates, originals):
+        # sharded products take stock from their slots, which bulk_update
+        # does not touch; respread the imported stock as a PUT does
+        changed = [pk for pk, original in originals.items() if updates[pk].stock != original[2]]
+        if not changed:
+            return
+        sharded = StockSlot.objects.filter(product_id__in=changed).values_list("product_id", flat=True)
+        for pk in sorted(set(sharded)):
+            set_slot_stock(pk, updates[pk].stock)
+
+    def _lock_existing(self, cleaned):
+        queryset = Product.objects.select_for_update().order_by("id")
+        if self.match == MATCH_ID:
+            ids = {values["id"] for _, values in cleaned if "id" in values}
+            return queryset.in_bulk(ids) if ids else {}
+
+        by_name = {}
+        names = {values["name"] for _, values in cleaned}
+        for product in queryset.filter(name__in=names):
+            by_name.setdefault(product.name, []).append(product)
+        return by_name
+
+    def _target(self, number, values, existing, creates):
+        """Product to update, None to create, False after reporting an error."""
+        if self.match == MATCH_ID:
+            if "id" not in values:
+                return None
+            product = existing.get(values["id"])
+            if product is None:
+                self.result.add_error(number, {"id": ["Product not found."]})
+                return False
+            return product
+
+        matches = existing.get(values["name"], [])
+        if len(matches) > 1:
+            self.result.add_error(
+                number, {"name": [f"Matches {len(matches)} products; use id matching."]}
+            )
+            return False
+        if matches:
+            return matches[0]
+        # a later row for the same new name updates the pending create
+        return creates.get(self._create_key(number, values))
+
+    def _create_key(self, number, values):
+        return values["name"] if self.match == MATCH_NAME else number
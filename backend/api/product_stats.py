@@ -0,0 +1,153 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, Count, F, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import Product, ProductStatistics
+
+GLOBAL_KEY = "all"
+UNCATEGORIZED_KEY = "uncategorized"
+
+COUNTER_FIELDS = ("product_count", "price_sum", "stock_sum", "stock_value")
+
+
+def stats_key(category_id):
+    if category_id is None:
+        return UNCATEGORIZED_KEY
+    return f"category:{category_id}"
+
+
+def product_contribution(price, stock, sign=1):
+    return {
+        "product_count": sign,
+        "price_sum": sign * price,
+        "stock_sum": sign * stock,
+        "stock_value": sign * price * stock,
+    }
+
+
+class StatisticsDelta:
+    """Accumulates counter changes per key so each row is updated once."""
+
+    def __init__(self):
+        self.rows = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+        self.categories = {}
+
+    def add(self, category_id, changes):
+        for key in (GLOBAL_KEY, stats_key(category_id)):
+            row = self.rows[key]
+            for field, value in changes.items():
+                row[field] += value
+        self.categories[stats_key(category_id)] = category_id
+
+    def add_product(self, category_id, price, stock, sign=1):
+        self.add(category_id, product_contribution(price, stock, sign))
+
+    def add_stock(self, category_id, price, stock_change):
+        self.add(category_id, {"stock_sum": stock_change, "stock_value": price * stock_change})
+
+    def apply(self):
+        # sorted keys → stable row lock order across concurrent writers
+        for key in sorted(self.rows):
+            changes = {field: value for field, value in self.rows[key].items() if value}
+            if changes:
+                _apply_row(key, self.categories.get(key), changes)
+
+
+def _apply_row(key, category_id, changes):
+    updates = {field: F(field) + value for field, value in changes.items()}
+    updates["updated_at"] = timezone.now()
+    if ProductStatistics.objects.filter(key=key).update(**updates):
+        return
+    if changes.get("product_count", 0) <= 0:
+        # Nothing to decrement: the row went away with its category.
+        return
+    try:
+        with transaction.atomic():
+            ProductStatistics.objects.create(key=key, category_id=category_id, **changes)
+    except IntegrityError:
+        # created concurrently
+        ProductStatistics.objects.filter(key=key).update(**updates)
+
+
+def get_statistics(key=GLOBAL_KEY):
+    """Return the counters stored under `key` (a single indexed lookup)."""
+    row = (
+        ProductStatistics.objects
+        .filter(key=key)
+        .values(*COUNTER_FIELDS)
+        .first()
+    )
+    return row or dict.fromkeys(COUNTER_FIELDS, 0)
+
+
+def average_price(stats):
+    if not stats["product_count"]:
+        return 0
+    # truncate like int(Avg('price'))
+    return int(Decimal(stats["price_sum"]) / stats["product_count"])
+
+
+def compute_statistics():
+    """Recompute every counter row from the product table."""
+    # bigint math: price * stock overflows a 32-bit integer
+    value = Sum(Cast("price", BigIntegerField()) * F("stock"))
+    rows = (
+        Product.objects
+        .order_by()
+        .values("category_id")
+        .annotate(
+            product_count=Count("id"),
+            price_sum=Sum("price"),
+            stock_sum=Sum("stock"),
+            stock_value=value,
+        )
+    )
+
+    expected = {}
+    totals = dict.fromkeys(COUNTER_FIELDS, 0)
+    for row in rows:
+        counters = {field: row[field] or 0 for field in COUNTER_FIELDS}
+        expected[stats_key(row["category_id"])] = (row["category_id"], counters)
+        for field in COUNTER_FIELDS:
+            totals[field] += counters[field]
+    expected[GLOBAL_KEY] = (None, totals)
+    return expected
+
+
+def find_drift(expected=None):
+    """Return `{key: (stored, expected)}` for every row that disagrees."""
+    expected = expected if expected is not None else compute_statistics()
+    stored = {
+        row["key"]: {field: row[field] for field in COUNTER_FIELDS}
+        for row in ProductStatistics.objects.values("key", *COUNTER_FIELDS)
+    }
+    empty = dict.fromkeys(COUNTER_FIELDS, 0)
+
+    drift = {}
+    for key in set(stored) | set(expected):
+        want = expected[key][1] if key in expected else empty
+        have = stored.get(key, empty)
+        if have != want:
+            drift[key] = (have, want)
+    return drift
+
+
+@transaction.atomic
+def rebuild_statistics():
+    """Overwrite the counters with freshly computed values; returns the drift fixed."""
+    # Serialize with concurrent writers for the duration of the rebuild.
+    list(ProductStatistics.objects.select_for_update().values_list("id", flat=True))
+    expected = compute_statistics()
+    drift = find_drift(expected)
+
+    ProductStatistics.objects.exclude(key__in=expected.keys()).delete()
+    for key, (category_id, counters) in expected.items():
+        ProductStatistics.objects.update_or_create(
+            key=key,
+            defaults={"category_id": category_id, **counters},
+        )
+    return drift
@@ -0,0 +1,148 @@
+"""
+Optional stock reservations (STOCK_RESERVATIONS).
+
+When enabled, `POST /api/cart/` moves the added quantity out of
+`Product.stock` into a StockReservation for that cart and product, in the
+same statement as the cart upsert (api.cart). It fails early with "Not
+enough stock" when the product cannot cover it. Each add renews the hold's
+expiry (STOCK_RESERVATION_TTL seconds).
+
+Checkout (api.checkout) consumes the cart's holds and only touches product
+rows for quantity the holds do not cover, or for surplus it gives back. So
+during a sale the product row contention happens at add-to-cart time, one
+short statement per add, instead of in the checkout transaction.
+
+Removing a cart item gives its hold back at once. Holds that expire are
+given back in bulk by `release_expired_reservations`, which is run by
+`manage.py release_expired_reservations`. Cart quantity changes made with
+PUT or the batch endpoint are not reserved; checkout takes the uncovered
+part from stock as usual.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .conditional import bump_catalog_version
+from .models import CatalogVersion, Product, StockReservation
+from .product_stats import StatisticsDelta
+from .response_cache import PRODUCT_LIST_TAG, PRODUCT_STATS_TAG, product_tag, purge_tags_on_commit
+
+
+def reservations_enabled():
+    return getattr(settings, "STOCK_RESERVATIONS", False)
+
+
+def reservation_ttl():
+    """Seconds a hold lives after the last add-to-cart of its product."""
+    return getattr(settings, "STOCK_RESERVATION_TTL", 900)
+
+
+def sweep_batch_size():
+    return getattr(settings, "STOCK_RESERVATION_SWEEP_BATCH", 1000)
+
+
+def record_stock_changes(changes, uncounted=()):
+    """
+    Book direct stock writes, given as `(product_id, price, category_id,
+    stock change)` rows: statistics, catalog version and cache purges, all
+    after commit.
+
+    `uncounted` products had their stock changed outside `Product.stock`
+    (api.stock_slots): they are purged but left out of the statistics.
+    """
+    changes = [change for change in changes if change[3]]
+    uncounted = list(uncounted)
+    if not changes and not uncounted:
+        return
+    delta = StatisticsDelta()
+    for _, price, category_id, stock_change in changes:
+        delta.add_stock(category_id, price, stock_change)
+    transaction.on_commit(delta.apply, robust=True)
+    transaction.on_commit(lambda: bump_catalog_version(CatalogVersion.PRODUCT), robust=True)
+    purge_tags_on_commit(
+        PRODUCT_LIST_TAG,
+        PRODUCT_STATS_TAG,
+        *(product_tag(product_id) for product_id, *_ in changes),
+        *(product_tag(product_id) for product_id in uncounted),
+    )
+
+
+def _release_sql(condition):
+    reservation = StockReservation._meta.db_table
+    product = Product._meta.db_table
+    # SKIP LOCKED: holds a checkout is consuming right now are left to it
+    return f"""
+        WITH released AS (
+            DELETE FROM {reservation} WHERE id IN (
+                SELECT id FROM {reservation}
+                WHERE {condition}
+                ORDER BY id
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING product_id, quantity
+        ), totals AS (
+            SELECT product_id, SUM(quantity) AS quantity FROM released GROUP BY product_id
+        ), locked AS (
+            SELECT id FROM {product}
+            WHERE id IN (SELECT product_id FROM totals)
+            ORDER BY id
+            FOR UPDATE
+        )
+        UPDATE {product} AS product
+        SET stock = product.stock + totals.quantity
+        FROM totals, locked
+        WHERE product.id = totals.product_id AND locked.id = product.id
+        RETURNING product.id, product.price, product.category_id, totals.quantity
+    """
+
+
+def _release(condition, params, limit=None):
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(_release_sql(condition), {**params, "limit": limit})
+            rows = cursor.fetchall()
+        record_stock_changes(rows)
+    return sum(row[3] for row in rows)
+
+
+def release_reservations(cart_ids, product_ids=None):
+    """Give the holds of `cart_ids` (optionally only `product_ids`) back to stock."""
+    cart_ids = list(cart_ids)
+    if not cart_ids:
+        return 0
+    if product_ids is None:
+        return _release("cart_id = ANY(%(cart_ids)s)", {"cart_ids": cart_ids})
+    return _release(
+        "cart_id = ANY(%(cart_ids)s) AND product_id = ANY(%(product_ids)s)",
+        {"cart_ids": cart_ids, "product_ids": list(product_ids)},
+    )
+
+
+def release_product_reservations(product_ids):
+    """Give every hold on `product_ids` back to stock, whatever the cart."""
+    return _release("product_id = ANY(%(product_ids)s)", {"product_ids": list(product_ids)})
+
+
+def release_expired_reservations(batch_size=None, now=None):
+    """
+    Give expired holds back to stock, `batch_size` holds per transaction.
+    Returns the total quantity released.
+    """
+    batch_size = batch_size or sweep_batch_size()
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    _release_sql("expires_at <= %(now)s"),
+                    {"now": now, "limit": batch_size},
+                )
+                rows = cursor.fetchall()
+                # released holds, not products: decides whether to go on
+                swept = cursor.rowcount
+            record_stock_changes(rows)
+        released += sum(row[3] for row in rows)
+        if not swept:
+            return released
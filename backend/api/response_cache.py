@@ -0,0 +1,328 @@
+import math
+import random
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+PRODUCT_LIST_TAG = "product-list"
+PRODUCT_STATS_TAG = "product-stats"
+CATEGORY_LIST_TAG = "category-list"
+
+CACHE_KEY_PREFIX = "resp"
+TAG_KEY_PREFIX = "tag"
+LOCK_KEY_PREFIX = "resplock"
+COUNTER_KEY_PREFIX = "respstats"
+CACHEABLE_METHODS = ("GET", "HEAD")
+# validators are recomputed per request by catalog_condition
+UNCACHED_HEADERS = {"etag", "last-modified"}
+
+HIT = "hit"
+MISS = "miss"
+COALESCED = "coalesced"
+STALE = "stale"
+COUNTER_EVENTS = (HIT, MISS, COALESCED, STALE)
+
+COALESCE_POLL_INTERVAL = 0.01
+
+# view name -> registered by cache_response, read by get_cache_counters
+_cached_views = set()
+
+
+def product_tag(product_id):
+    return f"product:{product_id}"
+
+
+def category_tag(category_id):
+    return f"category:{category_id}"
+
+
+def user_tag(user_id):
+    """Per-user version: cart, wishlist and order reads of one user."""
+    return f"user:{user_id}"
+
+
+def bump_user_version(user_id):
+    """Invalidate the user's cached cart / wishlist / order reads after commit."""
+    purge_tags_on_commit(user_tag(user_id))
+
+
+def response_cache_ttl():
+    return getattr(settings, "API_CACHE_TTL", 0)
+
+
+def stale_ttl():
+    """Seconds an expired entry may still be served while one request refreshes it."""
+    return getattr(settings, "API_CACHE_STALE_TTL", 30)
+
+
+def lock_timeout():
+    """Upper bound on a recomputation; the lock expires even if its holder dies."""
+    return getattr(settings, "API_CACHE_LOCK_TIMEOUT", 10)
+
+
+def coalesce_timeout():
+    """Seconds a request waits for another one's recomputation before doing its own."""
+    return getattr(settings, "API_CACHE_COALESCE_TIMEOUT_MS", 2000) / 1000
+
+
+def early_refresh_beta():
+    """XFetch beta; 0 disables probabilistic early refresh."""
+    return getattr(settings, "API_CACHE_EARLY_REFRESH_BETA", 1.0)
+
+
+def _tag_key(tag):
+    return f"{TAG_KEY_PREFIX}:{tag}"
+
+
+def _response_key(request, user_id=None):
+    if user_id is None:
+        return f"{CACHE_KEY_PREFIX}:{request.get_full_path()}"
+    return f"{CACHE_KEY_PREFIX}:user:{user_id}:{request.get_full_path()}"
+
+
+def _lock_key(key):
+    return f"{LOCK_KEY_PREFIX}:{key}"
+
+
+def _counter_key(view_name, event):
+    return f"{COUNTER_KEY_PREFIX}:{view_name}:{event}"
+
+
+def get_tag_versions(tags):
+    """Current version token of every tag, creating missing ones."""
+    keys = {_tag_key(tag): tag for tag in tags}
+    found = cache.get_many(list(keys))
+    versions = {}
+    for key, tag in keys.items():
+        version = found.get(key)
+        if version is None:
+            version = uuid.uuid4().hex
+            # add(): keep the version another worker may have just created
+            if not cache.add(key, version, timeout=None):
+                version = cache.get(key, version)
+        versions[tag] = version
+    return versions
+
+
+def purge_tags(*tags):
+    """Invalidate every cached response carrying one of `tags`."""
+    if not tags:
+        return
+    cache.set_many({_tag_key(tag): uuid.uuid4().hex for tag in tags}, timeout=None)
+
+
+def purge_tags_on_commit(*tags):
+    """
+    Purge once the current transaction commits, so a concurrent reader cannot
+    re-cache the pre-commit state after the purge.
+    """
+    transaction.on_commit(lambda: purge_tags(*tags), robust=True)
+
+
+def _record(view_name, event):
+    key = _counter_key(view_name, event)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def hit_rate(counts):
+    """Share of requests answered from the cache (fresh, stale or coalesced)."""
+    total = sum(counts[event] for event in COUNTER_EVENTS)
+    if not total:
+        return 0.0
+    return round((total - counts[MISS]) / total, 4)
+
+
+def get_cache_counters():
+    """Hit / miss / coalesced / stale counts and the hit rate per cached view."""
+    keys = {
+        _counter_key(view_name, event): (view_name, event)
+        for view_name in _cached_views
+        for event in COUNTER_EVENTS
+    }
+    found = cache.get_many(list(keys))
+    counters = {view_name: dict.fromkeys(COUNTER_EVENTS, 0) for view_name in _cached_views}
+    for key, (view_name, event) in keys.items():
+        counters[view_name][event] = found.get(key, 0)
+    for counts in counters.values():
+        counts["hit_rate"] = hit_rate(counts)
+    return counters
+
+
+def reset_cache_counters():
+    cache.delete_many([
+        _counter_key(view_name, event)
+        for view_name in _cached_views
+        for event in COUNTER_EVENTS
+    ])
+
+
+def _acquire(key):
+    token = uuid.uuid4().hex
+    if cache.add(_lock_key(key), token, timeout=lock_timeout()):
+        return token
+    return None
+
+
+def _release(key, token):
+    if token is None:
+        return
+    lock_key = _lock_key(key)
+    # Never drop a lock that expired and was taken over by another request
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def _is_current(entry):
+    versions = entry["versions"]
+    return get_tag_versions(versions) == versions
+
+
+def _needs_refresh(entry, now):
+    """
+    Expired entries always need a refresh. Fresh ones are refreshed early with
+    a probability that grows as expiry approaches, scaled by how long the
+    view took to compute (XFetch), so popular keys rarely expire under load.
+    """
+    if now >= entry["fresh_until"]:
+        return True
+    beta = early_refresh_beta()
+    if beta <= 0:
+        return False
+    # 1 - random() lies in (0, 1], so the log is always defined
+    return now - entry["delta"] * beta * math.log(1.0 - random.random()) >= entry["fresh_until"]
+
+
+def _wait_for_entry(key):
+    """Wait for the lock holder to store `key`; None if it gave up or timed out."""
+    deadline = time.monotonic() + coalesce_timeout()
+    while time.monotonic() < deadline:
+        time.sleep(COALESCE_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and _is_current(entry):
+            return entry
+        if cache.get(_lock_key(key)) is None:
+            return None
+    return None
+
+
+def _entry_response(entry):
+    return HttpResponse(entry["content"], status=entry["status"], headers=entry["headers"])
+
+
+def cache_response(tags, late_tags=None, ttl=None, per_user=False):
+    """
+    Tag-based response cache for read views.
+
+    `tags(request, *args, **kwargs)` returns the tags known before the view
+    runs; their versions are snapshotted first, so a purge that races with the
+    view makes the stored entry stale immediately. `late_tags(response)` may
+    add tags that depend on the response data (e.g. the product's category).
+
+    An entry is served only while all its tag versions are unchanged, so
+    `purge_tags()` invalidates it immediately regardless of the TTL.
+    Only 200 responses are stored.
+
+    Recomputation is single-flight per key: the request holding the lock runs
+    the view, while others serve the expired entry for up to
+    API_CACHE_STALE_TTL seconds (stale-while-revalidate) or, when there is
+    nothing valid to serve, wait for the lock holder's result.
+
+    With `per_user`, entries are keyed by the authenticated user and carry
+    the user's version tag (`user_tag`), which `bump_user_version` purges.
+    Such views must apply the decorator below `@api_view` so the request is
+    already authenticated; anonymous requests are not cached.
+    """
+    def decorator(view_func):
+        # @api_view views are WrappedAPIView.as_view() functions named "view"
+        view_name = getattr(view_func, "cls", view_func).__name__
+        _cached_views.add(view_name)
+
+        def compute(request, key, token, timeout, args, kwargs):
+            try:
+                started = time.monotonic()
+                request_tags = list(tags(request, *args, **kwargs))
+                if per_user:
+                    request_tags.append(user_tag(request.user.pk))
+                versions = get_tag_versions(request_tags)
+                response = view_func(request, *args, **kwargs)
+            except BaseException:
+                _release(key, token)
+                raise
+
+            if response.status_code != 200 or getattr(response, "streaming", False):
+                _release(key, token)
+                return response
+
+            if late_tags is not None:
+                versions.update(get_tag_versions(late_tags(response)))
+
+            def store(rendered):
+                try:
+                    now = time.time()
+                    entry = {
+                        "status": rendered.status_code,
+                        "headers": {
+                            name: value
+                            for name, value in rendered.items()
+                            if name.lower() not in UNCACHED_HEADERS
+                        },
+                        "content": rendered.content,
+                        "versions": versions,
+                        "fresh_until": now + timeout,
+                        "delta": time.monotonic() - started,
+                    }
+                    cache.set(key, entry, timeout + stale_ttl())
+                finally:
+                    _release(key, token)
+
+            if hasattr(response, "add_post_render_callback") and not response.is_rendered:
+                response.add_post_render_callback(store)
+            else:
+                store(response)
+            return response
+
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            timeout = response_cache_ttl() if ttl is None else ttl
+            if timeout <= 0 or request.method not in CACHEABLE_METHODS:
+                return view_func(request, *args, **kwargs)
+
+            user_id = None
+            if per_user:
+                user_id = request.user.pk
+                if user_id is None:
+                    return view_func(request, *args, **kwargs)
+
+            key = _response_key(request, user_id)
+            entry = cache.get(key)
+            if entry is not None and _is_current(entry):
+                if not _needs_refresh(entry, time.time()):
+                    _record(view_name, HIT)
+                    return _entry_response(entry)
+                token = _acquire(key)
+                if token is None:
+                    # someone else is already refreshing this key
+                    _record(view_name, STALE)
+                    return _entry_response(entry)
+            else:
+                # missing or purged: never serve it, wait for the refresh instead
+                token = _acquire(key)
+                if token is None:
+                    entry = _wait_for_entry(key)
+                    if entry is not None:
+                        _record(view_name, COALESCED)
+                        return _entry_response(entry)
+
+            _record(view_name, MISS)
+            return compute(request, key, token, timeout, args, kwargs)
+        return wrapped
+    return decorator
@@ -0,0 +1,82 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+SEARCH_ENGINE_ICONTAINS = "icontains"
+SEARCH_ENGINE_FULLTEXT = "fulltext"
+
+# Must match the expression of api_product_name_search_idx (migration 0014),
+# otherwise Postgres cannot use the GIN index for the @@ match.
+SEARCH_CONFIG = "simple"
+
+
+def get_search_engine():
+    return getattr(settings, "PRODUCT_SEARCH_ENGINE", SEARCH_ENGINE_ICONTAINS)
+
+
+def split_keywords(search):
+    """Normalize the raw `search` param into keywords (AND semantics)."""
+    if search is None:
+        return []
+    # Normalize whitespace and plus signs from query string
+    search = search.replace('+', ' ').strip()
+    return [k for k in re.split(r"\s+", search) if k]
+
+
+def product_name_vector():
+    return SearchVector("name", config=SEARCH_CONFIG)
+
+
+def _prefix_terms(keywords):
+    # Only word characters reach to_tsquery, so user input can never inject
+    # tsquery operators. Every term is matched as a prefix (`term:*`).
+    terms = []
+    for kw in keywords:
+        terms.extend(re.findall(r"\w+", kw.lower()))
+    return [f"{term}:*" for term in terms]
+
+
+def icontains_search(queryset, keywords):
+    for kw in keywords:
+        queryset = queryset.filter(name__icontains=kw)
+    return queryset
+
+
+def fulltext_search(queryset, keywords):
+    """
+    Match every keyword as a word prefix through the GIN full-text index and
+    rank the hits by relevance.
+    """
+    terms = _prefix_terms(keywords)
+    if not terms:
+        # Nothing indexable (e.g. punctuation only): keep the legacy behaviour
+        return icontains_search(queryset, keywords)
+
+    query = SearchQuery(" & ".join(terms), search_type="raw", config=SEARCH_CONFIG)
+    vector = product_name_vector()
+    return (
+        queryset
+        .alias(search_document=vector)
+        .filter(search_document=query)
+        .annotate(search_rank=SearchRank(vector, query))
+    )
+
+
+def search_products(queryset, search, engine=None):
+    """
+    Apply the product `search` query param to `queryset`.
+
+    Returns `(queryset, ranked)`; `ranked` is True when the queryset carries a
+    `search_rank` annotation the caller should order by.
+    """
+    keywords = split_keywords(search)
+    if not keywords:
+        return queryset, False
+
+    engine = engine or get_search_engine()
+    if engine == SEARCH_ENGINE_FULLTEXT:
+        queryset = fulltext_search(queryset, keywords)
+        return queryset, "search_rank" in queryset.query.annotations
+
+    return icontains_search(queryset, keywords), False
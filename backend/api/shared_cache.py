@@ -0,0 +1,492 @@
+"""
+Django cache backend shared by every worker process on a host.
+
+Entries live in a memory-mapped file (put it on /dev/shm so it never touches
+disk) laid out as fixed-size open-addressing hash tables. Every worker maps
+the same file, so a value cached by one gunicorn worker is visible to all of
+them, and counters such as DRF throttle histories are no longer per process.
+
+    CACHES = {
+        "default": {
+            "BACKEND": "api.shared_cache.SharedMemoryCache",
+            "LOCATION": "/dev/shm/tmdt-cache",
+            "OPTIONS": {"MAX_ENTRIES": 10000, "MAX_VALUE_SIZE": 65536, "SIZE_BYTES": 32 * 1024 * 1024},
+        }
+    }
+
+Operations are serialized with flock() on the file (across processes) plus a
+thread lock (within a process). Values larger than MAX_VALUE_SIZE pickled
+bytes are not cached.
+
+Slots are fixed-size, so the file is split into size classes (slabs): one
+table of SMALL_VALUE_SIZE slots, then tables SLAB_GROWTH times larger up to
+MAX_VALUE_SIZE. A value goes to the smallest class it fits in. Most entries
+(throttle histories, tag versions, locks, counters) are small, so the small
+table gets room for MAX_ENTRIES first, within half of SIZE_BYTES; the larger
+classes share the rest. Each class holds at most MAX_ENTRIES; when a class
+is full, its expired entries are dropped first, then the least recently used
+1/CULL_FREQUENCY of the rest. If SIZE_BYTES cannot hold MAX_ENTRIES small
+entries, the limit is lowered with a warning.
+
+The file never grows past SIZE_BYTES and is written sparsely (only pages of
+slots in use take memory), but touching a page when tmpfs is full kills the
+process with SIGBUS, so `fits()` checks the budget against the free space
+before the backend is configured. Changing MAX_ENTRIES, MAX_VALUE_SIZE or
+SIZE_BYTES reinitializes (empties) the file, so keep them identical across
+workers.
+"""
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TMDTSHM2"
+# magic, layout digest, access clock
+HEADER = struct.Struct("<8sQQ")
+CLOCK_OFFSET = 16
+# used slots, at the start of every table
+TABLE_HEADER = struct.Struct("<Q")
+# state, key length, value length, key hash, expires at (0 = never), last access
+SLOT = struct.Struct("<B3xIIQdQ")
+
+EMPTY = 0
+USED = 1
+
+MAX_KEY_SIZE = 250
+DEFAULT_LOCATION = "/dev/shm/django-shared-cache" if os.path.isdir("/dev/shm") else "/tmp/django-shared-cache"
+DEFAULT_MAX_VALUE_SIZE = 64 * 1024
+DEFAULT_SIZE_BYTES = 32 * 1024 * 1024
+SMALL_VALUE_SIZE = 1024
+SLAB_GROWTH = 8
+
+# (path, layout digest) -> _Segment mapped by this process
+_segments = {}
+_segments_lock = threading.Lock()
+# layouts already warned about by this process
+_warned = set()
+
+
+def fits(location, size_bytes):
+    """Whether a cache file of `size_bytes` at `location` fits its filesystem's free space."""
+    try:
+        stats = os.statvfs(os.path.dirname(location) or ".")
+    except OSError:
+        return False
+    available = stats.f_bavail * stats.f_frsize
+    try:
+        # pages an existing file already holds are reused
+        available += os.stat(location).st_blocks * 512
+    except OSError:
+        pass
+    return size_bytes <= available
+
+
+def _key_bytes(key):
+    raw = key.encode("utf-8")
+    if len(raw) > MAX_KEY_SIZE:
+        # long keys (e.g. full request paths) are stored by digest
+        raw = b"#" + hashlib.sha256(raw).hexdigest().encode("ascii")
+    return raw
+
+
+def _key_hash(raw):
+    # must be stable across processes, so not hash()
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little")
+
+
+def _slot_size(value_size):
+    return SLOT.size + MAX_KEY_SIZE + value_size
+
+
+def _table_bytes(slot_count, value_size):
+    return TABLE_HEADER.size + slot_count * _slot_size(value_size)
+
+
+def _wanted_slots(max_entries):
+    # keep the load factor <= 0.8 so linear probes stay short
+    return max(max_entries + max_entries // 4, max_entries + 1)
+
+
+def _layout(max_entries, max_value_size, size_bytes):
+    """`[(value size, slot count)]` per size class, smallest first, within `size_bytes`."""
+    value_sizes = [min(SMALL_VALUE_SIZE, max_value_size)]
+    while value_sizes[-1] < max_value_size:
+        value_sizes.append(min(value_sizes[-1] * SLAB_GROWTH, max_value_size))
+
+    wanted = _wanted_slots(max_entries)
+    budget = size_bytes - HEADER.size
+    small_budget = budget if len(value_sizes) == 1 else budget // 2
+    small_slots = min(wanted, (small_budget - TABLE_HEADER.size) // _slot_size(value_sizes[0]))
+    layout = [(value_sizes[0], small_slots)]
+
+    rest = budget - _table_bytes(small_slots, value_sizes[0])
+    for value_size in value_sizes[1:]:
+        share = rest // (len(value_sizes) - len(layout))
+        slots = min(wanted, (share - TABLE_HEADER.size) // _slot_size(value_size))
+        if slots < 2:
+            # values of this size are not cached
+            break
+        layout.append((value_size, slots))
+        rest -= _table_bytes(slots, value_size)
+    return layout
+
+
+class _Table:
+    """One size class: an open-addressing hash table of equal slots."""
+
+    def __init__(self, base, value_size, slot_count, max_entries):
+        self.base = base
+        self.value_size = value_size
+        self.slot_count = slot_count
+        self.slot_size = _slot_size(value_size)
+        self.max_entries = max_entries
+        self.end = base + _table_bytes(slot_count, value_size)
+
+    def offset(self, index):
+        return self.base + TABLE_HEADER.size + index * self.slot_size
+
+
+class _Segment:
+    """One process's mapping of the cache file."""
+
+    def __init__(self, path, size, digest):
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.size = size
+        self.digest = digest
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(self.fd, HEADER.size, 0)
+            if len(header) < HEADER.size or HEADER.unpack(header)[:2] != (MAGIC, digest):
+                self.reset()
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.map = mmap.mmap(self.fd, self.size)
+
+    def reset(self):
+        # Shrinking to zero drops every page; growing back reads as zeros
+        # (EMPTY slots, zero counters) without allocating memory.
+        os.ftruncate(self.fd, 0)
+        os.ftruncate(self.fd, self.size)
+        os.pwrite(self.fd, HEADER.pack(MAGIC, self.digest, 0), 0)
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+
+class SharedMemoryCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._path = location or DEFAULT_LOCATION
+        self._max_value_size = int(options.get("MAX_VALUE_SIZE", DEFAULT_MAX_VALUE_SIZE))
+        size_bytes = int(options.get("SIZE_BYTES", DEFAULT_SIZE_BYTES))
+
+        layout = _layout(self._max_entries, self._max_value_size, size_bytes)
+        if layout[0][1] < 2:
+            raise ImproperlyConfigured("SharedMemoryCache SIZE_BYTES is too small for two slots.")
+        wanted = _wanted_slots(self._max_entries)
+        self._tables = []
+        base = HEADER.size
+        for value_size, slot_count in layout:
+            # a table holds max_entries unless the budget cut its slots
+            max_entries = self._max_entries if slot_count == wanted else max(1, slot_count * 4 // 5)
+            self._tables.append(_Table(base, value_size, slot_count, max_entries))
+            base = self._tables[-1].end
+        self._size = base
+        self._digest = int.from_bytes(
+            hashlib.blake2b(repr((self._max_entries, layout)).encode(), digest_size=8).digest(), "little"
+        )
+
+        small = self._tables[0]
+        if small.max_entries < self._max_entries and (self._path, self._digest) not in _warned:
+            _warned.add((self._path, self._digest))
+            logger.warning(
+                "Shared cache %s: SIZE_BYTES=%d holds %d small entries; MAX_ENTRIES=%d lowered.",
+                self._path, size_bytes, small.max_entries, self._max_entries,
+            )
+        if self._tables[-1].value_size < self._max_value_size and (self._path, "value") not in _warned:
+            _warned.add((self._path, "value"))
+            logger.warning(
+                "Shared cache %s: SIZE_BYTES=%d leaves no room for values over %d bytes.",
+                self._path, size_bytes, self._tables[-1].value_size,
+            )
+
+    # ---- public API ----
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._locked() as mm:
+            raw = _key_bytes(key)
+            table, index = self._lookup(mm, raw)
+            if table is not None and not self._expired(mm, table, index):
+                return False
+            return self._store(mm, raw, pickled, self.get_backend_timeout(timeout))
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._locked() as mm:
+            table, index = self._lookup(mm, _key_bytes(key))
+            if table is None:
+                return default
+            if self._expired(mm, table, index):
+                self._delete_at(mm, table, index)
+                return default
+            pickled = self._read_value(mm, table, index)
+            self._touch_access(mm, table, index)
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._locked() as mm:
+            self._store(mm, _key_bytes(key), pickled, self.get_backend_timeout(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._locked() as mm:
+            table, index = self._lookup(mm, _key_bytes(key))
+            if table is None or self._expired(mm, table, index):
+                return False
+            self._write_expires(mm, table, index, self.get_backend_timeout(timeout))
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._locked() as mm:
+            raw = _key_bytes(key)
+            table, index = self._lookup(mm, raw)
+            if table is not None and self._expired(mm, table, index):
+                self._delete_at(mm, table, index)
+                table = None
+            if table is None:
+                raise ValueError("Key '%s' not found" % key)
+            expires = self._read_slot(mm, table, index)[4]
+            new_value = pickle.loads(self._read_value(mm, table, index)) + delta
+            pickled = pickle.dumps(new_value, self.pickle_protocol)
+            self._store(mm, raw, pickled, expires or None)
+        return new_value
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._locked() as mm:
+            table, index = self._lookup(mm, _key_bytes(key))
+            return table is not None and not self._expired(mm, table, index)
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._locked() as mm:
+            table, index = self._lookup(mm, _key_bytes(key))
+            if table is None:
+                return False
+            self._delete_at(mm, table, index)
+            return True
+
+    def clear(self):
+        with self._locked():
+            self._segment().reset()
+
+    # ---- segment & locking ----
+
+    def _segment(self):
+        name = (self._path, self._digest)
+        segment = _segments.get(name)
+        if segment is not None and segment.pid == os.getpid():
+            return segment
+        with _segments_lock:
+            segment = _segments.get(name)
+            if segment is None or segment.pid != os.getpid():
+                # After fork() the inherited descriptor shares its flock with
+                # the parent, so every process needs its own.
+                segment = _Segment(self._path, self._size, self._digest)
+                _segments[name] = segment
+            return segment
+
+    def _locked(self):
+        return _LockedMap(self._segment())
+
+    # ---- slot helpers (caller holds the lock) ----
+
+    def _read_slot(self, mm, table, index):
+        return SLOT.unpack_from(mm, table.offset(index))
+
+    def _read_key(self, mm, table, index):
+        start = table.offset(index) + SLOT.size
+        return mm[start:start + self._read_slot(mm, table, index)[1]]
+
+    def _read_value(self, mm, table, index):
+        _, key_len, value_len, _, _, _ = self._read_slot(mm, table, index)
+        start = table.offset(index) + SLOT.size + MAX_KEY_SIZE
+        return mm[start:start + value_len]
+
+    def _expired(self, mm, table, index, now=None):
+        expires = self._read_slot(mm, table, index)[4]
+        return expires != 0 and expires <= (now or time.time())
+
+    def _write_expires(self, mm, table, index, expires):
+        state, key_len, value_len, key_hash, _, access = self._read_slot(mm, table, index)
+        SLOT.pack_into(mm, table.offset(index), state, key_len, value_len, key_hash, expires or 0.0, access)
+
+    def _next_clock(self, mm):
+        clock = struct.unpack_from("<Q", mm, CLOCK_OFFSET)[0] + 1
+        struct.pack_into("<Q", mm, CLOCK_OFFSET, clock)
+        return clock
+
+    def _touch_access(self, mm, table, index):
+        state, key_len, value_len, key_hash, expires, _ = self._read_slot(mm, table, index)
+        SLOT.pack_into(
+            mm, table.offset(index), state, key_len, value_len, key_hash, expires, self._next_clock(mm)
+        )
+
+    def _used(self, mm, table):
+        return TABLE_HEADER.unpack_from(mm, table.base)[0]
+
+    def _add_used(self, mm, table, delta):
+        TABLE_HEADER.pack_into(mm, table.base, self._used(mm, table) + delta)
+
+    def _find(self, mm, table, raw):
+        """(slot index, found): the key's slot, or the empty slot ending its probe."""
+        key_hash = _key_hash(raw)
+        index = key_hash % table.slot_count
+        for _ in range(table.slot_count):
+            offset = table.offset(index)
+            state, key_len, _, slot_hash, _, _ = SLOT.unpack_from(mm, offset)
+            if state == EMPTY:
+                return index, False
+            if slot_hash == key_hash and mm[offset + SLOT.size:offset + SLOT.size + key_len] == raw:
+                return index, True
+            index = (index + 1) % table.slot_count
+        raise RuntimeError("shared cache table is full")
+
+    def _lookup(self, mm, raw):
+        """(table, slot index) holding the key, or (None, None)."""
+        for table in self._tables:
+            index, found = self._find(mm, table, raw)
+            if found:
+                return table, index
+        return None, None
+
+    def _table_for(self, size):
+        for table in self._tables:
+            if size <= table.value_size:
+                return table
+        return None
+
+    def _store(self, mm, raw, pickled, expires):
+        current, current_index = self._lookup(mm, raw)
+        table = self._table_for(len(pickled))
+        if current is not None and current is not table:
+            # too large to cache, or moving size class: never leave an older value behind
+            self._delete_at(mm, current, current_index)
+        if table is None:
+            return False
+
+        index, found = self._find(mm, table, raw)
+        if not found:
+            if self._used(mm, table) >= table.max_entries:
+                self._cull(mm, table)
+                index, _ = self._find(mm, table, raw)
+            self._add_used(mm, table, 1)
+
+        offset = table.offset(index)
+        SLOT.pack_into(
+            mm, offset, USED, len(raw), len(pickled), _key_hash(raw), expires or 0.0, self._next_clock(mm)
+        )
+        key_start = offset + SLOT.size
+        mm[key_start:key_start + len(raw)] = raw
+        value_start = key_start + MAX_KEY_SIZE
+        mm[value_start:value_start + len(pickled)] = pickled
+        return True
+
+    def _delete_at(self, mm, table, index):
+        """Remove a slot, shifting later probe-chain entries back (no tombstones)."""
+        hole = index
+        probe = index
+        while True:
+            probe = (probe + 1) % table.slot_count
+            state, key_len, value_len, key_hash, _, _ = self._read_slot(mm, table, probe)
+            if state == EMPTY:
+                break
+            home = key_hash % table.slot_count
+            # entries whose home lies cyclically in (hole, probe] stay put
+            if hole < probe:
+                stays = hole < home <= probe
+            else:
+                stays = home > hole or home <= probe
+            if stays:
+                continue
+            self._copy_slot(mm, table, probe, hole, key_len, value_len)
+            hole = probe
+        mm[table.offset(hole)] = EMPTY
+        self._add_used(mm, table, -1)
+
+    def _copy_slot(self, mm, table, source, target, key_len, value_len):
+        src = table.offset(source)
+        dst = table.offset(target)
+        mm[dst:dst + SLOT.size + key_len] = mm[src:src + SLOT.size + key_len]
+        value_src = src + SLOT.size + MAX_KEY_SIZE
+        value_dst = dst + SLOT.size + MAX_KEY_SIZE
+        mm[value_dst:value_dst + value_len] = mm[value_src:value_src + value_len]
+
+    def _cull(self, mm, table):
+        now = time.time()
+        expired = []
+        live = []
+        for index in range(table.slot_count):
+            state, _, _, _, expires, access = self._read_slot(mm, table, index)
+            if state == EMPTY:
+                continue
+            if expires != 0 and expires <= now:
+                expired.append(self._read_key(mm, table, index))
+            else:
+                live.append((access, self._read_key(mm, table, index)))
+
+        # Slots move on every deletion, so victims are removed by key
+        victims = expired
+        if self._used(mm, table) - len(expired) >= table.max_entries:
+            if self._cull_frequency == 0:
+                victims += [raw for _, raw in live]
+            else:
+                live.sort()
+                victims += [raw for _, raw in live[:max(1, len(live) // self._cull_frequency)]]
+        for raw in victims:
+            index, found = self._find(mm, table, raw)
+            if found:
+                self._delete_at(mm, table, index)
+
+
+class _LockedMap:
+    """Holds the thread lock and the file lock for the duration of a `with`."""
+
+    def __init__(self, segment):
+        self.segment = segment
+
+    def __enter__(self):
+        self.segment.lock.acquire()
+        try:
+            fcntl.flock(self.segment.fd, fcntl.LOCK_EX)
+        except BaseException:
+            self.segment.lock.release()
+            raise
+        return self.segment.map
+
+    def __exit__(self, *exc_info):
+        try:
+            fcntl.flock(self.segment.fd, fcntl.LOCK_UN)
+        finally:
+            self.segment.lock.release()
@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .conditional import bump_catalog_version
+from .models import CatalogVersion, Category, Product
+from .product_stats import StatisticsDelta
+from .response_cache import (
+    CATEGORY_LIST_TAG,
+    PRODUCT_LIST_TAG,
+    PRODUCT_STATS_TAG,
+    category_tag,
+    product_tag,
+    purge_tags_on_commit,
+)
+
+STATS_FIELDS = ("price", "stock", "category_id")
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_stats_state(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    instance._stats_previous = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and not ({"price", "stock", "category", "category_id"} & set(update_fields)):
+        return
+    # Read the stored row rather than trusting the in-memory instance,
+    # which may be stale after queryset.update() calls.
+    queryset = Product.objects.using(using).filter(pk=instance.pk)
+    if transaction.get_connection(using).in_atomic_block:
+        # Locked until commit, so a concurrent save waits and then reads this
+        # save's values instead of subtracting the same old row twice.
+        queryset = queryset.select_for_update()
+    instance._stats_previous = queryset.values_list(*STATS_FIELDS).first()
+
+
+@receiver(post_save, sender=Product)
+def update_product_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    bump_catalog_version(CatalogVersion.PRODUCT)
+    purge_tags_on_commit(product_tag(instance.pk), PRODUCT_LIST_TAG, PRODUCT_STATS_TAG)
+
+    delta = StatisticsDelta()
+    previous = getattr(instance, "_stats_previous", None)
+    if created:
+        delta.add_product(instance.category_id, instance.price, instance.stock)
+    elif previous is not None:
+        price, stock, category_id = previous
+        if previous == (instance.price, instance.stock, instance.category_id):
+            return
+        delta.add_product(category_id, price, stock, sign=-1)
+        delta.add_product(instance.category_id, instance.price, instance.stock)
+    else:
+        return
+    delta.apply()
+
+
+@receiver(post_delete, sender=Product)
+def update_product_stats_on_delete(sender, instance, **kwargs):
+    bump_catalog_version(CatalogVersion.PRODUCT)
+    purge_tags_on_commit(product_tag(instance.pk), PRODUCT_LIST_TAG, PRODUCT_STATS_TAG)
+
+    delta = StatisticsDelta()
+    delta.add_product(instance.category_id, instance.price, instance.stock, sign=-1)
+    delta.apply()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_category_version(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    bump_catalog_version(CatalogVersion.CATEGORY)
+    purge_tags_on_commit(category_tag(instance.pk), CATEGORY_LIST_TAG)
@@ -0,0 +1,265 @@
+"""
+Sharded stock counters for hot products.
+
+Every checkout of a product locks and updates its one `api_product` row, so
+during a flash sale checkouts of that product run one at a time.
+`shard_product` splits the product's stock across STOCK_SLOT_COUNT
+StockSlot rows. Checkout (api.checkout) then takes the quantity from one
+slot that covers it, picked with `FOR UPDATE SKIP LOCKED`: concurrent
+checkouts land on different slots instead of queueing on the product row.
+When no unlocked slot covers the quantity, `take_from_slots` gives its picks
+back, waits for the slots and drains several of them, so a checkout only
+fails when the total is short.
+
+The exact stock of a sharded product is the sum of its slots. That is what
+`product_detail`, add-to-cart and checkout use. `Product.stock` becomes a
+copy that `rebalance_stock_slots` refreshes (along with the statistics),
+which is what listings, filters and facets read in between. Rebalancing also
+evens the slots out again, since checkouts drain the fullest ones first. It
+runs in the background via `manage.py rebalance_stock_slots`.
+
+Sharded products are not reserved at add-to-cart (api.reservations):
+sharding gives their holds back, and checkout takes from the slots instead.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery, Sum
+
+from .models import Product, StockSlot
+from .reservations import record_stock_changes, release_product_reservations
+
+
+def slot_count():
+    return getattr(settings, "STOCK_SLOT_COUNT", 8)
+
+
+def available_stock_sql(alias):
+    """SQL for the exact stock of the `alias` product row: its slots, if any."""
+    slot = StockSlot._meta.db_table
+    return (
+        f"COALESCE((SELECT SUM(slot.stock) FROM {slot} AS slot "
+        f"WHERE slot.product_id = {alias}.id), {alias}.stock)"
+    )
+
+
+def with_slot_stock(queryset):
+    """Annotate `slot_stock`: the sum of the product's slots, None if unsharded."""
+    totals = (
+        StockSlot.objects
+        .filter(product=OuterRef("pk"))
+        .values("product")
+        .annotate(total=Sum("stock"))
+        .values("total")
+    )
+    return queryset.annotate(slot_stock=Subquery(totals))
+
+
+def split_stock(total, count):
+    """`total` spread over `count` slots, the remainder on the first ones."""
+    share, remainder = divmod(total, count)
+    return [share + (1 if index < remainder else 0) for index in range(count)]
+
+
+def _sync_product(product, total):
+    if product.stock != total:
+        Product.objects.filter(pk=product.pk).update(stock=total)
+        record_stock_changes([(product.pk, product.price, product.category_id, total - product.stock)])
+
+
+def _write_slots(product_id, total, count):
+    StockSlot.objects.filter(product_id=product_id).delete()
+    StockSlot.objects.bulk_create(
+        StockSlot(product_id=product_id, stock=stock) for stock in split_stock(total, count)
+    )
+
+
+def shard_product(product_id, slots=None):
+    """
+    Split the product's stock across `slots` slots (STOCK_SLOT_COUNT by
+    default). A sharded product is resharded with its current total.
+    Returns the total.
+    """
+    count = slots or slot_count()
+    release_product_reservations([product_id])
+    with transaction.atomic():
+        # product row first, then slots: the lock order of every writer but checkout
+        product = Product.objects.select_for_update().get(pk=product_id)
+        sharded = list(StockSlot.objects.select_for_update().filter(product_id=product_id).order_by("id"))
+        total = sum(slot.stock for slot in sharded) if sharded else product.stock
+        _write_slots(product_id, max(total, 0), count)
+        _sync_product(product, max(total, 0))
+    return max(total, 0)
+
+
+def unshard_product(product_id):
+    """Move the slots' total back into `Product.stock` and drop the slots."""
+    with transaction.atomic():
+        product = Product.objects.select_for_update().get(pk=product_id)
+        sharded = list(StockSlot.objects.select_for_update().filter(product_id=product_id).order_by("id"))
+        if not sharded:
+            return product.stock
+        total = sum(slot.stock for slot in sharded)
+        StockSlot.objects.filter(product_id=product_id).delete()
+        _sync_product(product, total)
+    return total
+
+
+def set_slot_stock(product_id, total):
+    """
+    Respread a new total (an admin stock edit) over a sharded product's
+    slots. Returns False when the product is not sharded.
+    """
+    with transaction.atomic():
+        sharded = list(StockSlot.objects.select_for_update().filter(product_id=product_id).order_by("id"))
+        if not sharded:
+            return False
+        _write_slots(product_id, max(total, 0), len(sharded))
+    return True
+
+
+def _pick_sql():
+    slot = StockSlot._meta.db_table
+    return f"""
+        WITH needs AS (
+            SELECT * FROM unnest(%(product_ids)s::bigint[], %(quantities)s::bigint[])
+                AS needs(product_id, quantity)
+        ), picked AS (
+            -- one slot covering the quantity, skipping the slots other
+            -- checkouts hold instead of waiting for them
+            SELECT pick.id, needs.quantity
+            FROM needs
+            CROSS JOIN LATERAL (
+                SELECT id FROM {slot} AS slot
+                WHERE slot.product_id = needs.product_id AND slot.stock >= needs.quantity
+                ORDER BY slot.stock DESC
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            ) AS pick
+        ), taken AS (
+            UPDATE {slot} AS slot
+            SET stock = slot.stock - picked.quantity
+            FROM picked
+            WHERE slot.id = picked.id AND slot.stock >= picked.quantity
+            RETURNING slot.product_id
+        )
+        SELECT product_id FROM taken
+    """
+
+
+def _take_sql():
+    slot = StockSlot._meta.db_table
+    return f"""
+        WITH needs AS (
+            SELECT * FROM unnest(%(product_ids)s::bigint[], %(quantities)s::bigint[])
+                AS needs(product_id, quantity)
+        ), slots AS (
+            -- (product_id, id) is the lock order of every multi-product slot writer
+            SELECT id, product_id, stock FROM {slot}
+            WHERE product_id IN (SELECT product_id FROM needs)
+            ORDER BY product_id, id
+            FOR UPDATE
+        ), running AS (
+            -- fullest slots first; `before` is what the fuller ones give
+            SELECT slots.id, slots.stock, needs.quantity,
+                   SUM(slots.stock) OVER (
+                       PARTITION BY slots.product_id ORDER BY slots.stock DESC, slots.id
+                   ) - slots.stock AS before,
+                   SUM(slots.stock) OVER (PARTITION BY slots.product_id) AS total
+            FROM slots JOIN needs ON needs.product_id = slots.product_id
+        ), taken AS (
+            UPDATE {slot} AS slot
+            SET stock = slot.stock - LEAST(running.stock, running.quantity - running.before)
+            FROM running
+            WHERE slot.id = running.id
+              AND running.total >= running.quantity
+              AND running.before < running.quantity
+            RETURNING slot.product_id
+        )
+        SELECT DISTINCT product_id FROM taken
+    """
+
+
+def take_from_slots(needs):
+    """
+    Take `{product_id: quantity}` from the products' slots. Products whose
+    slots cannot cover their quantity are left alone. Returns the ids of the
+    products taken from.
+
+    Each product first gets one free slot that covers it (SKIP LOCKED, no
+    waiting). If that leaves any product uncovered, the picks are rolled
+    back to a savepoint, which releases their slot locks, and every product
+    is taken again waiting for the slots, locked in (product_id, id) order
+    and spread over as many slots as needed. A checkout therefore never
+    waits for a slot while holding another one out of order.
+    """
+    needs = {product_id: quantity for product_id, quantity in needs.items() if quantity > 0}
+    if not needs:
+        return set()
+    params = {"product_ids": list(needs), "quantities": list(needs.values())}
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(_pick_sql(), params)
+            picked = {row[0] for row in cursor.fetchall()}
+        if len(picked) == len(needs):
+            return picked
+        transaction.set_rollback(True)
+    with connection.cursor() as cursor:
+        cursor.execute(_take_sql(), params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _rebalance_sql(condition):
+    product = Product._meta.db_table
+    slot = StockSlot._meta.db_table
+    return f"""
+        WITH locked AS (
+            SELECT id, stock FROM {product}
+            WHERE id IN (SELECT product_id FROM {slot} WHERE {condition})
+            ORDER BY id
+            FOR UPDATE
+        ), slots AS (
+            SELECT id, product_id, stock FROM {slot}
+            WHERE product_id IN (SELECT id FROM locked)
+            ORDER BY product_id, id
+            FOR UPDATE
+        ), ranked AS (
+            SELECT id, product_id,
+                   SUM(stock) OVER (PARTITION BY product_id) AS total,
+                   COUNT(*) OVER (PARTITION BY product_id) AS count,
+                   ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY id) - 1 AS index
+            FROM slots
+        ), evened AS (
+            UPDATE {slot} AS slot
+            SET stock = ranked.total / ranked.count
+                        + CASE WHEN ranked.index < mod(ranked.total, ranked.count) THEN 1 ELSE 0 END
+            FROM ranked
+            WHERE slot.id = ranked.id
+        ), totals AS (
+            SELECT product_id, SUM(stock)::integer AS total FROM slots GROUP BY product_id
+        )
+        UPDATE {product} AS product
+        SET stock = totals.total
+        FROM totals, locked
+        WHERE product.id = totals.product_id
+          AND locked.id = product.id
+          AND locked.stock <> totals.total
+        RETURNING product.id, product.price, product.category_id, totals.total - locked.stock
+    """
+
+
+def rebalance_stock_slots(product_ids=None):
+    """
+    Even out the slots of sharded products (all of them by default) and
+    copy their totals into `Product.stock`. Returns the number of products
+    whose copy was stale.
+    """
+    if product_ids is None:
+        condition, params = "TRUE", {}
+    else:
+        condition, params = "product_id = ANY(%(product_ids)s)", {"product_ids": list(product_ids)}
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(_rebalance_sql(condition), params)
+            rows = cursor.fetchall()
+        record_stock_changes(rows)
+    return len(rows)
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+STREAM_QUERY_PARAM = "stream"
+
+
+def wants_stream(request):
+    """True when the client asked for a streamed listing (`?stream=1`)."""
+    value = request.query_params.get(STREAM_QUERY_PARAM, "")
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def stream_chunk_size():
+    return getattr(settings, "STREAM_CHUNK_SIZE", 500)
+
+
+def iter_json_array(rows, serialize_chunk, chunk_size):
+    """
+    Yield a JSON array one chunk at a time.
+
+    `rows` is consumed lazily in groups of `chunk_size`; `serialize_chunk`
+    turns one group into a list of plain dicts. Each group is rendered with
+    DRF's JSONRenderer so the joined output is byte-identical to rendering the
+    whole list at once.
+    """
+    renderer = JSONRenderer()
+    yield b"["
+    first = True
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield _render_items(renderer, serialize_chunk(chunk), first)
+            first = False
+            chunk = []
+    if chunk:
+        yield _render_items(renderer, serialize_chunk(chunk), first)
+    yield b"]"
+
+
+def _render_items(renderer, items, first):
+    # strip the surrounding [ ] of the rendered chunk
+    body = renderer.render(items)[1:-1]
+    return body if first else b"," + body
+
+
+def streaming_json_response(queryset, serialize_chunk, chunk_size=None):
+    """
+    Stream `queryset` as a JSON array.
+
+    Rows are read through a server-side cursor (`QuerySet.iterator`), so worker
+    memory stays bounded by `chunk_size` rows whatever the table size.
+    """
+    chunk_size = chunk_size or stream_chunk_size()
+    rows = queryset.iterator(chunk_size=chunk_size)
+    return StreamingHttpResponse(
+        iter_json_array(rows, serialize_chunk, chunk_size),
+        content_type="application/json",
+    )
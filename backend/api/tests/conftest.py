@@ -85,6 +85,14 @@ def product_without_category():
     )
 
 
+def fill_cart(user, products, quantity=1):
+    """Put `quantity` of each of `products` in the user's cart"""
+    cart, _ = Cart.objects.get_or_create(user=user)
+    for product in products:
+        CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+    return cart
+
+
 @pytest.fixture
 def cart(user):
     """Create a test cart for user"""
@@ -0,0 +1,168 @@
+import pytest
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+
+from api.cart import _write_items
+from api.db_retry import get_retry_counters, reset_retry_counters
+from api.models import Cart, CartItem, Product
+from api.stock_slots import shard_product
+from api.tests.test_db_retry import conflict
+
+BATCH_URL = "/api/cart/batch/"
+
+
+def post_batch(client, items, **extra):
+    return client.post(BATCH_URL, {"items": items, **extra}, format="json")
+
+
+def quantities(user):
+    return dict(CartItem.objects.filter(cart__user=user).values_list("product_id", "quantity"))
+
+
+@pytest.mark.django_db
+class TestCartBatch:
+
+    def test_requires_auth(self, api_client, product):
+        response = post_batch(api_client, [{"product_id": product.id, "quantity": 1}])
+
+        assert response.status_code == 401
+
+    def test_add_set_remove(self, authenticated_client, user, cart_with_item, product, product_without_category):
+        # product has quantity 2 in the cart
+        response = post_batch(authenticated_client, [
+            {"product_id": product.id, "quantity": 3},
+            {"product_id": product_without_category.id, "quantity": 4, "op": "add"},
+            {"product_id": product_without_category.id, "quantity": 1, "op": "set"},
+            {"product_id": product.id, "op": "remove"},
+        ])
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["errors"] == []
+        assert [item["product"]["id"] for item in data["cart"]["items"]] == [product_without_category.id]
+        assert data["cart"]["total"] == product_without_category.price
+        assert quantities(user) == {product_without_category.id: 1}
+
+    def test_creates_cart(self, authenticated_client, user, multiple_products):
+        items = [{"product_id": p.id, "quantity": 2} for p in multiple_products]
+
+        response = post_batch(authenticated_client, items)
+
+        assert len(response.json()["cart"]["items"]) == len(multiple_products)
+        assert Cart.objects.filter(user=user).count() == 1
+
+    def test_partial_failure(self, authenticated_client, user, product, product_without_category):
+        Product.objects.filter(pk=product_without_category.pk).update(stock=0)
+
+        response = post_batch(authenticated_client, [
+            {"product_id": product.id, "quantity": 1},
+            {"product_id": product_without_category.id, "quantity": 1},
+            {"product_id": 999999, "quantity": 1},
+            {"product_id": product.id, "quantity": 0},
+            {"product_id": product.id, "op": "swap"},
+            {"product_id": product_without_category.id, "op": "remove"},
+        ])
+
+        assert response.status_code == 200
+        errors = {error["index"]: (error["status"], error["error"]) for error in response.json()["errors"]}
+        assert errors == {
+            1: (409, "Not enough stock"),
+            2: (404, "Product not found"),
+            3: (400, "quantity must be a positive integer"),
+            4: (400, "op must be one of: add, set, remove"),
+            5: (404, "Cart item not found"),
+        }
+        assert quantities(user) == {product.id: 1}
+
+    @pytest.mark.parametrize("op", ["add", "set"])
+    def test_remove_then_add_reuses_row(self, authenticated_client, user, cart_with_item, product, op):
+        item_id = CartItem.objects.get().pk
+
+        response = post_batch(authenticated_client, [
+            {"product_id": product.id, "op": "remove"},
+            {"product_id": product.id, "quantity": 3, "op": op},
+        ])
+
+        assert response.status_code == 200
+        assert response.json()["errors"] == []
+        assert quantities(user) == {product.id: 3}
+        assert CartItem.objects.get().pk == item_id
+
+    def test_sharded_product_uses_slot_total(self, authenticated_client, user, product):
+        shard_product(product.id, slots=2)
+
+        response = post_batch(authenticated_client, [{"product_id": product.id, "quantity": 1}])
+
+        assert response.json()["errors"] == []
+        assert quantities(user) == {product.id: 1}
+
+    def test_deadlock_retried(self, authenticated_client, user, product, monkeypatch, settings):
+        settings.DB_RETRY_BACKOFF_MS = 0
+        reset_retry_counters()
+        errors = [conflict("40P01")]
+
+        def flaky(*args):
+            if errors:
+                raise errors.pop()
+            return _write_items(*args)
+        monkeypatch.setattr("api.cart._write_items", flaky)
+
+        response = post_batch(authenticated_client, [{"product_id": product.id, "quantity": 1}])
+
+        assert response.status_code == 200
+        assert quantities(user) == {product.id: 1}
+        assert get_retry_counters()["cart_batch"]["recovered"] == 1
+
+    def test_other_database_errors_conflict(self, authenticated_client, product, monkeypatch):
+        def broken(*args):
+            raise DatabaseError("disk full")
+        monkeypatch.setattr("api.cart._write_items", broken)
+
+        response = post_batch(authenticated_client, [{"product_id": product.id, "quantity": 1}])
+
+        assert response.status_code == 409
+        assert response.json() == {"error": "Database conflict, please retry"}
+
+    def test_atomic_rejects_whole_batch(self, authenticated_client, user, cart_with_item, product):
+        response = post_batch(
+            authenticated_client,
+            [{"product_id": product.id, "quantity": 5, "op": "set"}, {"product_id": 999999, "quantity": 1}],
+            atomic=True,
+        )
+
+        assert response.status_code == 400
+        assert [error["index"] for error in response.json()["errors"]] == [1]
+        assert quantities(user) == {product.id: 2}
+
+    def test_nothing_applied_leaves_cart_alone(self, authenticated_client, user):
+        response = post_batch(authenticated_client, [{"product_id": 999999, "quantity": 1}])
+
+        assert response.json()["cart"]["id"] is None
+        assert not Cart.objects.filter(user=user).exists()
+
+    def test_one_cart_lock_and_timestamp_update(self, authenticated_client, cart, multiple_products):
+        before = Cart.objects.get(pk=cart.pk).updated_at
+        items = [{"product_id": p.id, "quantity": 1} for p in multiple_products]
+
+        with CaptureQueriesContext(connection) as queries:
+            post_batch(authenticated_client, items)
+
+        statements = [" ".join(q["sql"].split()) for q in queries]
+        cart_writes = [sql for sql in statements if sql.startswith(("INSERT INTO api_cart ", 'UPDATE "api_cart"'))]
+        assert len(cart_writes) == 1
+        item_writes = [sql for sql in statements if sql.startswith('INSERT INTO "api_cartitem"')]
+        assert len(item_writes) == 1
+        assert Cart.objects.get(pk=cart.pk).updated_at > before
+
+    @pytest.mark.parametrize("body", [{}, {"items": []}, {"items": "x"}, {"items": [{}], "atomic": "yes"}])
+    def test_invalid_body(self, authenticated_client, body):
+        response = authenticated_client.post(BATCH_URL, body, format="json")
+
+        assert response.status_code == 400
+
+    def test_max_items(self, settings, authenticated_client, product):
+        settings.CART_BATCH_MAX_ITEMS = 2
+
+        response = post_batch(authenticated_client, [{"product_id": product.id, "quantity": 1}] * 3)
+
+        assert response.status_code == 400
@@ -0,0 +1,61 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import CartItem, Product
+
+CART_URL = "/api/cart/"
+SUMMARY_URL = "/api/cart/summary/"
+
+
+def api_queries(queries):
+    # excludes the JWT user lookup
+    return [q["sql"] for q in queries if '"api_' in q["sql"]]
+
+
+@pytest.mark.django_db
+class TestCartSummary:
+
+    def test_empty_cart(self, authenticated_client):
+        response = authenticated_client.get(SUMMARY_URL)
+
+        assert response.status_code == 200
+        assert response.json() == {"item_count": 0, "product_count": 0, "total": 0}
+
+    def test_counts_and_total(self, authenticated_client, cart_with_item, product, product_without_category):
+        CartItem.objects.create(cart=cart_with_item, product=product_without_category, quantity=3)
+
+        data = authenticated_client.get(SUMMARY_URL).json()
+
+        assert data == {
+            "item_count": 5,
+            "product_count": 2,
+            "total": product.price * 2 + product_without_category.price * 3,
+        }
+        assert data["total"] == authenticated_client.get(CART_URL).json()["total"]
+
+    def test_total_beyond_integer_range(self, authenticated_client, cart, product):
+        Product.objects.filter(pk=product.pk).update(price=2_000_000_000)
+        CartItem.objects.create(cart=cart, product=product, quantity=3)
+
+        assert authenticated_client.get(SUMMARY_URL).json()["total"] == 6_000_000_000
+
+    def test_one_query(self, authenticated_client, cart_with_item):
+        with CaptureQueriesContext(connection) as queries:
+            authenticated_client.get(SUMMARY_URL)
+
+        assert len(api_queries(queries)) == 1
+
+    def test_requires_auth(self, api_client):
+        assert api_client.get(SUMMARY_URL).status_code == 401
+
+
+@pytest.mark.django_db
+def test_cart_get_does_not_load_categories(authenticated_client, cart_with_item, product):
+    with CaptureQueriesContext(connection) as queries:
+        response = authenticated_client.get(CART_URL)
+
+    sql = api_queries(queries)
+    assert len(sql) == 2
+    assert not any('"api_category"' in statement for statement in sql)
+    assert response.json()["items"][0]["product"]["category"] == product.category_id
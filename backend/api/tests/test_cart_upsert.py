@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.cart import CART_ENGINE_LOCKING, CART_ENGINE_UPSERT, CartError, add_to_cart
+from api.models import Cart, CartItem, Product
+
+CART_URL = "/api/cart/"
+ENGINES = [CART_ENGINE_UPSERT, CART_ENGINE_LOCKING]
+
+
+@pytest.mark.django_db
+class TestAddToCartEngines:
+
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_create_then_increment(self, settings, authenticated_client, user, product, engine):
+        settings.CART_ADD_ENGINE = engine
+
+        first = authenticated_client.post(CART_URL, {"product_id": product.id, "quantity": 2}, format="json")
+        second = authenticated_client.post(CART_URL, {"product_id": product.id, "quantity": 3}, format="json")
+
+        assert first.status_code == second.status_code == 201
+        assert first.json()["id"] == second.json()["id"]
+        assert second.json()["quantity"] == 5
+        assert CartItem.objects.get(cart__user=user).quantity == 5
+
+    def test_engines_respond_identically(self, settings, authenticated_client, product):
+        responses = []
+        for engine in ENGINES:
+            settings.CART_ADD_ENGINE = engine
+            CartItem.objects.all().delete()
+            response = authenticated_client.post(CART_URL, {"product_id": product.id, "quantity": 1}, format="json")
+            data = response.json()
+            data.pop("id")
+            responses.append((response.status_code, data))
+
+        assert responses[0] == responses[1]
+
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_out_of_stock_writes_nothing(self, user, product, engine):
+        Product.objects.filter(pk=product.pk).update(stock=0)
+
+        with pytest.raises(CartError) as exc:
+            add_to_cart(user, product.id, 1, engine=engine)
+
+        assert (exc.value.status, exc.value.message) == (409, "Not enough stock")
+        assert not Cart.objects.filter(user=user).exists()
+
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_missing_product(self, user, engine):
+        with pytest.raises(CartError) as exc:
+            add_to_cart(user, 999999, 1, engine=engine)
+
+        assert exc.value.status == 404
+
+    def test_upsert_is_one_statement(self, user, product, cart_with_item):
+        with CaptureQueriesContext(connection) as queries:
+            item = add_to_cart(user, product.id, 1, engine=CART_ENGINE_UPSERT)
+
+        # the test transaction adds a savepoint around it; autocommit does not
+        statements = [q["sql"] for q in queries if "SAVEPOINT" not in q["sql"]]
+        assert len(statements) == 1
+        assert item.quantity == 3
+        assert item.product.name == product.name
+
+    def test_upsert_bumps_cart_updated_at(self, user, product, cart):
+        before = cart.updated_at
+
+        add_to_cart(user, product.id, 1, engine=CART_ENGINE_UPSERT)
+
+        cart.refresh_from_db()
+        assert cart.updated_at > before
+
+    def test_database_error_keeps_transaction_usable(self, user, product):
+        with pytest.raises(CartError) as exc:
+            add_to_cart(user, product.id, 2 ** 40, engine=CART_ENGINE_UPSERT)
+
+        assert exc.value.status == 409
+        assert add_to_cart(user, product.id, 1, engine=CART_ENGINE_UPSERT).quantity == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_upserts_do_not_lose_updates(user, product):
+    threads_count, adds_per_thread = 8, 5
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(adds_per_thread):
+                add_to_cart(user, product.id, 1, engine=CART_ENGINE_UPSERT)
+        except Exception as exc:  # pragma: no cover - reported below
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert Cart.objects.filter(user=user).count() == 1
+    assert CartItem.objects.get(cart__user=user).quantity == threads_count * adds_per_thread
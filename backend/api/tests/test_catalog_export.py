@@ -0,0 +1,144 @@
+import csv
+import gzip
+import io
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from api.catalog_export import EXPORT_COLUMNS
+from api.models import Product
+
+EXPORT_URL = "/api/products/export/"
+
+
+def body(response):
+    return b"".join(response.streaming_content)
+
+
+def csv_rows(data):
+    return list(csv.reader(io.StringIO(data.decode("utf-8"))))
+
+
+@pytest.mark.django_db
+class TestProductExportEndpoint:
+
+    def test_requires_admin(self, api_client, authenticated_client):
+        assert api_client.get(EXPORT_URL).status_code == 401
+        assert authenticated_client.get(EXPORT_URL).status_code == 403
+
+    def test_csv_joins_category_name(self, admin_client, product, product_without_category):
+        response = admin_client.get(EXPORT_URL)
+
+        assert response.status_code == 200
+        assert response.streaming
+        assert response["Content-Type"].startswith("text/csv")
+        rows = csv_rows(body(response))
+        assert tuple(rows[0]) == EXPORT_COLUMNS
+        assert rows[1][:6] == [
+            str(product.id), product.name, str(product.price), str(product.stock),
+            str(product.category_id), product.category.name,
+        ]
+        assert rows[2][4:6] == ["", ""]
+
+    def test_ndjson(self, admin_client, multiple_products):
+        response = admin_client.get(EXPORT_URL, {"output": "ndjson"})
+
+        lines = [json.loads(line) for line in body(response).decode("utf-8").splitlines()]
+        assert [line["id"] for line in lines] == [p.id for p in multiple_products]
+        assert lines[0]["category_name"] == multiple_products[0].category.name
+        assert lines[0]["created_at"].endswith("Z")
+
+    def test_resume_after_id(self, admin_client, multiple_products):
+        after = multiple_products[2].id
+
+        rows = csv_rows(body(admin_client.get(EXPORT_URL, {"after": after})))
+
+        # continuation: no header
+        assert [int(row[0]) for row in rows] == [p.id for p in multiple_products[3:]]
+
+    def test_gzip_on_the_fly(self, admin_client, multiple_products):
+        plain = body(admin_client.get(EXPORT_URL))
+
+        response = admin_client.get(EXPORT_URL, HTTP_ACCEPT_ENCODING="gzip, deflate")
+
+        assert response["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response["Vary"]
+        assert gzip.decompress(body(response)) == plain
+
+    def test_writes_in_chunks(self, settings, admin_client, multiple_products):
+        settings.STREAM_CHUNK_SIZE = 2
+
+        chunks = list(admin_client.get(EXPORT_URL, {"output": "ndjson"}).streaming_content)
+
+        assert [chunk.count(b"\n") for chunk in chunks] == [2, 2, 1]
+
+    @pytest.mark.parametrize("params", [{"output": "xml"}, {"after": "abc"}])
+    def test_invalid_params(self, admin_client, params):
+        assert admin_client.get(EXPORT_URL, params).status_code == 400
+
+
+@pytest.mark.django_db
+class TestExportProductsCommand:
+
+    def export(self, *args):
+        call_command("export_products", *args, stdout=StringIO(), stderr=StringIO())
+
+    def test_csv_file(self, tmp_path, multiple_products):
+        path = tmp_path / "products.csv"
+
+        self.export(str(path))
+
+        rows = csv_rows(path.read_bytes())
+        assert len(rows) == len(multiple_products) + 1
+
+    def test_gzip_file(self, tmp_path, multiple_products):
+        path = tmp_path / "products.ndjson.gz"
+
+        self.export(str(path))
+
+        lines = gzip.decompress(path.read_bytes()).decode("utf-8").splitlines()
+        assert [json.loads(line)["id"] for line in lines] == [p.id for p in multiple_products]
+
+    def test_resume_drops_partial_row(self, tmp_path, multiple_products):
+        path = tmp_path / "products.csv"
+        self.export(str(path))
+        full = path.read_bytes()
+        # interrupted after two rows and part of the third
+        lines = full.splitlines(keepends=True)
+        path.write_bytes(b"".join(lines[:3]) + lines[3][:5])
+
+        self.export(str(path), "--resume")
+
+        assert path.read_bytes() == full
+
+    def test_resume_with_newlines_in_names(self, tmp_path, multiple_products):
+        for product in multiple_products:
+            Product.objects.filter(pk=product.pk).update(name=f'Line one\n"{product.id}",\nline three')
+        path = tmp_path / "products.csv"
+        self.export(str(path))
+        full = path.read_bytes()
+        rows = csv_rows(full)
+        assert len(rows) == len(multiple_products) + 1
+        # interrupted inside the name of the third product
+        cut = full.index(f'"{multiple_products[2].id}"'.encode())
+        path.write_bytes(full[:cut])
+
+        self.export(str(path), "--resume")
+
+        assert path.read_bytes() == full
+
+    def test_resume_requires_plain_file(self, tmp_path):
+        with pytest.raises(CommandError):
+            self.export(str(tmp_path / "products.csv.gz"), "--resume")
+
+    def test_after(self, tmp_path, multiple_products):
+        path = tmp_path / "products.ndjson"
+
+        self.export(str(path), "--after", str(multiple_products[-2].id))
+
+        assert [json.loads(line)["id"] for line in path.read_text().splitlines()] == [
+            multiple_products[-1].id
+        ]
@@ -0,0 +1,102 @@
+import threading
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.checkout import CheckoutError, checkout
+from api.models import CartItem, Order, Product
+from api.product_stats import find_drift
+from api.tests.conftest import fill_cart
+
+ORDERS_URL = "/api/orders/"
+
+
+def checkout_queries(user):
+    with CaptureQueriesContext(connection) as queries:
+        checkout(user)
+    return [q["sql"] for q in queries if "SAVEPOINT" not in q["sql"]]
+
+
+@pytest.mark.django_db
+class TestSetBasedCheckout:
+
+    def test_order_and_stock(self, authenticated_client, user, multiple_products, django_capture_on_commit_callbacks):
+        fill_cart(user, multiple_products[:3], quantity=2)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = authenticated_client.post(ORDERS_URL, {}, format="json")
+
+        assert response.status_code == 201
+        data = response.json()
+        assert [item["product_name"] for item in data["items"]] == [p.name for p in multiple_products[:3]]
+        assert data["total"] == sum(p.price * 2 for p in multiple_products[:3])
+        assert [Product.objects.get(pk=p.pk).stock for p in multiple_products[:3]] == [8, 8, 8]
+        assert not CartItem.objects.filter(cart__user=user).exists()
+        assert find_drift() == {}
+
+    def test_round_trips_do_not_grow_with_cart_size(self, user, admin_user, multiple_products):
+        fill_cart(user, multiple_products[:1])
+        fill_cart(admin_user, multiple_products)
+
+        small = checkout_queries(user)
+        large = checkout_queries(admin_user)
+
+        assert len(small) == len(large)
+        assert sum(sql.lstrip().startswith("WITH items") for sql in large) == 1
+
+    def test_shortfall_changes_nothing(self, user, multiple_products):
+        Product.objects.filter(pk=multiple_products[1].pk).update(stock=1)
+        fill_cart(user, multiple_products[:3], quantity=2)
+
+        with pytest.raises(CheckoutError) as exc:
+            checkout(user)
+
+        assert exc.value.status == 400
+        assert [Product.objects.get(pk=p.pk).stock for p in multiple_products[:3]] == [10, 1, 10]
+        assert CartItem.objects.filter(cart__user=user).count() == 3
+        assert not Order.objects.exists()
+
+    def test_empty_cart(self, user, cart):
+        with pytest.raises(CheckoutError) as exc:
+            checkout(user)
+
+        assert exc.value.message == "Cart is empty"
+
+    def test_exact_stock(self, user, product):
+        fill_cart(user, [product], quantity=product.stock)
+
+        checkout(user)
+
+        assert Product.objects.get(pk=product.pk).stock == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_checkouts_never_oversell(multiple_products):
+    first, second = multiple_products[:2]
+    Product.objects.filter(pk__in=[first.pk, second.pk]).update(stock=5)
+    users = [User.objects.create_user(username=f"buyer{i}", password="x") for i in range(8)]
+    for index, user in enumerate(users):
+        # opposite item orders so lock ordering matters
+        fill_cart(user, [first, second] if index % 2 else [second, first])
+    results = []
+
+    def worker(user):
+        try:
+            checkout(user)
+            results.append("ok")
+        except CheckoutError:
+            results.append("short")
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count("ok") == 5
+    assert results.count("short") == 3
+    assert set(Product.objects.filter(pk__in=[first.pk, second.pk]).values_list("stock", flat=True)) == {0}
@@ -0,0 +1,184 @@
+import threading
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test.utils import CaptureQueriesContext
+
+from api.checkout_queue import enqueue_checkout, process_checkout_batch
+from api.models import CartItem, CheckoutTicket, Order, Product
+from api.tests.conftest import fill_cart
+
+ORDERS_URL = "/api/orders/"
+
+
+def ticket_url(ticket_id):
+    return f"/api/orders/tickets/{ticket_id}/"
+
+
+@pytest.fixture
+def async_checkout(settings):
+    settings.CHECKOUT_ASYNC = True
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("async_checkout")
+class TestCheckoutQueue:
+
+    def test_enqueue_then_process(self, authenticated_client, user, multiple_products):
+        fill_cart(user, multiple_products[:2], quantity=2)
+
+        response = authenticated_client.post(ORDERS_URL, {}, format="json")
+
+        assert response.status_code == 202
+        ticket_id = response.json()["ticket"]
+        assert response.json()["status"] == "pending"
+        assert not Order.objects.exists()
+        assert authenticated_client.get(ticket_url(ticket_id)).json()["status"] == "pending"
+
+        assert process_checkout_batch() == 1
+
+        data = authenticated_client.get(ticket_url(ticket_id)).json()
+        assert data["status"] == "done"
+        assert data["order"]["total"] == sum(p.price * 2 for p in multiple_products[:2])
+        assert [item["quantity"] for item in data["order"]["items"]] == [2, 2]
+        assert Product.objects.get(pk=multiple_products[0].pk).stock == 8
+        assert not CartItem.objects.filter(cart__user=user).exists()
+
+    def test_empty_cart_rejected_at_enqueue(self, authenticated_client, user):
+        response = authenticated_client.post(ORDERS_URL, {}, format="json")
+
+        assert response.status_code == 400
+        assert not CheckoutTicket.objects.exists()
+
+    def test_one_pending_ticket_per_user(self, user, product):
+        fill_cart(user, [product])
+
+        first, created = enqueue_checkout(user)
+        second, created_again = enqueue_checkout(user)
+
+        assert created and not created_again
+        assert first.pk == second.pk
+
+    def test_shortfall_recorded(self, authenticated_client, user, product):
+        fill_cart(user, [product], quantity=product.stock + 1)
+        ticket_id = authenticated_client.post(ORDERS_URL, {}, format="json").json()["ticket"]
+
+        process_checkout_batch()
+
+        data = authenticated_client.get(ticket_url(ticket_id)).json()
+        assert data["status"] == "failed"
+        assert data["error"] == "Checkout failed (concurrency/stock)"
+        assert data["error_status"] == 400
+        assert Product.objects.get(pk=product.pk).stock == product.stock
+        assert CartItem.objects.filter(cart__user=user).exists()
+
+    def test_failure_does_not_affect_batch(self, user, admin_user, product):
+        fill_cart(user, [product], quantity=product.stock + 1)
+        fill_cart(admin_user, [product], quantity=3)
+        enqueue_checkout(user)
+        enqueue_checkout(admin_user)
+
+        assert process_checkout_batch() == 2
+
+        statuses = dict(CheckoutTicket.objects.values_list("user_id", "status"))
+        assert statuses == {user.id: "failed", admin_user.id: "done"}
+        assert Product.objects.get(pk=product.pk).stock == product.stock - 3
+
+    def test_product_locked_once_per_batch(self, product):
+        users = [User.objects.create_user(username=f"queued{i}", password="x") for i in range(4)]
+        for user in users:
+            fill_cart(user, [product])
+            enqueue_checkout(user)
+
+        with CaptureQueriesContext(connection) as queries:
+            process_checkout_batch()
+
+        product_locks = [
+            q["sql"] for q in queries
+            if q["sql"].startswith('SELECT "api_product"') and "FOR UPDATE" in q["sql"]
+        ]
+        assert len(product_locks) == 1
+        assert Order.objects.count() == 4
+
+    def test_batch_size(self, user, admin_user, product):
+        fill_cart(user, [product])
+        fill_cart(admin_user, [product])
+        enqueue_checkout(user)
+        enqueue_checkout(admin_user)
+
+        assert process_checkout_batch(batch_size=1) == 1
+        assert process_checkout_batch(batch_size=1) == 1
+        assert process_checkout_batch(batch_size=1) == 0
+
+    def test_ticket_of_other_user(self, another_user_client, user, product):
+        fill_cart(user, [product])
+        ticket, _ = enqueue_checkout(user)
+
+        assert another_user_client.get(ticket_url(ticket.id)).status_code == 404
+
+    def test_command(self, user, product):
+        fill_cart(user, [product])
+        enqueue_checkout(user)
+
+        out = StringIO()
+        call_command("process_checkout_queue", "--once", stdout=out)
+
+        assert "Processed tickets: 1" in out.getvalue()
+        assert CheckoutTicket.objects.get().status == "done"
+
+    def test_command_survives_batch_error(self, user, product, monkeypatch, caplog):
+        fill_cart(user, [product])
+        enqueue_checkout(user)
+        calls = []
+
+        def flaky(batch_size):
+            calls.append(batch_size)
+            if len(calls) == 1:
+                raise OperationalError("could not obtain lock")
+            return process_checkout_batch(batch_size)
+        monkeypatch.setattr("api.management.commands.process_checkout_queue.process_checkout_batch", flaky)
+
+        out = StringIO()
+        call_command("process_checkout_queue", "--once", "--poll-interval", "0", stdout=out)
+
+        assert "Processed tickets: 1" in out.getvalue()
+        assert "Checkout batch failed" in caplog.text
+        assert CheckoutTicket.objects.get().status == "done"
+
+
+@pytest.mark.django_db
+def test_sync_by_default(authenticated_client, user, product):
+    fill_cart(user, [product])
+
+    assert authenticated_client.post(ORDERS_URL, {}, format="json").status_code == 201
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_workers_never_oversell(multiple_products):
+    first, second = multiple_products[:2]
+    Product.objects.filter(pk__in=[first.pk, second.pk]).update(stock=5)
+    users = [User.objects.create_user(username=f"queue{i}", password="x") for i in range(8)]
+    for index, user in enumerate(users):
+        fill_cart(user, [first, second] if index % 2 else [second, first])
+        enqueue_checkout(user)
+
+    def worker():
+        try:
+            while process_checkout_batch(batch_size=3):
+                pass
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    statuses = list(CheckoutTicket.objects.values_list("status", flat=True))
+    assert statuses.count("done") == 5
+    assert statuses.count("failed") == 3
+    assert set(Product.objects.filter(pk__in=[first.pk, second.pk]).values_list("stock", flat=True)) == {0}
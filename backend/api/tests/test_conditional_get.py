@@ -0,0 +1,129 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Cart, CartItem, CatalogVersion, Category, Product
+
+
+@pytest.mark.django_db
+class TestProductConditionalGet:
+
+    def test_list_sets_validators(self, api_client, multiple_products):
+        response = api_client.get("/api/products/")
+
+        assert response.status_code == 200
+        assert response.has_header("ETag")
+        assert response.has_header("Last-Modified")
+
+    def test_matching_etag_returns_304_without_querying_products(self, api_client, multiple_products):
+        etag = api_client.get("/api/products/")["ETag"]
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = api_client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert len(ctx.captured_queries) == 1
+        assert "api_catalogversion" in ctx.captured_queries[0]["sql"]
+
+    def test_if_modified_since_returns_304(self, api_client, multiple_products):
+        last_modified = api_client.get("/api/products/")["Last-Modified"]
+
+        response = api_client.get("/api/products/", HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        assert response.status_code == 304
+
+    def test_product_write_changes_etag(self, api_client, admin_client, product):
+        etag = api_client.get("/api/products/")["ETag"]
+
+        admin_client.put(
+            f"/api/products/{product.id}/",
+            {"name": "Renamed", "price": product.price, "stock": product.stock},
+            format="json",
+        )
+        response = api_client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+
+    def test_product_delete_changes_detail_etag(self, api_client, product):
+        other = Product.objects.create(name="Other", price=1, stock=1)
+        etag = api_client.get(f"/api/products/{other.id}/")["ETag"]
+
+        product.delete()
+
+        response = api_client.get(f"/api/products/{other.id}/", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+
+    def test_category_rename_changes_product_detail_etag(self, api_client, product, category):
+        etag = api_client.get(f"/api/products/{product.id}/")["ETag"]
+
+        category.name = "Renamed"
+        category.save()
+
+        response = api_client.get(f"/api/products/{product.id}/", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response.data["category"]["name"] == "Renamed"
+
+    def test_checkout_changes_product_etag(
+        self, api_client, authenticated_client, user, product, django_capture_on_commit_callbacks
+    ):
+        etag = api_client.get(f"/api/products/{product.id}/")["ETag"]
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=product, quantity=1)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            authenticated_client.post("/api/orders/")
+
+        response = api_client.get(f"/api/products/{product.id}/", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response.data["stock"] == product.stock - 1
+
+    def test_writes_are_not_conditional(self, admin_client, multiple_products):
+        etag = admin_client.get("/api/products/")["ETag"]
+
+        response = admin_client.post(
+            "/api/products/",
+            {"name": "New", "price": 1, "stock": 1},
+            format="json",
+            HTTP_IF_NONE_MATCH=etag,
+        )
+
+        assert response.status_code == 201
+        assert not response.has_header("ETag")
+
+
+@pytest.mark.django_db
+class TestCategoryConditionalGet:
+
+    def test_list_304_and_invalidation(self, api_client, admin_client, multiple_categories):
+        etag = api_client.get("/api/categories/")["ETag"]
+        assert api_client.get("/api/categories/", HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        admin_client.post("/api/categories/", {"name": "Toys"}, format="json")
+
+        response = api_client.get("/api/categories/", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert len(response.data) == len(multiple_categories) + 1
+
+    def test_detail_304(self, api_client, category):
+        etag = api_client.get(f"/api/categories/{category.id}/")["ETag"]
+
+        response = api_client.get(f"/api/categories/{category.id}/", HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 304
+
+    def test_product_write_does_not_invalidate_categories(self, api_client, category):
+        etag = api_client.get("/api/categories/")["ETag"]
+
+        Product.objects.create(name="X", price=1, stock=1, category=category)
+
+        assert api_client.get("/api/categories/", HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    def test_missing_version_row_is_recreated(self, api_client, category):
+        CatalogVersion.objects.filter(name=CatalogVersion.CATEGORY).delete()
+        etag = api_client.get("/api/categories/")["ETag"]
+
+        Category.objects.create(name="Another")
+
+        assert api_client.get("/api/categories/", HTTP_IF_NONE_MATCH=etag).status_code == 200
@@ -0,0 +1,150 @@
+import threading
+
+import pytest
+from django.db import DatabaseError, OperationalError, connection, transaction
+
+from api import views
+from api.cart import add_to_cart
+from api.db_retry import get_retry_counters, is_retryable, reset_retry_counters
+from api.models import Cart, CartItem, Order, Product
+
+ORDERS_URL = "/api/orders/"
+CART_URL = "/api/cart/"
+
+
+class DriverError(Exception):
+    def __init__(self, sqlstate):
+        super().__init__(sqlstate)
+        self.sqlstate = sqlstate
+
+
+def conflict(sqlstate):
+    """A Django error wrapping a driver error, as django.db.utils raises it."""
+    error = OperationalError("conflict")
+    error.__cause__ = DriverError(sqlstate)
+    return error
+
+
+def failing(func, errors):
+    """`func`, raising each of `errors` on the first calls."""
+    errors = list(errors)
+    calls = []
+
+    def wrapped(*args, **kwargs):
+        calls.append(args)
+        if errors:
+            raise errors.pop(0)
+        return func(*args, **kwargs)
+    wrapped.calls = calls
+    return wrapped
+
+
+@pytest.fixture(autouse=True)
+def retry_settings(settings):
+    settings.DB_RETRY_ATTEMPTS = 2
+    settings.DB_RETRY_BACKOFF_MS = 0
+    reset_retry_counters()
+    yield
+    reset_retry_counters()
+
+
+@pytest.fixture
+def cart(user, product):
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.create(cart=cart, product=product, quantity=2)
+    return cart
+
+
+@pytest.mark.django_db
+class TestRetryOnConflict:
+
+    def test_deadlock_retried(self, authenticated_client, cart, product, monkeypatch):
+        checkout = failing(views.checkout, [conflict("40P01")])
+        monkeypatch.setattr("api.views.checkout", checkout)
+
+        response = authenticated_client.post(ORDERS_URL, {}, format="json")
+
+        assert response.status_code == 201
+        assert len(checkout.calls) == 2
+        assert Order.objects.count() == 1
+        assert Product.objects.get(pk=product.pk).stock == product.stock - 2
+        assert get_retry_counters()["orders_view"] == {"retried": 1, "recovered": 1, "exhausted": 0}
+
+    def test_exhausted(self, authenticated_client, cart, monkeypatch):
+        errors = [conflict("40P01") for _ in range(3)]
+        checkout = failing(views.checkout, errors)
+        monkeypatch.setattr("api.views.checkout", checkout)
+
+        response = authenticated_client.post(ORDERS_URL, {}, format="json")
+
+        assert response.status_code == 409
+        assert response.json() == {"error": "Checkout conflict, please retry"}
+        assert len(checkout.calls) == 3
+        assert not Order.objects.exists()
+        assert get_retry_counters()["orders_view"] == {"retried": 2, "recovered": 0, "exhausted": 1}
+
+    def test_other_errors_not_retried(self, authenticated_client, cart, monkeypatch):
+        checkout = failing(views.checkout, [DatabaseError("disk full")])
+        monkeypatch.setattr("api.views.checkout", checkout)
+
+        response = authenticated_client.post(ORDERS_URL, {}, format="json")
+
+        assert response.status_code == 409
+        assert len(checkout.calls) == 1
+        assert get_retry_counters()["orders_view"]["retried"] == 0
+
+    def test_add_to_cart_retried(self, authenticated_client, product, monkeypatch):
+        add = failing(add_to_cart, [conflict("55P03")])
+        monkeypatch.setattr("api.views.add_to_cart", add)
+
+        response = authenticated_client.post(CART_URL, {"product_id": product.id, "quantity": 1}, format="json")
+
+        assert response.status_code == 201
+        assert CartItem.objects.get().quantity == 1
+        assert get_retry_counters()["cart_view"]["recovered"] == 1
+
+    def test_serialization_failure_in_outer_transaction_not_retried(self, authenticated_client, cart, monkeypatch):
+        checkout = failing(views.checkout, [conflict("40001")])
+        monkeypatch.setattr("api.views.checkout", checkout)
+
+        # Idempotency-Key runs the view inside the key's transaction
+        response = authenticated_client.post(ORDERS_URL, {}, format="json", HTTP_IDEMPOTENCY_KEY="k")
+
+        assert response.status_code == 409
+        assert len(checkout.calls) == 1
+
+    def test_deadlock_in_outer_transaction_retried(self, authenticated_client, cart, monkeypatch):
+        checkout = failing(views.checkout, [conflict("40P01")])
+        monkeypatch.setattr("api.views.checkout", checkout)
+
+        response = authenticated_client.post(ORDERS_URL, {}, format="json", HTTP_IDEMPOTENCY_KEY="k")
+
+        assert response.status_code == 201
+        assert Order.objects.count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_lock_not_available_detected(product):
+    locked = threading.Event()
+    release = threading.Event()
+
+    def hold_lock():
+        try:
+            with transaction.atomic():
+                list(Product.objects.select_for_update().filter(pk=product.pk))
+                locked.set()
+                release.wait(5)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=hold_lock)
+    thread.start()
+    locked.wait(5)
+    try:
+        with pytest.raises(DatabaseError) as exc_info, transaction.atomic():
+            list(Product.objects.select_for_update(nowait=True).filter(pk=product.pk))
+    finally:
+        release.set()
+        thread.join()
+
+    assert is_retryable(exc_info.value)
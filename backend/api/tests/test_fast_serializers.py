@@ -0,0 +1,79 @@
+import zoneinfo
+
+import pytest
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.fast_serializers import compile_serializer, serialize
+from api.models import Cart, CartItem, Product, Wishlist
+from api.serializers import (
+    CartItemSerializer,
+    CartSerializer,
+    ProductDetailSerializer,
+    ProductSerializer,
+    WishlistSerializer,
+)
+
+render = JSONRenderer().render
+
+
+def assert_identical(serializer_class, instance, many=False):
+    expected = render(serializer_class(instance, many=many).data)
+    assert render(serialize(serializer_class, instance, many=many)) == expected
+
+
+@pytest.mark.django_db
+class TestCompiledSerializers:
+
+    def test_product_list(self, multiple_products, product_without_category):
+        assert_identical(ProductSerializer, list(Product.objects.order_by("id")), many=True)
+
+    def test_product_detail(self, product, product_without_category):
+        assert_identical(ProductDetailSerializer, product)
+        assert_identical(ProductDetailSerializer, product_without_category)
+
+    def test_cart_item(self, cart_with_item):
+        item = CartItem.objects.select_related("product").get(cart=cart_with_item)
+        assert_identical(CartItemSerializer, item)
+
+    def test_cart_with_items(self, cart_with_item, product_without_category):
+        CartItem.objects.create(cart=cart_with_item, product=product_without_category, quantity=1)
+        cart = Cart.objects.prefetch_related("items__product").get(pk=cart_with_item.pk)
+
+        assert_identical(CartSerializer, cart)
+
+    def test_wishlist(self, user, product, product_without_category):
+        Wishlist.objects.create(user=user, product=product)
+        Wishlist.objects.create(user=user, product=product_without_category)
+        items = Wishlist.objects.filter(user=user).select_related("product").order_by("id")
+
+        assert_identical(WishlistSerializer, items, many=True)
+
+    def test_datetimes_follow_active_timezone(self, product):
+        with timezone.override(zoneinfo.ZoneInfo("Asia/Ho_Chi_Minh")):
+            assert_identical(ProductDetailSerializer, product)
+
+    def test_write_only_fields_are_skipped(self):
+        assert "product_id" not in compile_serializer(WishlistSerializer).source
+
+    def test_foreign_key_pk_read_from_row(self, product):
+        product = Product.objects.get(pk=product.pk)
+
+        data = serialize(ProductSerializer, product)
+
+        assert data["category"] == product.category_id
+        assert "category" not in product._state.fields_cache
+
+    def test_disabled_uses_drf(self, settings, product):
+        settings.FAST_SERIALIZERS = False
+
+        data = serialize(ProductSerializer, product)
+
+        assert type(data) is not dict
+        assert data == ProductSerializer(product).data
+
+    def test_product_list_endpoint_unchanged(self, settings, api_client, multiple_products):
+        fast = api_client.get("/api/products/").content
+        settings.FAST_SERIALIZERS = False
+
+        assert api_client.get("/api/products/").content == fast
@@ -0,0 +1,182 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.checkout import CheckoutError
+from api.models import IdempotencyKey, Order, Payment, Product
+from api.tests.conftest import fill_cart
+
+ORDERS_URL = "/api/orders/"
+PAYMENTS_URL = "/api/payments/create/"
+
+
+def post(client, url, data=None, key="key-1"):
+    return client.post(url, data or {}, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+
+@pytest.mark.django_db
+class TestIdempotentCheckout:
+
+    def test_retry_replays_order(self, authenticated_client, user, product):
+        fill_cart(user, [product], quantity=2)
+
+        first = post(authenticated_client, ORDERS_URL)
+        retry = post(authenticated_client, ORDERS_URL)
+
+        assert first.status_code == retry.status_code == 201
+        assert retry.json() == first.json()
+        assert retry["Idempotent-Replayed"] == "true"
+        assert "Idempotent-Replayed" not in first
+        assert Order.objects.count() == 1
+        assert Product.objects.get(pk=product.pk).stock == product.stock - 2
+
+    def test_replay_is_byte_identical_with_non_ascii(self, authenticated_client, user, product):
+        Product.objects.filter(pk=product.pk).update(name="Áo thun – cotton")
+        fill_cart(user, [product])
+
+        first = post(authenticated_client, ORDERS_URL)
+        retry = post(authenticated_client, ORDERS_URL)
+
+        assert "Áo thun".encode() in first.content
+        assert retry.content == first.content
+
+    def test_new_key_runs_again(self, authenticated_client, user, product):
+        fill_cart(user, [product])
+        post(authenticated_client, ORDERS_URL, key="a")
+        fill_cart(user, [product])
+
+        assert post(authenticated_client, ORDERS_URL, key="b").status_code == 201
+        assert Order.objects.count() == 2
+
+    def test_without_header(self, authenticated_client, user, product):
+        fill_cart(user, [product])
+
+        authenticated_client.post(ORDERS_URL, {}, format="json")
+
+        assert not IdempotencyKey.objects.exists()
+
+    def test_client_error_replayed(self, authenticated_client, user, product):
+        first = post(authenticated_client, ORDERS_URL)
+        fill_cart(user, [product])
+        retry = post(authenticated_client, ORDERS_URL)
+
+        assert first.status_code == retry.status_code == 400
+        assert retry.json() == {"error": "Cart is empty"}
+        assert not Order.objects.exists()
+
+    def test_conflict_not_stored(self, authenticated_client, user, product, monkeypatch):
+        fill_cart(user, [product])
+
+        def conflict(user):
+            raise CheckoutError("Checkout conflict, please retry", 409)
+
+        with monkeypatch.context() as patched:
+            patched.setattr("api.views.checkout", conflict)
+            assert post(authenticated_client, ORDERS_URL).status_code == 409
+
+        assert not IdempotencyKey.objects.exists()
+        assert post(authenticated_client, ORDERS_URL).status_code == 201
+
+    def test_key_reused_with_other_body(self, authenticated_client, user, product):
+        fill_cart(user, [product])
+        post(authenticated_client, ORDERS_URL)
+
+        response = post(authenticated_client, ORDERS_URL, {"note": "other"})
+
+        assert response.status_code == 422
+        assert Order.objects.count() == 1
+
+    def test_keys_are_per_user(self, authenticated_client, another_user_client, user, another_user, product):
+        fill_cart(user, [product])
+        fill_cart(another_user, [product])
+
+        post(authenticated_client, ORDERS_URL)
+        response = post(another_user_client, ORDERS_URL)
+
+        assert response.status_code == 201
+        assert "Idempotent-Replayed" not in response
+        assert Order.objects.count() == 2
+
+    def test_expired_key_runs_again(self, authenticated_client, user, product):
+        fill_cart(user, [product])
+        post(authenticated_client, ORDERS_URL)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        fill_cart(user, [product])
+
+        response = post(authenticated_client, ORDERS_URL)
+
+        assert response.status_code == 201
+        assert "Idempotent-Replayed" not in response
+        assert Order.objects.count() == 2
+
+    def test_key_too_long(self, authenticated_client, user, product):
+        fill_cart(user, [product])
+
+        response = post(authenticated_client, ORDERS_URL, key="k" * 256)
+
+        assert response.status_code == 400
+        assert not Order.objects.exists()
+
+
+@pytest.mark.django_db
+def test_payment_retry_replayed(authenticated_client, user):
+    order = Order.objects.create(user=user, total=500)
+    data = {"order_id": order.id, "provider": "vnpay"}
+
+    first = post(authenticated_client, PAYMENTS_URL, data)
+    retry = post(authenticated_client, PAYMENTS_URL, data)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json()["transaction_id"] == first.json()["transaction_id"]
+    assert Payment.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_cleanup_deletes_expired_keys(user):
+    now = timezone.now()
+    IdempotencyKey.objects.create(user=user, scope="orders", key="old", fingerprint="x", expires_at=now)
+    IdempotencyKey.objects.create(
+        user=user, scope="orders", key="new", fingerprint="x", expires_at=now + timedelta(hours=1)
+    )
+
+    out = StringIO()
+    call_command("cleanup_stale_data", stdout=out)
+
+    assert "Deleted expired idempotency keys: 1" in out.getvalue()
+    assert list(IdempotencyKey.objects.values_list("key", flat=True)) == ["new"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_duplicates_create_one_order(product):
+    user = User.objects.create_user(username="idem", password="x")
+    fill_cart(user, [product])
+    responses = []
+    lock = threading.Lock()
+
+    def send():
+        client = APIClient()
+        client.force_authenticate(user=user)
+        try:
+            response = post(client, ORDERS_URL, key="same")
+            with lock:
+                responses.append(response)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=send) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [r.status_code for r in responses] == [201] * 4
+    assert len({r.json()["id"] for r in responses}) == 1
+    assert Order.objects.count() == 1
+    assert Product.objects.get(pk=product.pk).stock == product.stock - 1
@@ -0,0 +1,79 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.checkout import checkout
+from api.models import Cart, CartItem, Order, OrderItem
+
+ORDERS_URL = "/api/orders/"
+
+
+@pytest.fixture
+def orders(user):
+    orders = []
+    for i in range(5):
+        order = Order.objects.create(user=user, total=100 * (i + 1), item_count=i + 1)
+        OrderItem.objects.create(order=order, product_name=f"P{i}", price=100, quantity=i + 1)
+        orders.append(order)
+    return orders
+
+
+@pytest.mark.django_db
+class TestOrderHistory:
+
+    def test_keyset_pages_newest_first(self, authenticated_client, orders):
+        first = authenticated_client.get(ORDERS_URL, {"cursor": "", "page_size": 2}).json()
+        second = authenticated_client.get(first["next"]).json()
+        third = authenticated_client.get(second["next"]).json()
+
+        ids = [o["id"] for page in (first, second, third) for o in page["results"]]
+        assert ids == [o.id for o in reversed(orders)]
+        assert third["next"] is None
+        assert first["results"][0]["items"] == [{"product_name": "P4", "price": 100, "quantity": 5}]
+
+    def test_page_does_not_scan_history(self, authenticated_client, orders):
+        with CaptureQueriesContext(connection) as queries:
+            authenticated_client.get(ORDERS_URL, {"cursor": "", "page_size": 2})
+
+        order_sql = next(q["sql"] for q in queries if 'FROM "api_order" ' in q["sql"])
+        assert "LIMIT 3" in order_sql
+
+    def test_summary_skips_items(self, authenticated_client, orders):
+        with CaptureQueriesContext(connection) as queries:
+            response = authenticated_client.get(ORDERS_URL, {"summary": 1})
+
+        data = response.json()
+        assert [o["item_count"] for o in data] == [5, 4, 3, 2, 1]
+        assert data[0]["total"] == 500
+        assert "items" not in data[0]
+        assert not any('"api_orderitem"' in q["sql"] for q in queries)
+
+    def test_summary_dates_match_other_payloads(self, authenticated_client, orders):
+        data = authenticated_client.get(ORDERS_URL, {"summary": 1}).json()
+
+        assert data[0]["created_at"].endswith("Z")
+
+    def test_summary_with_cursor(self, authenticated_client, orders):
+        data = authenticated_client.get(ORDERS_URL, {"summary": 1, "cursor": "", "page_size": 3}).json()
+
+        assert [o["id"] for o in data["results"]] == [o.id for o in reversed(orders)][:3]
+        assert data["next"]
+
+    def test_only_own_orders(self, authenticated_client, orders, another_user):
+        Order.objects.create(user=another_user, total=1)
+
+        data = authenticated_client.get(ORDERS_URL, {"cursor": "", "page_size": 100}).json()
+
+        assert len(data["results"]) == len(orders)
+
+    def test_invalid_cursor(self, authenticated_client, orders):
+        assert authenticated_client.get(ORDERS_URL, {"cursor": "nope"}).status_code == 404
+
+    def test_checkout_stores_item_count(self, user, multiple_products):
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=multiple_products[0], quantity=2)
+        CartItem.objects.create(cart=cart, product=multiple_products[1], quantity=3)
+
+        order, _ = checkout(user)
+
+        assert Order.objects.get(pk=order.pk).item_count == 5
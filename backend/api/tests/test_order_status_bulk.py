@@ -0,0 +1,150 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.models import Order
+from api.order_status import bulk_transition
+
+BULK_URL = "/api/orders/status/bulk/"
+
+
+def status_url(order_id):
+    return f"/api/orders/{order_id}/status/"
+
+
+def statements(queries):
+    return [q["sql"] for q in queries if "SAVEPOINT" not in q["sql"]]
+
+
+@pytest.fixture
+def paid_orders(user):
+    return [Order.objects.create(user=user, total=100, status="paid") for _ in range(3)]
+
+
+@pytest.mark.django_db
+class TestOrderStatusTransition:
+
+    def test_one_conditional_update(self, admin_client, user):
+        order = Order.objects.create(user=user, total=100, status="paid")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = admin_client.patch(status_url(order.id), {"status": "shipped"}, format="json")
+
+        assert response.json() == {"id": order.id, "status": "shipped"}
+        sql = statements(queries)
+        assert len(sql) == 1
+        assert sql[0].lstrip().startswith("UPDATE")
+        assert Order.objects.get(pk=order.pk).status == "shipped"
+
+    def test_stale_expected_status(self, admin_client, user):
+        order = Order.objects.create(user=user, total=100, status="shipped")
+
+        response = admin_client.patch(status_url(order.id), {"status": "shipped"}, format="json")
+
+        assert response.status_code == 400
+        assert response.json() == {"error": "Invalid status transition"}
+
+    def test_missing_order(self, admin_client):
+        response = admin_client.patch(status_url(999999), {"status": "paid"}, format="json")
+
+        assert response.status_code == 404
+
+    def test_completed_order(self, admin_client, user):
+        order = Order.objects.create(user=user, total=100, status="completed")
+
+        response = admin_client.patch(status_url(order.id), {"status": "paid"}, format="json")
+
+        assert response.json() == {"error": "Order already completed"}
+
+
+@pytest.mark.django_db
+class TestBulkOrderStatus:
+
+    def test_ids(self, admin_client, user, paid_orders):
+        pending = Order.objects.create(user=user, total=100)
+        ids = [order.id for order in paid_orders] + [pending.id, 999999]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = admin_client.post(BULK_URL, {"status": "shipped", "ids": ids}, format="json")
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data["updated"] == sorted(order.id for order in paid_orders)
+        assert data["skipped"] == sorted([pending.id, 999999])
+        assert len(statements(queries)) == 1
+        assert set(Order.objects.filter(pk__in=data["updated"]).values_list("status", flat=True)) == {"shipped"}
+        assert Order.objects.get(pk=pending.pk).status == "pending"
+
+    def test_filter(self, admin_client, user, another_user, paid_orders):
+        other = Order.objects.create(user=another_user, total=100, status="paid")
+
+        response = admin_client.post(
+            BULK_URL, {"status": "shipped", "filter": {"user_id": user.id}}, format="json"
+        )
+
+        assert response.json()["updated"] == sorted(order.id for order in paid_orders)
+        assert response.json()["skipped"] == []
+        assert Order.objects.get(pk=other.pk).status == "paid"
+
+    def test_filter_by_creation_time(self, admin_client, paid_orders):
+        Order.objects.filter(pk=paid_orders[0].pk).update(created_at=timezone.now() - timedelta(days=2))
+        cutoff = (timezone.now() - timedelta(days=1)).isoformat()
+
+        response = admin_client.post(
+            BULK_URL, {"status": "shipped", "filter": {"created_before": cutoff}}, format="json"
+        )
+
+        assert response.json()["updated"] == [paid_orders[0].id]
+
+    def test_invalid_target(self, admin_client, paid_orders):
+        response = admin_client.post(BULK_URL, {"status": "pending", "ids": [paid_orders[0].id]}, format="json")
+
+        assert response.status_code == 400
+        assert Order.objects.get(pk=paid_orders[0].pk).status == "paid"
+
+    @pytest.mark.parametrize("body", [
+        {"status": "shipped"},
+        {"status": "shipped", "ids": [1], "filter": {}},
+        {"status": "shipped", "ids": []},
+        {"status": "shipped", "ids": ["x"]},
+        {"status": "shipped", "filter": {"created_after": "yesterday"}},
+        {"status": "shipped", "filter": {}},
+        {"status": "shipped", "filter": {"all": "yes"}},
+    ])
+    def test_bad_request(self, admin_client, body):
+        assert admin_client.post(BULK_URL, body, format="json").status_code == 400
+
+    def test_empty_filter_rejected(self, admin_client, paid_orders):
+        response = admin_client.post(BULK_URL, {"status": "shipped", "filter": {}}, format="json")
+
+        assert response.status_code == 400
+        assert not Order.objects.filter(status="shipped").exists()
+
+    def test_explicit_all(self, admin_client, paid_orders):
+        response = admin_client.post(BULK_URL, {"status": "shipped", "filter": {"all": True}}, format="json")
+
+        assert response.json()["updated"] == sorted(order.id for order in paid_orders)
+
+    def test_too_many_ids(self, admin_client, settings):
+        settings.ORDER_STATUS_BULK_MAX_IDS = 2
+
+        response = admin_client.post(BULK_URL, {"status": "shipped", "ids": [1, 2, 3]}, format="json")
+
+        assert response.status_code == 400
+
+    def test_requires_permission(self, authenticated_client, paid_orders):
+        response = authenticated_client.post(
+            BULK_URL, {"status": "shipped", "ids": [paid_orders[0].id]}, format="json"
+        )
+
+        assert response.status_code == 403
+        assert Order.objects.get(pk=paid_orders[0].pk).status == "paid"
+
+    def test_purges_owner_order_cache(self, paid_orders, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks() as callbacks:
+            bulk_transition("shipped", ids=[paid_orders[0].id])
+
+        assert len(callbacks) == 1
@@ -0,0 +1,151 @@
+import base64
+import json
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Product
+
+
+@pytest.fixture
+def catalog(category):
+    # prices repeat so the (price, id) tie-breaker is exercised
+    return [
+        Product.objects.create(name=f"Item {i:02d}", price=(i % 3) * 100, stock=i, category=category)
+        for i in range(10)
+    ]
+
+
+def _walk(client, url):
+    pages = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        pages.append(response.data["results"])
+        url = response.data["next"]
+    return pages
+
+
+@pytest.mark.django_db
+class TestProductCursorPagination:
+
+    def test_first_page_returns_envelope(self, api_client, catalog):
+        response = api_client.get("/api/products/?cursor=&page_size=4")
+
+        assert response.status_code == 200
+        assert [p["id"] for p in response.data["results"]] == [p.id for p in catalog[:4]]
+        assert response.data["previous"] is None
+        assert response.data["next"] is not None
+
+    def test_walk_by_id_visits_every_product_once(self, api_client, catalog):
+        pages = _walk(api_client, "/api/products/?cursor=&page_size=3")
+
+        assert [len(page) for page in pages] == [3, 3, 3, 1]
+        assert [p["id"] for page in pages for p in page] == [p.id for p in catalog]
+
+    @pytest.mark.parametrize("ordering", ["price", "-price", "name", "-name", "created_at", "-id"])
+    def test_walk_follows_ordering_with_id_tiebreak(self, api_client, catalog, ordering):
+        pages = _walk(api_client, f"/api/products/?cursor=&page_size=4&ordering={ordering}")
+
+        field = ordering.lstrip("-")
+        descending = ordering.startswith("-")
+        expected = sorted(catalog, key=lambda p: (getattr(p, field), p.id), reverse=descending)
+        assert [p["id"] for page in pages for p in page] == [p.id for p in expected]
+
+    def test_previous_link_returns_prior_page(self, api_client, catalog):
+        first = api_client.get("/api/products/?cursor=&page_size=4&ordering=price")
+        second = api_client.get(first.data["next"])
+        back = api_client.get(second.data["previous"])
+
+        assert back.data["results"] == first.data["results"]
+        assert back.data["previous"] is None
+
+    def test_cursor_respects_filters(self, api_client, catalog, category):
+        Product.objects.create(name="Elsewhere", price=1, stock=1)
+
+        pages = _walk(api_client, f"/api/products/?cursor=&page_size=4&category={category.id}")
+
+        assert sum(len(page) for page in pages) == len(catalog)
+
+    def test_page_size_is_capped(self, api_client, catalog, monkeypatch):
+        from api.pagination import ProductCursorPagination
+        monkeypatch.setattr(ProductCursorPagination, "max_page_size", 5)
+
+        response = api_client.get("/api/products/?cursor=&page_size=1000")
+
+        assert len(response.data["results"]) == 5
+
+    def test_invalid_cursor_returns_404(self, api_client, catalog):
+        response = api_client.get("/api/products/?cursor=not-a-cursor")
+
+        assert response.status_code == 404
+        assert response.data["error"] == "Invalid cursor"
+
+    def test_cursor_from_other_ordering_is_rejected(self, api_client, catalog):
+        first = api_client.get("/api/products/?cursor=&page_size=4&ordering=price")
+        next_url = first.data["next"].replace("ordering=price", "ordering=name")
+
+        response = api_client.get(next_url)
+
+        assert response.status_code == 404
+
+    def test_unsupported_ordering_returns_400(self, api_client, catalog):
+        response = api_client.get("/api/products/?cursor=&ordering=stock")
+
+        assert response.status_code == 400
+
+    def test_deep_page_uses_keyset_filter_without_offset_or_count(self, api_client, catalog):
+        first = api_client.get("/api/products/?cursor=&page_size=2&ordering=price")
+
+        with CaptureQueriesContext(connection) as ctx:
+            api_client.get(first.data["next"])
+
+        product_queries = [q["sql"] for q in ctx.captured_queries if 'FROM "api_product"' in q["sql"]]
+        assert len(product_queries) == 1
+        assert "OFFSET" not in product_queries[0]
+        assert "COUNT(" not in product_queries[0]
+
+    def test_deep_page_starts_at_the_cursor_in_the_index(self, api_client, category):
+        Product.objects.bulk_create(
+            Product(name=f"Bulk {i}", price=i // 2, stock=1, category=category) for i in range(2000)
+        )
+        last = Product.objects.order_by("price", "id")[1990]
+        payload = {"o": "price", "v": last.price, "id": last.id, "r": 0}
+        cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = api_client.get("/api/products/", {"cursor": cursor, "page_size": 5, "ordering": "price"})
+
+        assert len(response.data["results"]) == 5
+        sql = next(q["sql"] for q in ctx.captured_queries if 'FROM "api_product"' in q["sql"])
+        with connection.cursor() as db:
+            db.execute("SET LOCAL enable_seqscan = off")
+            db.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql)
+            plan = db.fetchone()[0]
+        # rows read and thrown away before the page: a handful, not ~2000
+        assert _rows_removed(plan[0]["Plan"]) < 20
+
+
+def _rows_removed(node):
+    removed = node.get("Rows Removed by Filter", 0) + node.get("Rows Removed by Index Recheck", 0)
+    return removed + sum(_rows_removed(child) for child in node.get("Plans", []))
+
+
+@pytest.mark.django_db
+def test_unpaginated_list_is_capped(api_client, catalog, settings):
+    settings.PRODUCT_LIST_MAX_ROWS = 4
+
+    response = api_client.get("/api/products/")
+
+    assert response.status_code == 200
+    assert [p["id"] for p in response.data] == [p.id for p in catalog[:4]]
+    assert response["X-Result-Limit"] == "4"
+
+
+@pytest.mark.django_db
+def test_unpaginated_list_below_cap_has_no_limit_header(api_client, catalog):
+    response = api_client.get("/api/products/")
+
+    assert len(response.data) == len(catalog)
+    assert not response.has_header("X-Result-Limit")
@@ -0,0 +1,132 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Category, Product
+
+PRODUCTS_URL = "/api/products/"
+
+
+@pytest.fixture
+def catalog(db, settings):
+    settings.PRODUCT_FACET_PRICE_BUCKETS = [100, 1000]
+    phones = Category.objects.create(name="Phones")
+    cables = Category.objects.create(name="Cables")
+    rows = [
+        ("Phone A", 1500, 3, phones),
+        ("Phone B", 900, 0, phones),
+        ("Phone C", 2000, 1, phones),
+        ("Cable A", 50, 10, cables),
+        ("Cable B", 150, 0, cables),
+        ("Gift Card", 500, 5, None),
+    ]
+    Product.objects.bulk_create(
+        Product(name=name, price=price, stock=stock, category=category)
+        for name, price, stock, category in rows
+    )
+    return {"phones": phones, "cables": cables}
+
+
+def price_counts(data):
+    return [bucket["count"] for bucket in data["facets"]["price"]]
+
+
+def category_counts(data):
+    return {entry["name"]: entry["count"] for entry in data["facets"]["category"]}
+
+
+@pytest.mark.django_db
+class TestProductListFilters:
+
+    def test_price_range(self, api_client, catalog):
+        response = api_client.get(PRODUCTS_URL, {"min_price": 100, "max_price": 1000})
+
+        assert sorted(p["name"] for p in response.json()) == ["Cable B", "Gift Card", "Phone B"]
+
+    def test_in_stock(self, api_client, catalog):
+        response = api_client.get(PRODUCTS_URL, {"in_stock": "false"})
+
+        assert sorted(p["name"] for p in response.json()) == ["Cable B", "Phone B"]
+
+    def test_invalid_values(self, api_client, catalog):
+        assert api_client.get(PRODUCTS_URL, {"min_price": "cheap"}).status_code == 400
+        assert api_client.get(PRODUCTS_URL, {"category": "phones"}).status_code == 400
+
+
+@pytest.mark.django_db
+class TestProductFacets:
+
+    def test_unfiltered(self, api_client, catalog):
+        response = api_client.get(PRODUCTS_URL, {"facets": 1})
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data["count"] == 6
+        assert len(data["results"]) == 6
+        assert data["facets"]["category"] == [
+            {"id": catalog["phones"].id, "name": "Phones", "count": 3},
+            {"id": catalog["cables"].id, "name": "Cables", "count": 2},
+            {"id": None, "name": None, "count": 1},
+        ]
+        assert data["facets"]["price"] == [
+            {"min": None, "max": 100, "count": 1},
+            {"min": 100, "max": 1000, "count": 3},
+            {"min": 1000, "max": None, "count": 2},
+        ]
+        assert data["facets"]["in_stock"] == {"true": 4, "false": 2}
+
+    def test_each_facet_ignores_its_own_filter(self, api_client, catalog):
+        params = {"facets": 1, "category": catalog["phones"].id, "min_price": 1000, "in_stock": "true"}
+
+        data = api_client.get(PRODUCTS_URL, params).json()
+
+        assert data["count"] == 2
+        assert sorted(p["name"] for p in data["results"]) == ["Phone A", "Phone C"]
+        # other categories still counted under the price and stock filters
+        assert category_counts(data) == {"Phones": 2}
+        # phones in stock, whatever the price
+        assert price_counts(data) == [0, 0, 2]
+        # phones from 1000 up, in stock or not
+        assert data["facets"]["in_stock"] == {"true": 2, "false": 0}
+
+    def test_counts_other_categories(self, api_client, catalog):
+        data = api_client.get(PRODUCTS_URL, {"facets": 1, "category": catalog["cables"].id}).json()
+
+        assert data["count"] == 2
+        assert category_counts(data) == {"Phones": 3, "Cables": 2, None: 1}
+        assert price_counts(data) == [1, 1, 0]
+
+    @pytest.mark.parametrize("engine", ["icontains", "fulltext"])
+    def test_follows_search(self, settings, api_client, catalog, engine):
+        settings.PRODUCT_SEARCH_ENGINE = engine
+
+        data = api_client.get(PRODUCTS_URL, {"facets": 1, "search": "cable"}).json()
+
+        assert data["count"] == 2
+        assert category_counts(data) == {"Cables": 2}
+
+    def test_one_grouped_query(self, api_client, catalog):
+        with CaptureQueriesContext(connection) as queries:
+            api_client.get(PRODUCTS_URL, {"facets": 1, "category": catalog["phones"].id})
+
+        product_queries = [q["sql"] for q in queries if 'FROM "api_product"' in q["sql"]]
+        # the facet groups and the page of hits
+        assert len(product_queries) == 2
+        assert sum("GROUP BY" in sql for sql in product_queries) == 1
+
+    def test_with_page(self, api_client, catalog):
+        data = api_client.get(PRODUCTS_URL, {"facets": 1, "page_size": 2}).json()
+
+        assert data["count"] == 6
+        assert len(data["results"]) == 2
+
+    def test_with_cursor(self, api_client, catalog):
+        data = api_client.get(PRODUCTS_URL, {"facets": 1, "cursor": "", "page_size": 2}).json()
+
+        assert data["count"] == 6
+        assert data["next"]
+        assert len(data["results"]) == 2
+        assert data["facets"]["in_stock"] == {"true": 4, "false": 2}
+
+    def test_not_with_stream(self, api_client, catalog):
+        assert api_client.get(PRODUCTS_URL, {"facets": 1, "stream": 1}).status_code == 400
@@ -0,0 +1,223 @@
+import csv
+import json
+from io import StringIO
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from api.models import Product, StockSlot
+from api.product_stats import find_drift
+from api.stock_slots import rebalance_stock_slots, shard_product
+
+IMPORT_URL = "/api/products/import/"
+
+
+def ndjson(*rows):
+    return "\n".join(json.dumps(row) for row in rows)
+
+
+def post_csv(client, body, match=None):
+    url = IMPORT_URL if match is None else f"{IMPORT_URL}?match={match}"
+    return client.generic("POST", url, body, content_type="text/csv")
+
+
+def post_ndjson(client, body, match=None):
+    url = IMPORT_URL if match is None else f"{IMPORT_URL}?match={match}"
+    return client.generic("POST", url, body, content_type="application/x-ndjson")
+
+
+@pytest.mark.django_db
+class TestProductImportEndpoint:
+
+    def test_requires_admin(self, authenticated_client):
+        response = post_csv(authenticated_client, "name,price,stock\nA,1,1\n")
+
+        assert response.status_code == 403
+
+    def test_csv_creates_products(self, admin_client, category):
+        body = f"name,price,stock,category\nPhone,100,5,{category.id}\nCable,10,50,\n"
+
+        response = post_csv(admin_client, body)
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "created": 2, "updated": 0, "error_count": 0, "errors": [], "errors_truncated": False,
+        }
+        phone = Product.objects.get(name="Phone")
+        assert (phone.price, phone.stock, phone.category_id) == (100, 5, category.id)
+        assert Product.objects.get(name="Cable").category_id is None
+
+    def test_ndjson_updates_by_id(self, admin_client, product):
+        response = post_ndjson(
+            admin_client,
+            ndjson({"id": product.id, "name": "Renamed", "price": 5, "stock": 7}),
+        )
+
+        assert response.json()["updated"] == 1
+        product.refresh_from_db()
+        assert (product.name, product.price, product.stock) == ("Renamed", 5, 7)
+        # category omitted: unchanged, as with PUT
+        assert product.category_id is not None
+
+    def test_upsert_by_name(self, admin_client, product):
+        body = ndjson(
+            {"name": product.name, "price": 1, "stock": 2},
+            {"name": "Brand New", "price": 3, "stock": 4},
+            {"name": "Brand New", "price": 5, "stock": 6},
+        )
+
+        response = post_ndjson(admin_client, body, match="name")
+
+        assert response.json()["created"] == 1
+        assert response.json()["updated"] == 1
+        assert Product.objects.get(pk=product.pk).price == 1
+        assert Product.objects.filter(name="Brand New").count() == 1
+        assert Product.objects.get(name="Brand New").price == 5
+
+    def test_row_errors_do_not_abort_batch(self, admin_client, category):
+        body = (
+            "name,price,stock,category\n"
+            "Good,100,1,\n"
+            "Negative,-1,1,\n"
+            "NoStock,10,,\n"
+            ",10,1,\n"
+            "BadCategory,10,1,999999\n"
+            "Also Good,5,5,\n"
+        )
+
+        response = post_csv(admin_client, body)
+
+        data = response.json()
+        assert data["created"] == 2
+        assert data["error_count"] == 4
+        errors = {error["row"]: error["errors"] for error in data["errors"]}
+        assert errors[2] == {"price": ["Price must be non-negative."]}
+        assert errors[3] == {"stock": ["This field is required."]}
+        assert "name" in errors[4]
+        assert errors[5] == {"category": ['Invalid pk "999999" - object does not exist.']}
+        assert set(Product.objects.values_list("name", flat=True)) == {"Good", "Also Good"}
+
+    def test_same_messages_as_product_serializer(self, admin_client):
+        row = {"name": "   ", "price": "abc", "stock": -1}
+        api_errors = admin_client.post("/api/products/", row, format="json").json()
+
+        response = post_ndjson(admin_client, ndjson(row))
+
+        assert response.json()["errors"][0]["errors"] == api_errors
+
+    def test_unknown_id_and_bad_json(self, admin_client):
+        body = ndjson({"id": 999999, "name": "Ghost", "price": 1, "stock": 1}) + "\n{not json\n[1]"
+
+        response = post_ndjson(admin_client, body)
+
+        errors = response.json()["errors"]
+        assert [error["row"] for error in errors] == [1, 2, 3]
+        assert errors[0]["errors"] == {"id": ["Product not found."]}
+
+    def test_invalid_utf8_is_a_row_error(self, admin_client, settings):
+        settings.PRODUCT_IMPORT_BATCH_SIZE = 1
+        body = b"\xef\xbb\xbfname,price,stock\nFirst,1,1\nBad\xff,1,1\nLast,1,1\n"
+
+        response = post_csv(admin_client, body)
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data["created"] == 2
+        assert data["errors"] == [{"row": 2, "errors": {"non_field_errors": ["Invalid UTF-8."]}}]
+
+    def test_invalid_utf8_ndjson_line(self, admin_client):
+        body = b'{"name": "A", "price": 1, "stock": 1}\n{"name": "\xc3"}\n{"name": "B", "price": 1, "stock": 1}\n'
+
+        response = post_ndjson(admin_client, body)
+
+        assert response.json()["created"] == 2
+        assert [error["row"] for error in response.json()["errors"]] == [2]
+
+    def test_malformed_csv_row(self, admin_client):
+        body = "name,price,stock\nA,1,1\n" + "B," + "9" * (csv.field_size_limit() + 1) + ",1\nC,1,1\n"
+
+        response = post_csv(admin_client, body)
+
+        assert response.json()["created"] == 2
+        assert response.json()["errors"] == [{"row": 2, "errors": {"non_field_errors": ["Malformed CSV row."]}}]
+
+    def test_respreads_stock_of_sharded_product(self, admin_client, product):
+        shard_product(product.id, slots=2)
+
+        response = post_ndjson(
+            admin_client,
+            ndjson({"id": product.id, "name": product.name, "price": product.price, "stock": 7}),
+        )
+
+        assert response.json()["updated"] == 1
+        assert sorted(StockSlot.objects.filter(product=product).values_list("stock", flat=True)) == [3, 4]
+        rebalance_stock_slots([product.id])
+        assert Product.objects.get(pk=product.pk).stock == 7
+        assert find_drift() == {}
+
+    def test_multipart_upload(self, admin_client):
+        upload = SimpleUploadedFile("products.csv", b"name,price,stock\nUploaded,1,1\n")
+
+        response = admin_client.post(IMPORT_URL, {"file": upload}, format="multipart")
+
+        assert response.json()["created"] == 1
+
+    def test_unsupported_content_type(self, admin_client):
+        response = admin_client.post(IMPORT_URL, {"name": "x"}, format="json")
+
+        assert response.status_code == 415
+
+    def test_invalid_match(self, admin_client):
+        response = post_csv(admin_client, "name,price,stock\n", match="sku")
+
+        assert response.status_code == 400
+
+    def test_keeps_statistics_and_cache_consistent(
+        self, admin_client, api_client, product, category, django_capture_on_commit_callbacks
+    ):
+        etag = api_client.get("/api/products/")["ETag"]
+        body = ndjson(
+            {"id": product.id, "name": product.name, "price": 1, "stock": 1, "category": None},
+            {"name": "Fresh", "price": 10, "stock": 3, "category": category.id},
+        )
+
+        with django_capture_on_commit_callbacks(execute=True):
+            post_ndjson(admin_client, body)
+
+        assert find_drift() == {}
+        assert api_client.get("/api/products/", HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    def test_batches(self, settings, admin_client):
+        settings.PRODUCT_IMPORT_BATCH_SIZE = 2
+        body = "name,price,stock\n" + "".join(f"P{i},1,1\n" for i in range(5))
+
+        response = post_csv(admin_client, body)
+
+        assert response.json()["created"] == 5
+
+
+@pytest.mark.django_db
+class TestImportProductsCommand:
+
+    def test_imports_file(self, tmp_path):
+        path = tmp_path / "products.ndjson"
+        path.write_text(ndjson({"name": "Cmd", "price": 1, "stock": 2}, {"name": "", "price": 1, "stock": 1}))
+        out = StringIO()
+
+        call_command("import_products", str(path), stdout=out)
+
+        assert Product.objects.filter(name="Cmd").exists()
+        assert "1 created, 0 updated, 1 error(s)" in out.getvalue()
+        assert "row 2:" in out.getvalue()
+
+    def test_unknown_extension_needs_format(self, tmp_path):
+        path = tmp_path / "products.txt"
+        path.write_text("name,price,stock\nA,1,1\n")
+
+        with pytest.raises(CommandError):
+            call_command("import_products", str(path))
+
+        call_command("import_products", str(path), "--format", "csv", stdout=StringIO())
+        assert Product.objects.filter(name="A").exists()
@@ -0,0 +1,112 @@
+import pytest
+from django.db import connection
+
+from api.models import Product
+from api.search import SEARCH_ENGINE_FULLTEXT, search_products, split_keywords
+
+
+@pytest.fixture
+def fulltext_engine(settings):
+    settings.PRODUCT_SEARCH_ENGINE = SEARCH_ENGINE_FULLTEXT
+
+
+@pytest.fixture
+def setup_products(category):
+    return [
+        Product.objects.create(name="iPhone 15 Pro Max", price=30000000, stock=10, category=category),
+        Product.objects.create(name="Samsung Galaxy S24", price=25000000, stock=5, category=category),
+        Product.objects.create(name="iPhone 14", price=20000000, stock=8, category=category),
+        Product.objects.create(name="Xiaomi Redmi Note 13", price=5000000, stock=20),
+    ]
+
+
+def test_split_keywords_normalizes_plus_and_whitespace():
+    assert split_keywords("  iphone+pro   max ") == ["iphone", "pro", "max"]
+    assert split_keywords("   ") == []
+    assert split_keywords(None) == []
+
+
+@pytest.mark.django_db
+class TestFulltextProductSearch:
+
+    def test_search_matches_whole_word(self, api_client, setup_products, fulltext_engine):
+        response = api_client.get("/api/products/?search=iPhone")
+
+        assert response.status_code == 200
+        assert sorted(p["name"] for p in response.data) == ["iPhone 14", "iPhone 15 Pro Max"]
+
+    def test_search_is_case_insensitive(self, api_client, setup_products, fulltext_engine):
+        response = api_client.get("/api/products/?search=GALAXY")
+
+        assert response.status_code == 200
+        assert [p["name"] for p in response.data] == ["Samsung Galaxy S24"]
+
+    def test_search_matches_word_prefix(self, api_client, setup_products, fulltext_engine):
+        response = api_client.get("/api/products/?search=sams")
+
+        assert response.status_code == 200
+        assert [p["name"] for p in response.data] == ["Samsung Galaxy S24"]
+
+    def test_search_requires_all_keywords(self, api_client, setup_products, fulltext_engine):
+        response = api_client.get("/api/products/?search=iphone+pro")
+
+        assert response.status_code == 200
+        assert [p["name"] for p in response.data] == ["iPhone 15 Pro Max"]
+
+    def test_search_with_no_results(self, api_client, setup_products, fulltext_engine):
+        response = api_client.get("/api/products/?search=NonExistentProduct")
+
+        assert response.status_code == 200
+        assert response.data == []
+
+    def test_empty_search_returns_all(self, api_client, setup_products, fulltext_engine):
+        response = api_client.get("/api/products/?search=")
+
+        assert response.status_code == 200
+        assert len(response.data) == 4
+
+    def test_punctuation_only_search_falls_back_to_icontains(self, api_client, category, fulltext_engine):
+        Product.objects.create(name="C# in Depth", price=100, stock=1, category=category)
+        Product.objects.create(name="Clean Code", price=100, stock=1, category=category)
+
+        response = api_client.get("/api/products/?search=%23")
+
+        assert response.status_code == 200
+        assert [p["name"] for p in response.data] == ["C# in Depth"]
+
+    def test_tsquery_operators_are_not_injected(self, api_client, setup_products, fulltext_engine):
+        response = api_client.get("/api/products/?search=iphone%20%7C%20!galaxy")
+
+        assert response.status_code == 200
+        assert [p["name"] for p in response.data] == []
+
+    def test_search_combined_with_category(self, api_client, setup_products, category, fulltext_engine):
+        response = api_client.get(f"/api/products/?category={category.id}&search=redmi")
+
+        assert response.status_code == 200
+        assert response.data == []
+
+    def test_results_are_ranked_by_relevance(self, api_client, category, fulltext_engine):
+        low = Product.objects.create(name="Laptop Stand", price=100, stock=1, category=category)
+        high = Product.objects.create(name="Laptop Laptop Sleeve", price=100, stock=1, category=category)
+
+        response = api_client.get("/api/products/?search=laptop")
+
+        assert [p["id"] for p in response.data] == [high.id, low.id]
+
+    def test_search_paginates(self, api_client, setup_products, fulltext_engine):
+        page_1 = api_client.get("/api/products/?search=iphone&page=1&page_size=1")
+        page_2 = api_client.get("/api/products/?search=iphone&page=2&page_size=1")
+
+        assert len(page_1.data) == 1
+        assert len(page_2.data) == 1
+        assert page_1.data[0]["id"] != page_2.data[0]["id"]
+
+    def test_fulltext_query_uses_name_search_index(self, setup_products):
+        queryset, ranked = search_products(Product.objects.all(), "iphone", engine=SEARCH_ENGINE_FULLTEXT)
+
+        assert ranked is True
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            plan = queryset.explain()
+        assert "api_product_name_search_idx" in plan
@@ -0,0 +1,207 @@
+import threading
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Cart, CartItem, Category, Product, ProductStatistics
+from api.product_stats import GLOBAL_KEY, find_drift, get_statistics, stats_key
+
+
+def _counters(key=GLOBAL_KEY):
+    return get_statistics(key)
+
+
+@pytest.mark.django_db
+class TestIncrementalCounters:
+
+    def test_create_updates_global_and_category_rows(self, category):
+        Product.objects.create(name="A", price=100, stock=3, category=category)
+        Product.objects.create(name="B", price=50, stock=2)
+
+        assert _counters() == {"product_count": 2, "price_sum": 150, "stock_sum": 5, "stock_value": 400}
+        assert _counters(stats_key(category.id))["stock_value"] == 300
+        assert _counters(stats_key(None))["product_count"] == 1
+
+    def test_update_applies_difference(self, category):
+        product = Product.objects.create(name="A", price=100, stock=3, category=category)
+
+        product.price = 120
+        product.stock = 1
+        product.save()
+
+        assert _counters() == {"product_count": 1, "price_sum": 120, "stock_sum": 1, "stock_value": 120}
+
+    def test_update_with_stale_instance_uses_stored_row(self, category):
+        product = Product.objects.create(name="A", price=100, stock=3, category=category)
+        Product.objects.filter(pk=product.pk).update(stock=10)
+        ProductStatistics.objects.filter(key=GLOBAL_KEY).update(stock_sum=10, stock_value=1000)
+
+        product.stock = 4  # instance still believes stock == 3
+        product.save()
+
+        assert _counters()["stock_sum"] == 4
+        assert _counters()["stock_value"] == 400
+
+    def test_moving_category_moves_counters(self, category):
+        other = Category.objects.create(name="Other")
+        product = Product.objects.create(name="A", price=100, stock=3, category=category)
+
+        product.category = other
+        product.save()
+
+        assert _counters(stats_key(category.id))["product_count"] == 0
+        assert _counters(stats_key(other.id))["product_count"] == 1
+        assert _counters()["product_count"] == 1
+
+    def test_save_without_stat_fields_skips_counters(self, category):
+        product = Product.objects.create(name="A", price=100, stock=3, category=category)
+
+        with CaptureQueriesContext(connection) as ctx:
+            product.name = "Renamed"
+            product.save(update_fields=["name"])
+
+        assert not any("api_productstatistics" in q["sql"] for q in ctx.captured_queries)
+        assert not any("SELECT" in q["sql"] and 'FROM "api_product"' in q["sql"] for q in ctx.captured_queries)
+
+    def test_delete_decrements(self, category):
+        product = Product.objects.create(name="A", price=100, stock=3, category=category)
+        Product.objects.create(name="B", price=10, stock=1, category=category)
+
+        product.delete()
+
+        assert _counters() == {"product_count": 1, "price_sum": 10, "stock_sum": 1, "stock_value": 10}
+
+    def test_category_delete_cascades(self, category):
+        Product.objects.create(name="A", price=100, stock=3, category=category)
+        Product.objects.create(name="B", price=10, stock=1)
+        key = stats_key(category.id)
+
+        category.delete()
+
+        assert _counters()["product_count"] == 1
+        assert not ProductStatistics.objects.filter(key=key).exists()
+        assert find_drift() == {}
+
+    def test_large_stock_value_does_not_overflow(self):
+        Product.objects.create(name="A", price=2 * 10**9, stock=1000)
+
+        assert _counters()["stock_value"] == 2 * 10**12
+        assert find_drift() == {}
+
+    def test_checkout_decrements_stock_after_commit(
+        self, authenticated_client, user, product, django_capture_on_commit_callbacks
+    ):
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=product, quantity=4)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = authenticated_client.post("/api/orders/")
+
+        assert response.status_code == 201
+        assert _counters()["stock_sum"] == product.stock - 4
+        assert find_drift() == {}
+
+
+@pytest.mark.django_db
+class TestStatisticsEndpoint:
+
+    def test_read_is_single_query(self, api_client, multiple_products):
+        with CaptureQueriesContext(connection) as ctx:
+            response = api_client.get("/api/products/statistics/")
+
+        assert response.status_code == 200
+        assert response.data["total_products"] == 5
+        assert len(ctx.captured_queries) == 1
+
+    def test_exposes_stock_counters(self, api_client):
+        Product.objects.create(name="A", price=100, stock=3)
+
+        response = api_client.get("/api/products/statistics/")
+
+        assert response.data["total_stock"] == 3
+        assert response.data["stock_value"] == 300
+
+    def test_category_breakdown(self, api_client, category):
+        Product.objects.create(name="A", price=100, stock=3, category=category)
+        Product.objects.create(name="B", price=300, stock=1)
+
+        response = api_client.get(f"/api/products/statistics/?category={category.id}")
+
+        assert response.status_code == 200
+        assert response.data["category"] == category.id
+        assert response.data["total_products"] == 1
+        assert response.data["average_price"] == 100
+
+    def test_unknown_category_returns_zeros(self, api_client):
+        response = api_client.get("/api/products/statistics/?category=999999")
+
+        assert response.status_code == 200
+        assert response.data["total_products"] == 0
+
+    def test_invalid_category_returns_400(self, api_client):
+        response = api_client.get("/api/products/statistics/?category=abc")
+
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestRebuildCommand:
+
+    def test_verify_passes_when_consistent(self, multiple_products, capsys):
+        call_command("rebuild_product_statistics", "--verify")
+
+        assert "consistent" in capsys.readouterr().out
+
+    def test_verify_reports_drift_from_bulk_writes(self, category):
+        Product.objects.bulk_create([Product(name="Bulk", price=10, stock=1, category=category)])
+
+        with pytest.raises(CommandError):
+            call_command("rebuild_product_statistics", "--verify")
+
+    def test_rebuild_fixes_drift(self, category, capsys):
+        Product.objects.create(name="A", price=100, stock=3, category=category)
+        Product.objects.bulk_create([Product(name="Bulk", price=10, stock=1)])
+        ProductStatistics.objects.create(key="category:424242")
+
+        call_command("rebuild_product_statistics")
+
+        assert "corrected" in capsys.readouterr().out
+        assert find_drift() == {}
+        assert _counters()["product_count"] == 2
+        assert not ProductStatistics.objects.filter(key="category:424242").exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_updates_keep_counters_exact(admin_client, category):
+    product = Product.objects.create(name="A", price=100, stock=3, category=category)
+    saved = threading.Event()
+    release = threading.Event()
+
+    def update_stock():
+        try:
+            with transaction.atomic():
+                row = Product.objects.get(pk=product.pk)
+                row.stock = 10
+                row.save()
+                saved.set()
+                release.wait(5)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=update_stock)
+    thread.start()
+    saved.wait(5)
+    # the PUT waits for the row lock and must see stock 10 as the old value
+    threading.Timer(0.5, release.set).start()
+    response = admin_client.put(
+        f"/api/products/{product.id}/",
+        {"name": "A", "price": 100, "stock": 5, "category": category.id},
+        format="json",
+    )
+    thread.join()
+
+    assert response.status_code == 200
+    assert find_drift() == {}
+    assert _counters()["stock_sum"] == 5
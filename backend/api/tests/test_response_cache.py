@@ -0,0 +1,403 @@
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.models import Cart, Category, Order, Payment, Product
+from api import response_cache
+from api.response_cache import (
+    PRODUCT_LIST_TAG,
+    get_cache_counters,
+    product_tag,
+    purge_tags,
+    reset_cache_counters,
+)
+from api.webhook_inbox import apply_payment_event
+
+
+@pytest.fixture(autouse=True)
+def enable_response_cache(settings):
+    settings.API_CACHE_TTL = 3600
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def product_queries(ctx):
+    return [q for q in ctx.captured_queries if '"api_product"' in q["sql"]]
+
+
+@pytest.mark.django_db
+class TestTaggedResponseCache:
+
+    def test_hit_skips_product_queries(self, api_client, multiple_products):
+        first = api_client.get("/api/products/")
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = api_client.get("/api/products/")
+
+        assert second.status_code == 200
+        assert second.content == first.content
+        assert product_queries(ctx) == []
+
+    def test_disabled_when_ttl_is_zero(self, settings, api_client, multiple_products):
+        settings.API_CACHE_TTL = 0
+        api_client.get("/api/products/")
+
+        with CaptureQueriesContext(connection) as ctx:
+            api_client.get("/api/products/")
+
+        assert product_queries(ctx) != []
+
+    def test_product_update_purges_list_and_detail(
+        self, api_client, admin_client, product, django_capture_on_commit_callbacks
+    ):
+        api_client.get("/api/products/")
+        api_client.get(f"/api/products/{product.id}/")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            admin_client.put(
+                f"/api/products/{product.id}/",
+                {"name": "Renamed", "price": product.price, "stock": product.stock},
+                format="json",
+            )
+
+        assert api_client.get("/api/products/").json()[0]["name"] == "Renamed"
+        assert api_client.get(f"/api/products/{product.id}/").json()["name"] == "Renamed"
+
+    def test_purge_is_scoped_to_tag(self, api_client, product):
+        other = Product.objects.create(name="Other", price=1, stock=1)
+        api_client.get(f"/api/products/{product.id}/")
+        api_client.get(f"/api/products/{other.id}/")
+
+        purge_tags(product_tag(product.id))
+
+        with CaptureQueriesContext(connection) as ctx:
+            api_client.get(f"/api/products/{other.id}/")
+        assert product_queries(ctx) == []
+
+        with CaptureQueriesContext(connection) as ctx:
+            api_client.get(f"/api/products/{product.id}/")
+        assert product_queries(ctx) != []
+
+    def test_category_rename_purges_product_detail(
+        self, api_client, admin_client, product, category, django_capture_on_commit_callbacks
+    ):
+        api_client.get(f"/api/products/{product.id}/")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            admin_client.put(f"/api/categories/{category.id}/", {"name": "Renamed"}, format="json")
+
+        response = api_client.get(f"/api/products/{product.id}/")
+        assert response.json()["category"]["name"] == "Renamed"
+
+    def test_category_create_purges_category_list(
+        self, api_client, category, django_capture_on_commit_callbacks
+    ):
+        api_client.get("/api/categories/")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Category.objects.create(name="Fresh")
+
+        names = [c["name"] for c in api_client.get("/api/categories/").json()]
+        assert "Fresh" in names
+
+    def test_purge_waits_for_commit(self, api_client, product, django_capture_on_commit_callbacks):
+        api_client.get("/api/products/")
+
+        with django_capture_on_commit_callbacks(execute=False) as callbacks:
+            Product.objects.filter(pk=product.pk).update(name="Pending")
+            product.refresh_from_db()
+            product.save()
+            with CaptureQueriesContext(connection) as ctx:
+                api_client.get("/api/products/")
+            assert product_queries(ctx) == []
+
+        for callback in callbacks:
+            callback()
+        assert api_client.get("/api/products/").json()[0]["name"] == "Pending"
+
+    def test_statistics_purged_by_product_create(
+        self, api_client, product, django_capture_on_commit_callbacks
+    ):
+        before = api_client.get("/api/products/statistics/").json()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Product.objects.create(name="New", price=10, stock=1)
+
+        after = api_client.get("/api/products/statistics/").json()
+        assert after["total_products"] == before["total_products"] + 1
+
+    def test_checkout_purges_stock(
+        self, api_client, authenticated_client, product, django_capture_on_commit_callbacks
+    ):
+        api_client.get(f"/api/products/{product.id}/")
+        authenticated_client.post(
+            "/api/cart/", {"product_id": product.id, "quantity": 2}, format="json"
+        )
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = authenticated_client.post("/api/orders/", {}, format="json")
+        assert response.status_code == 201
+
+        assert api_client.get(f"/api/products/{product.id}/").json()["stock"] == product.stock - 2
+
+    def test_cached_response_still_answers_conditional_get(self, api_client, multiple_products):
+        etag = api_client.get("/api/products/")["ETag"]
+        assert api_client.get("/api/products/")["ETag"] == etag
+
+        response = api_client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+
+    def test_errors_are_not_cached(self, api_client, db):
+        assert api_client.get("/api/products/999999/").status_code == 404
+
+        with CaptureQueriesContext(connection) as ctx:
+            assert api_client.get("/api/products/999999/").status_code == 404
+        assert product_queries(ctx) != []
+
+
+def cached_entry(path):
+    return cache.get(f"resp:{path}")
+
+
+@pytest.mark.django_db
+class TestStampedeProtection:
+
+    @pytest.fixture(autouse=True)
+    def counters(self, settings):
+        settings.API_CACHE_EARLY_REFRESH_BETA = 0
+        reset_cache_counters()
+
+    def expire(self, path):
+        entry = cached_entry(path)
+        entry["fresh_until"] = time.time() - 1
+        cache.set(f"resp:{path}", entry, 60)
+
+    def test_counts_miss_then_hit(self, api_client, product):
+        api_client.get("/api/products/")
+        api_client.get("/api/products/")
+
+        counters = get_cache_counters()["product_list_create"]
+        assert counters["miss"] == 1
+        assert counters["hit"] == 1
+
+    def test_expired_entry_is_served_stale_while_refreshing(self, api_client, product):
+        api_client.get("/api/products/")
+        self.expire("/api/products/")
+        cache.add("resplock:resp:/api/products/", "other", 60)
+        Product.objects.filter(pk=product.pk).update(name="Changed")
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = api_client.get("/api/products/")
+
+        assert response.json()[0]["name"] == product.name
+        assert product_queries(ctx) == []
+        assert get_cache_counters()["product_list_create"]["stale"] == 1
+
+    def test_expired_entry_is_refreshed_by_lock_holder(self, api_client, product):
+        api_client.get("/api/products/")
+        self.expire("/api/products/")
+        Product.objects.filter(pk=product.pk).update(name="Changed")
+
+        response = api_client.get("/api/products/")
+
+        assert response.json()[0]["name"] == "Changed"
+        assert cache.get("resplock:resp:/api/products/") is None
+        assert cached_entry("/api/products/")["fresh_until"] > time.time()
+
+    def test_waiter_receives_lock_holder_result(self, api_client, product):
+        api_client.get("/api/products/")
+        entry = cached_entry("/api/products/")
+        cache.delete("resp:/api/products/")
+        cache.add("resplock:resp:/api/products/", "other", 60)
+
+        def finish_refresh():
+            cache.set("resp:/api/products/", entry, 60)
+            cache.delete("resplock:resp:/api/products/")
+
+        timer = threading.Timer(0.05, finish_refresh)
+        timer.start()
+        try:
+            with CaptureQueriesContext(connection) as ctx:
+                response = api_client.get("/api/products/")
+        finally:
+            timer.join()
+
+        assert response.status_code == 200
+        assert product_queries(ctx) == []
+        assert get_cache_counters()["product_list_create"]["coalesced"] == 1
+
+    def test_purged_entry_is_never_served_stale(self, settings, api_client, product):
+        settings.API_CACHE_COALESCE_TIMEOUT_MS = 0
+        api_client.get("/api/products/")
+        cache.add("resplock:resp:/api/products/", "other", 60)
+        Product.objects.filter(pk=product.pk).update(name="Changed")
+        purge_tags(PRODUCT_LIST_TAG)
+
+        response = api_client.get("/api/products/")
+
+        assert response.json()[0]["name"] == "Changed"
+        assert get_cache_counters()["product_list_create"]["stale"] == 0
+
+    def test_failed_view_releases_lock(self, api_client, db):
+        api_client.get("/api/products/999999/")
+
+        assert cache.get("resplock:resp:/api/products/999999/") is None
+
+
+class TestEarlyRefresh:
+
+    def entry(self, fresh_in, delta):
+        return {"fresh_until": time.time() + fresh_in, "delta": delta}
+
+    def test_far_from_expiry_is_not_refreshed(self, settings, monkeypatch):
+        settings.API_CACHE_EARLY_REFRESH_BETA = 1.0
+        monkeypatch.setattr(response_cache.random, "random", lambda: 0.5)
+
+        assert not response_cache._needs_refresh(self.entry(60, 0.1), time.time())
+
+    def test_slow_view_close_to_expiry_is_refreshed(self, settings, monkeypatch):
+        settings.API_CACHE_EARLY_REFRESH_BETA = 1.0
+        monkeypatch.setattr(response_cache.random, "random", lambda: 0.9)
+
+        # -ln(0.1) * 2s > 1s left
+        assert response_cache._needs_refresh(self.entry(1, 2.0), time.time())
+
+    def test_disabled_with_zero_beta(self, settings):
+        settings.API_CACHE_EARLY_REFRESH_BETA = 0
+
+        assert not response_cache._needs_refresh(self.entry(0.001, 100), time.time())
+
+
+@pytest.mark.django_db
+class TestCacheStatsEndpoint:
+
+    def test_requires_admin(self, authenticated_client):
+        assert authenticated_client.get("/api/cache/stats/").status_code == 403
+
+    def test_reports_cached_views(self, admin_client):
+        response = admin_client.get("/api/cache/stats/")
+
+        assert response.status_code == 200
+        assert set(response.json()["product_detail"]) == {"hit", "miss", "coalesced", "stale", "hit_rate"}
+
+
+def user_queries(ctx):
+    return [
+        q for q in ctx.captured_queries
+        if any(table in q["sql"] for table in ('"api_cart', '"api_wishlist"', '"api_order'))
+    ]
+
+
+@pytest.mark.django_db
+class TestPerUserCache:
+
+    @pytest.fixture(autouse=True)
+    def counters(self, settings):
+        settings.API_CACHE_EARLY_REFRESH_BETA = 0
+        reset_cache_counters()
+
+    def test_cart_hit_skips_queries(self, authenticated_client, cart_with_item):
+        first = authenticated_client.get("/api/cart/")
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = authenticated_client.get("/api/cart/")
+
+        assert second.content == first.content
+        assert user_queries(ctx) == []
+        assert get_cache_counters()["cart_view"]["hit_rate"] == 0.5
+
+    def test_entries_are_per_user(self, authenticated_client, admin_client, cart_with_item):
+        mine = authenticated_client.get("/api/cart/").json()
+
+        theirs = admin_client.get("/api/cart/").json()
+
+        assert len(mine["items"]) == 1
+        assert theirs["items"] == []
+
+    def test_cart_mutations_bump_version(
+        self, authenticated_client, cart_with_item, product, django_capture_on_commit_callbacks
+    ):
+        authenticated_client.get("/api/cart/")
+        item_id = authenticated_client.get("/api/cart/").json()["items"][0]["id"]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            authenticated_client.post("/api/cart/", {"product_id": product.id, "quantity": 1}, format="json")
+        assert authenticated_client.get("/api/cart/").json()["items"][0]["quantity"] == 3
+
+        with django_capture_on_commit_callbacks(execute=True):
+            authenticated_client.put(f"/api/cart/items/{item_id}/", {"quantity": 7}, format="json")
+        assert authenticated_client.get("/api/cart/").json()["items"][0]["quantity"] == 7
+
+        with django_capture_on_commit_callbacks(execute=True):
+            authenticated_client.post(
+                "/api/cart/batch/", {"items": [{"product_id": product.id, "op": "remove"}]}, format="json"
+            )
+        assert authenticated_client.get("/api/cart/").json()["items"] == []
+
+    def test_product_change_purges_carts_holding_it(
+        self, authenticated_client, cart_with_item, product, django_capture_on_commit_callbacks
+    ):
+        authenticated_client.get("/api/cart/")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            product.price = 1
+            product.save()
+
+        assert authenticated_client.get("/api/cart/").json()["total"] == 2
+
+    def test_wishlist_mutations_bump_version(
+        self, authenticated_client, product, django_capture_on_commit_callbacks
+    ):
+        assert authenticated_client.get("/api/wishlist/").json() == []
+
+        with django_capture_on_commit_callbacks(execute=True):
+            authenticated_client.post("/api/wishlist/", {"product_id": product.id}, format="json")
+        assert len(authenticated_client.get("/api/wishlist/").json()) == 1
+
+        with django_capture_on_commit_callbacks(execute=True):
+            authenticated_client.delete(f"/api/wishlist/{product.id}/")
+        assert authenticated_client.get("/api/wishlist/").json() == []
+
+    def test_checkout_bumps_orders_and_cart(
+        self, authenticated_client, cart_with_item, django_capture_on_commit_callbacks
+    ):
+        assert authenticated_client.get("/api/orders/").json() == []
+        authenticated_client.get("/api/cart/")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            assert authenticated_client.post("/api/orders/", {}, format="json").status_code == 201
+
+        assert len(authenticated_client.get("/api/orders/").json()) == 1
+        assert authenticated_client.get("/api/cart/").json()["items"] == []
+
+    def test_payment_webhook_bumps_order_summary(
+        self, authenticated_client, user, django_capture_on_commit_callbacks
+    ):
+        order = Order.objects.create(user=user, total=100000)
+        Payment.objects.create(order=order, provider="vnpay", amount=100000)
+        assert authenticated_client.get("/api/orders/", {"summary": 1}).json()[0]["status"] == "pending"
+
+        with django_capture_on_commit_callbacks(execute=True):
+            apply_payment_event("TXN1", order.id, "paid")
+
+        assert authenticated_client.get("/api/orders/", {"summary": 1}).json()[0]["status"] == "paid"
+
+    def test_stale_cart_cleanup_bumps_cart(
+        self, authenticated_client, cart_with_item, django_capture_on_commit_callbacks
+    ):
+        assert len(authenticated_client.get("/api/cart/").json()["items"]) == 1
+        Cart.objects.filter(pk=cart_with_item.pk).update(updated_at=timezone.now() - timedelta(days=2))
+
+        with django_capture_on_commit_callbacks(execute=True):
+            call_command("cleanup_stale_data", stdout=StringIO())
+
+        assert authenticated_client.get("/api/cart/").json()["items"] == []
@@ -0,0 +1,223 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+from api.shared_cache import (
+    DEFAULT_SIZE_BYTES,
+    HEADER,
+    MAX_KEY_SIZE,
+    SLOT,
+    TABLE_HEADER,
+    SharedMemoryCache,
+    fits,
+)
+
+
+def make_cache(path, **options):
+    return SharedMemoryCache(str(path), {"OPTIONS": {"MAX_ENTRIES": 50, **options}})
+
+
+@pytest.fixture
+def shared_cache(tmp_path):
+    return make_cache(tmp_path / "cache")
+
+
+def _incr_many(path, count):
+    cache = make_cache(path)
+    for _ in range(count):
+        cache.incr("counter")
+
+
+def _set_value(path):
+    make_cache(path).set("from-child", {"pid": "child"})
+
+
+class TestSharedMemoryCache:
+
+    def test_set_get_delete(self, shared_cache):
+        shared_cache.set("key", {"a": [1, 2]})
+
+        assert shared_cache.get("key") == {"a": [1, 2]}
+        assert shared_cache.delete("key") is True
+        assert shared_cache.get("key", "missing") == "missing"
+        assert shared_cache.delete("key") is False
+
+    def test_add_only_when_missing(self, shared_cache):
+        assert shared_cache.add("key", 1) is True
+        assert shared_cache.add("key", 2) is False
+        assert shared_cache.get("key") == 1
+
+    def test_expired_entries_are_gone(self, shared_cache):
+        shared_cache.set("key", 1, timeout=0)
+
+        assert shared_cache.get("key") is None
+        assert shared_cache.has_key("key") is False
+        assert shared_cache.add("key", 2) is True
+
+    def test_none_timeout_never_expires(self, shared_cache):
+        shared_cache.set("key", 1, timeout=None)
+        shared_cache.touch("key", None)
+
+        assert shared_cache.get("key") == 1
+
+    def test_incr_keeps_value_and_raises_when_missing(self, shared_cache):
+        shared_cache.set("n", 5)
+
+        assert shared_cache.incr("n", 3) == 8
+        assert shared_cache.get("n") == 8
+        with pytest.raises(ValueError):
+            shared_cache.incr("missing")
+
+    @pytest.mark.filterwarnings("ignore::django.core.cache.CacheKeyWarning")
+    def test_long_keys_are_supported(self, shared_cache):
+        key = "resp:/api/products/?" + "x" * 400
+
+        shared_cache.set(key, "long")
+
+        assert shared_cache.get(key) == "long"
+
+    def test_oversized_values_are_not_cached(self, tmp_path):
+        cache = make_cache(tmp_path / "cache", MAX_VALUE_SIZE=100)
+        cache.set("key", "small")
+
+        cache.set("key", "x" * 1000)
+
+        assert cache.get("key") is None
+
+    def test_culls_least_recently_used(self, tmp_path):
+        cache = make_cache(tmp_path / "cache", MAX_ENTRIES=9, CULL_FREQUENCY=3)
+        for i in range(9):
+            cache.set(f"k{i}", i)
+        # refresh the oldest entries so they survive the cull
+        for i in range(3):
+            cache.get(f"k{i}")
+
+        cache.set("new", "value")
+
+        assert cache.get("new") == "value"
+        assert all(cache.get(f"k{i}") == i for i in range(3))
+        assert [cache.get(f"k{i}") for i in range(3, 6)] == [None, None, None]
+
+    def test_cull_drops_expired_entries_first(self, tmp_path):
+        cache = make_cache(tmp_path / "cache", MAX_ENTRIES=5)
+        for i in range(4):
+            cache.set(f"k{i}", i)
+        cache.set("expired", 1)
+        cache.touch("expired", 0)
+
+        cache.set("new", "value")
+
+        assert [cache.get(f"k{i}") for i in range(4)] == [0, 1, 2, 3]
+
+    def test_deletes_keep_probe_chains_intact(self, tmp_path):
+        cache = make_cache(tmp_path / "cache", MAX_ENTRIES=40)
+        for i in range(40):
+            cache.set(f"k{i}", i)
+
+        for i in range(0, 40, 2):
+            cache.delete(f"k{i}")
+
+        assert [cache.get(f"k{i}") for i in range(1, 40, 2)] == list(range(1, 40, 2))
+        assert all(cache.get(f"k{i}") is None for i in range(0, 40, 2))
+
+    def test_clear(self, shared_cache):
+        shared_cache.set("key", 1)
+
+        shared_cache.clear()
+
+        assert shared_cache.get("key") is None
+        shared_cache.set("key", 2)
+        assert shared_cache.get("key") == 2
+
+    def test_instances_share_the_file(self, tmp_path):
+        make_cache(tmp_path / "cache").set("key", "shared")
+
+        assert make_cache(tmp_path / "cache").get("key") == "shared"
+
+    def test_visible_across_processes(self, tmp_path):
+        path = tmp_path / "cache"
+        cache = make_cache(path)
+        cache.get("warm-up")
+
+        process = multiprocessing.get_context("fork").Process(target=_set_value, args=(path,))
+        process.start()
+        process.join(10)
+
+        assert cache.get("from-child") == {"pid": "child"}
+
+    def test_incr_is_atomic_across_processes(self, tmp_path):
+        path = tmp_path / "cache"
+        cache = make_cache(path)
+        cache.set("counter", 0, timeout=None)
+
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=_incr_many, args=(path, 200)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(30)
+
+        assert cache.get("counter") == 800
+
+    def test_changed_geometry_reinitializes(self, tmp_path):
+        make_cache(tmp_path / "cache").set("key", 1)
+
+        cache = make_cache(tmp_path / "cache", MAX_VALUE_SIZE=1024)
+
+        assert cache.get("key") is None
+        cache.set("key", 2)
+        assert cache.get("key") == 2
+
+    def test_size_budget_limits_slots(self, tmp_path, caplog):
+        size_bytes = HEADER.size + TABLE_HEADER.size + 10 * (SLOT.size + MAX_KEY_SIZE + 100)
+        cache = make_cache(tmp_path / "cache", MAX_VALUE_SIZE=100, SIZE_BYTES=size_bytes)
+
+        for i in range(20):
+            cache.set(f"key{i}", i)
+
+        assert os.path.getsize(tmp_path / "cache") == size_bytes
+        assert sum(cache.has_key(f"key{i}") for i in range(20)) <= 8
+        assert cache.get("key19") == 19
+        assert "MAX_ENTRIES=50 lowered" in caplog.text
+
+    def test_size_budget_too_small(self, tmp_path):
+        with pytest.raises(ImproperlyConfigured):
+            make_cache(tmp_path / "cache", SIZE_BYTES=1024)
+
+    def test_default_budget_holds_max_entries(self, tmp_path, caplog):
+        cache = SharedMemoryCache(str(tmp_path / "cache"), {"OPTIONS": {"MAX_ENTRIES": 10000}})
+
+        for i in range(10000):
+            cache.set(f"throttle:{i}", [time.time()] * 5)
+        cache.set("page", "x" * 30000)
+
+        assert all(cache.has_key(f"throttle:{i}") for i in range(10000))
+        assert cache.get("page") == "x" * 30000
+        assert os.path.getsize(tmp_path / "cache") <= DEFAULT_SIZE_BYTES
+        assert "lowered" not in caplog.text
+
+    def test_value_moves_between_size_classes(self, shared_cache):
+        shared_cache.set("key", "x" * 5000)
+        shared_cache.set("key", "small")
+
+        assert shared_cache.get("key") == "small"
+        assert shared_cache.delete("key") is True
+        assert shared_cache.get("key") is None
+
+
+class TestFits:
+
+    def test_checks_free_space(self, tmp_path, monkeypatch):
+        class Stats:
+            f_bavail = 100
+            f_frsize = 4096
+        monkeypatch.setattr(os, "statvfs", lambda path: Stats)
+
+        assert fits(str(tmp_path / "cache"), 100 * 4096)
+        assert not fits(str(tmp_path / "cache"), 100 * 4096 + 1)
+
+    def test_missing_directory(self, tmp_path):
+        assert not fits(str(tmp_path / "missing" / "cache"), 1)
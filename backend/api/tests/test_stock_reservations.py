@@ -0,0 +1,150 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from api.cart import CartError, add_to_cart
+from api.checkout import CheckoutError, checkout
+from api.models import CartItem, Product, StockReservation
+from api.product_stats import find_drift, rebuild_statistics
+from api.reservations import release_expired_reservations
+
+CART_URL = "/api/cart/"
+
+
+def stock(product):
+    return Product.objects.get(pk=product.pk).stock
+
+
+def held(user):
+    return dict(StockReservation.objects.filter(cart__user=user).values_list("product_id", "quantity"))
+
+
+@pytest.fixture
+def reserving(settings):
+    settings.STOCK_RESERVATIONS = True
+    settings.STOCK_RESERVATION_TTL = 600
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("reserving")
+class TestStockReservations:
+
+    def test_add_holds_stock(self, user, product):
+        add_to_cart(user, product.id, 3)
+        add_to_cart(user, product.id, 2)
+
+        assert stock(product) == 5
+        assert held(user) == {product.id: 5}
+        reservation = StockReservation.objects.get(product=product)
+        assert reservation.expires_at > timezone.now() + timedelta(seconds=590)
+
+    def test_early_rejection(self, authenticated_client, user, product):
+        add_to_cart(user, product.id, 8)
+
+        response = authenticated_client.post(CART_URL, {"product_id": product.id, "quantity": 3}, format="json")
+
+        assert response.status_code == 409
+        assert response.json()["error"] == "Not enough stock"
+        assert stock(product) == 2
+        assert CartItem.objects.get(cart__user=user).quantity == 8
+
+    def test_checkout_consumes_holds(self, user, product, django_capture_on_commit_callbacks):
+        rebuild_statistics()
+        with django_capture_on_commit_callbacks(execute=True):
+            add_to_cart(user, product.id, 4)
+        Product.objects.filter(pk=product.pk).update(stock=0)
+        rebuild_statistics()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            order, items = checkout(user)
+
+        assert [(item.product_name, item.quantity) for item in items] == [(product.name, 4)]
+        assert order.total == product.price * 4
+        assert stock(product) == 0
+        assert held(user) == {}
+        assert find_drift() == {}
+
+    def test_checkout_takes_uncovered_quantity_from_stock(self, user, product):
+        add_to_cart(user, product.id, 2)
+        CartItem.objects.filter(cart__user=user).update(quantity=5)
+
+        checkout(user)
+
+        assert stock(product) == 5
+
+    def test_checkout_gives_surplus_back(self, user, product):
+        add_to_cart(user, product.id, 4)
+        CartItem.objects.filter(cart__user=user).update(quantity=1)
+
+        checkout(user)
+
+        assert stock(product) == 9
+
+    def test_shortfall_keeps_holds(self, user, product, product_without_category):
+        add_to_cart(user, product.id, 2)
+        add_to_cart(user, product_without_category.id, 1)
+        CartItem.objects.filter(product=product_without_category).update(quantity=50)
+
+        with pytest.raises(CheckoutError):
+            checkout(user)
+
+        assert held(user) == {product.id: 2, product_without_category.id: 1}
+        assert stock(product) == 8
+
+    def test_delete_releases(self, authenticated_client, user, product):
+        item = add_to_cart(user, product.id, 3)
+
+        response = authenticated_client.delete(f"{CART_URL}items/{item.id}/")
+
+        assert response.status_code == 204
+        assert stock(product) == 10
+        assert held(user) == {}
+
+    def test_batch_remove_releases(self, authenticated_client, user, product):
+        add_to_cart(user, product.id, 3)
+
+        authenticated_client.post(
+            f"{CART_URL}batch/", {"items": [{"product_id": product.id, "op": "remove"}]}, format="json"
+        )
+
+        assert stock(product) == 10
+
+    def test_sweeper_releases_expired(self, user, admin_user, product, django_capture_on_commit_callbacks):
+        rebuild_statistics()
+        with django_capture_on_commit_callbacks(execute=True):
+            add_to_cart(user, product.id, 3)
+            add_to_cart(admin_user, product.id, 4)
+        StockReservation.objects.filter(cart__user=user).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        with django_capture_on_commit_callbacks(execute=True):
+            released = release_expired_reservations(batch_size=1)
+
+        assert released == 3
+        assert stock(product) == 6
+        assert held(admin_user) == {product.id: 4}
+        assert find_drift() == {}
+
+    def test_sweeper_command(self, user, product):
+        add_to_cart(user, product.id, 3)
+
+        call_command("release_expired_reservations", batch_size=10, stdout=StringIO())
+        assert stock(product) == 7
+
+        StockReservation.objects.update(expires_at=timezone.now())
+        call_command("release_expired_reservations", stdout=StringIO())
+        assert stock(product) == 10
+
+
+@pytest.mark.django_db
+def test_disabled_by_default(user, product):
+    add_to_cart(user, product.id, 3)
+
+    assert stock(product) == 10
+    assert not StockReservation.objects.exists()
+
+    Product.objects.filter(pk=product.pk).update(stock=0)
+    with pytest.raises(CartError):
+        add_to_cart(user, product.id, 1)
@@ -0,0 +1,191 @@
+import threading
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+
+from api.cart import CartError, add_to_cart
+from api.checkout import CheckoutError, checkout
+from api.models import Product, StockReservation, StockSlot
+from api.product_stats import find_drift, rebuild_statistics
+from api.stock_slots import rebalance_stock_slots, shard_product, split_stock, unshard_product
+from api.tests.conftest import fill_cart
+
+
+def slots(product):
+    return list(StockSlot.objects.filter(product=product).order_by("id").values_list("stock", flat=True))
+
+
+def stock(product):
+    return Product.objects.get(pk=product.pk).stock
+
+
+def test_split_stock():
+    assert split_stock(10, 4) == [3, 3, 2, 2]
+    assert split_stock(0, 2) == [0, 0]
+
+
+@pytest.mark.django_db
+class TestStockSlots:
+
+    def test_shard_and_unshard(self, product):
+        assert shard_product(product.id, slots=4) == 10
+        assert slots(product) == [3, 3, 2, 2]
+
+        StockSlot.objects.filter(product=product).update(stock=1)
+        assert unshard_product(product.id) == 4
+        assert stock(product) == 4
+        assert slots(product) == []
+
+    def test_checkout_takes_one_slot(self, user, product):
+        shard_product(product.id, slots=4)
+        fill_cart(user, [product], 2)
+
+        checkout(user)
+
+        assert sorted(slots(product)) == [1, 2, 2, 3]
+        # the product row is left to rebalancing
+        assert stock(product) == 10
+
+    def test_checkout_spreads_over_slots(self, user, admin_user, product):
+        shard_product(product.id, slots=4)
+        fill_cart(user, [product], 7)
+        fill_cart(admin_user, [product], 4)
+
+        checkout(user)
+        with pytest.raises(CheckoutError):
+            checkout(admin_user)
+
+        assert sum(slots(product)) == 3
+
+    def test_detail_and_add_to_cart_use_slot_total(self, api_client, user, product):
+        shard_product(product.id, slots=2)
+        fill_cart(user, [product], 10)
+        checkout(user)
+
+        assert api_client.get(f"/api/products/{product.id}/").json()["stock"] == 0
+        with pytest.raises(CartError) as exc:
+            add_to_cart(user, product.id, 1)
+        assert exc.value.status == 409
+
+    def test_rebalance(self, user, product, django_capture_on_commit_callbacks):
+        rebuild_statistics()
+        shard_product(product.id, slots=4)
+        fill_cart(user, [product], 3)
+        with django_capture_on_commit_callbacks(execute=True):
+            checkout(user)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            assert rebalance_stock_slots() == 1
+
+        assert slots(product) == [2, 2, 2, 1]
+        assert stock(product) == 7
+        assert find_drift() == {}
+        assert rebalance_stock_slots() == 0
+
+    def test_admin_stock_edit_respreads(self, admin_client, product, category):
+        shard_product(product.id, slots=2)
+
+        response = admin_client.put(
+            f"/api/products/{product.id}/",
+            {"name": product.name, "price": product.price, "stock": 7, "category": category.id},
+            format="json",
+        )
+
+        assert response.status_code == 200
+        assert slots(product) == [4, 3]
+
+    def test_not_reserved(self, settings, user, product):
+        settings.STOCK_RESERVATIONS = True
+        shard_product(product.id, slots=2)
+
+        add_to_cart(user, product.id, 3)
+
+        assert not StockReservation.objects.exists()
+        assert sum(slots(product)) == 10
+
+    def test_sharding_releases_holds(self, settings, user, product):
+        settings.STOCK_RESERVATIONS = True
+        add_to_cart(user, product.id, 3)
+
+        assert shard_product(product.id, slots=2) == 10
+        assert not StockReservation.objects.exists()
+
+    def test_commands(self, product):
+        call_command("shard_stock", str(product.id), "--slots", "3", stdout=StringIO())
+        assert slots(product) == [4, 3, 3]
+
+        call_command("rebalance_stock_slots", stdout=StringIO())
+        call_command("shard_stock", str(product.id), "--off", stdout=StringIO())
+        assert slots(product) == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_checkouts_on_hot_product_never_oversell(product):
+    Product.objects.filter(pk=product.pk).update(stock=12)
+    shard_product(product.id, slots=4)
+    users = [User.objects.create_user(username=f"hot{i}", password="x") for i in range(10)]
+    for user in users:
+        fill_cart(user, [product], 2)
+    results = []
+
+    def worker(user):
+        try:
+            checkout(user)
+            results.append("ok")
+        except CheckoutError:
+            results.append("short")
+        except Exception as exc:
+            # a deadlock must fail the test, not vanish with the thread
+            results.append(exc)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 10
+    assert results.count("ok") == 6
+    assert results.count("short") == 4
+    assert sum(slots(product)) == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_mixed_sharded_carts_never_deadlock(multiple_products):
+    first, second = multiple_products[:2]
+    for product in (first, second):
+        Product.objects.filter(pk=product.pk).update(stock=12)
+        shard_product(product.id, slots=4)
+    users = [User.objects.create_user(username=f"mixed{i}", password="x") for i in range(8)]
+    for index, user in enumerate(users):
+        # quantities no single slot covers, so every checkout waits on slots
+        for product in ((first, second) if index % 2 else (second, first)):
+            fill_cart(user, [product], 4)
+    results = []
+
+    def worker(user):
+        try:
+            checkout(user)
+            results.append("ok")
+        except CheckoutError:
+            results.append("short")
+        except Exception as exc:
+            results.append(exc)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 8
+    assert results.count("ok") == 3
+    assert results.count("short") == 5
+    assert sum(slots(first)) == sum(slots(second)) == 0
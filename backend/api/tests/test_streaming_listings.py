@@ -0,0 +1,99 @@
+import json
+
+import pytest
+from rest_framework.test import APIClient
+
+from api.models import Order, OrderItem
+from api.streaming import iter_json_array
+
+
+def _body(response):
+    assert response.streaming
+    return b"".join(response.streaming_content)
+
+
+def test_iter_json_array_matches_single_render():
+    rows = [{"id": i, "name": f"Tên {i}"} for i in range(7)]
+
+    chunks = list(iter_json_array(iter(rows), lambda chunk: chunk, chunk_size=3))
+
+    # [ + 3 chunks + ]
+    assert len(chunks) == 5
+    assert json.loads(b"".join(chunks)) == rows
+
+
+def test_iter_json_array_empty():
+    assert b"".join(iter_json_array(iter([]), lambda chunk: chunk, chunk_size=3)) == b"[]"
+
+
+@pytest.mark.django_db
+class TestStreamedProductList:
+
+    def test_stream_matches_regular_listing(self, api_client, multiple_products, settings):
+        settings.STREAM_CHUNK_SIZE = 2
+
+        regular = api_client.get("/api/products/")
+        streamed = api_client.get("/api/products/?stream=1")
+
+        assert streamed.status_code == 200
+        assert streamed["Content-Type"] == "application/json"
+        assert _body(streamed) == regular.content
+
+    def test_stream_applies_filters(self, api_client, multiple_products):
+        response = api_client.get("/api/products/?stream=true&search=Product+3")
+
+        data = json.loads(_body(response))
+        assert [p["name"] for p in data] == ["Product 3"]
+
+    def test_stream_is_not_subject_to_row_cap(self, api_client, multiple_products, settings):
+        settings.PRODUCT_LIST_MAX_ROWS = 2
+
+        response = api_client.get("/api/products/?stream=1")
+
+        assert len(json.loads(_body(response))) == len(multiple_products)
+
+    def test_stream_empty_catalog(self, api_client):
+        response = api_client.get("/api/products/?stream=1")
+
+        assert _body(response) == b"[]"
+
+    def test_stream_false_value_uses_regular_response(self, api_client, multiple_products):
+        response = api_client.get("/api/products/?stream=0")
+
+        assert not response.streaming
+        assert len(response.data) == len(multiple_products)
+
+
+@pytest.mark.django_db
+class TestStreamedOrderList:
+
+    @pytest.fixture
+    def orders(self, user):
+        orders = []
+        for i in range(3):
+            order = Order.objects.create(user=user, total=100 * (i + 1))
+            OrderItem.objects.create(order=order, product_name=f"P{i}", price=100, quantity=i + 1)
+            orders.append(order)
+        return orders
+
+    def test_stream_matches_regular_listing(self, authenticated_client, orders, settings):
+        settings.STREAM_CHUNK_SIZE = 2
+
+        regular = authenticated_client.get("/api/orders/")
+        streamed = authenticated_client.get("/api/orders/?stream=1")
+
+        assert streamed.status_code == 200
+        assert _body(streamed) == regular.content
+        assert [o["id"] for o in json.loads(regular.content)] == [o.id for o in reversed(orders)]
+
+    def test_stream_only_contains_own_orders(self, authenticated_client, orders, another_user):
+        Order.objects.create(user=another_user, total=1)
+
+        data = json.loads(_body(authenticated_client.get("/api/orders/?stream=1")))
+
+        assert len(data) == len(orders)
+
+    def test_stream_requires_authentication(self, db):
+        response = APIClient().get("/api/orders/?stream=1")
+
+        assert response.status_code == 401
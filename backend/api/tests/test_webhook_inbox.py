@@ -0,0 +1,172 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import Order, Payment, PaymentEvent
+from api.tests.test_payment_webhook import build_headers
+from api.webhook_inbox import process_webhook_batch
+
+WEBHOOK_URL = "/api/payments/webhook/"
+
+
+@pytest.fixture
+def inbox(settings):
+    settings.PAYMENT_WEBHOOK_INBOX = True
+
+
+@pytest.fixture
+def order(user):
+    order = Order.objects.create(user=user, total=100000)
+    Payment.objects.create(order=order, provider="vnpay", amount=100000)
+    return order
+
+
+def send(order, status="paid", transaction_id="TXN1"):
+    payload = {"transaction_id": transaction_id, "order_id": order.id, "status": status}
+    return APIClient().post(WEBHOOK_URL, payload, format="json", **build_headers(payload))
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("inbox")
+class TestWebhookInbox:
+
+    def test_event_stored_then_applied(self, order):
+        with CaptureQueriesContext(connection) as queries:
+            response = send(order)
+
+        assert response.status_code == 202
+        event = PaymentEvent.objects.get(pk=response.json()["event"])
+        assert event.payload["transaction_id"] == "TXN1"
+        assert [q["sql"].split()[0] for q in queries] == ["INSERT"]
+        assert Payment.objects.get().status == "pending"
+
+        assert process_webhook_batch() == 1
+
+        event.refresh_from_db()
+        assert (event.outcome_status, event.outcome) == (200, {"message": "Webhook processed"})
+        assert Payment.objects.get().status == "paid"
+        assert Order.objects.get(pk=order.pk).status == "paid"
+
+    def test_invalid_call_rejected_up_front(self, order):
+        payload = {"transaction_id": "BAD", "order_id": order.id, "status": "paid"}
+
+        response = APIClient().post(WEBHOOK_URL, payload, format="json", **build_headers(payload))
+
+        assert response.status_code == 400
+        assert not PaymentEvent.objects.exists()
+
+    def test_retry_storm_deduplicated(self, order):
+        for _ in range(5):
+            send(order)
+
+        with CaptureQueriesContext(connection) as queries:
+            assert process_webhook_batch() == 5
+
+        outcomes = list(PaymentEvent.objects.order_by("id").values_list("outcome", flat=True))
+        assert outcomes == [{"message": "Webhook processed"}] + [{"message": "Already processed"}] * 4
+        payment_reads = [q for q in queries if 'FROM "api_payment"' in q["sql"] and q["sql"].startswith("SELECT")]
+        # the first event looks up its transaction, then the order's pending payment
+        assert len(payment_reads) == 2
+
+    def test_conflict_stored(self, order):
+        send(order, "paid")
+        send(order, "failed")
+        send(order, "failed")
+
+        process_webhook_batch()
+
+        outcomes = list(PaymentEvent.objects.order_by("id").values_list("outcome_status", "outcome"))
+        assert outcomes == [
+            (200, {"message": "Webhook processed"}),
+            (409, {"error": "Payment already paid"}),
+            (409, {"error": "Payment already paid"}),
+        ]
+        assert Payment.objects.get().status == "paid"
+
+    def test_across_batches(self, order):
+        send(order)
+        process_webhook_batch()
+        send(order)
+
+        process_webhook_batch()
+
+        assert PaymentEvent.objects.order_by("-id").first().outcome == {"message": "Already processed"}
+
+    def test_order_not_found_stored(self, order):
+        payload = {"transaction_id": "TXN9", "order_id": 999999, "status": "paid"}
+        APIClient().post(WEBHOOK_URL, payload, format="json", **build_headers(payload))
+
+        process_webhook_batch()
+
+        event = PaymentEvent.objects.get()
+        assert (event.outcome_status, event.outcome) == (400, {"error": "Order not found"})
+
+    def test_database_error_left_in_inbox(self, order, monkeypatch):
+        send(order, transaction_id="TXN1")
+        send(order, transaction_id="TXN1")
+
+        def conflict(*args):
+            raise IntegrityError("duplicate transaction_id")
+
+        with monkeypatch.context() as patched:
+            patched.setattr("api.webhook_inbox.apply_payment_event", conflict)
+            assert process_webhook_batch() == 0
+
+        assert PaymentEvent.objects.filter(processed_at__isnull=True).count() == 2
+        assert process_webhook_batch() == 2
+
+    def test_batch_size(self, order):
+        for _ in range(3):
+            send(order)
+
+        assert process_webhook_batch(batch_size=2) == 2
+        assert process_webhook_batch(batch_size=2) == 1
+        assert process_webhook_batch(batch_size=2) == 0
+
+    def test_command(self, order):
+        send(order)
+
+        out = StringIO()
+        call_command("process_webhook_inbox", "--once", stdout=out)
+
+        assert "Processed events: 1" in out.getvalue()
+        assert Payment.objects.get().status == "paid"
+
+    def test_command_survives_batch_error(self, order, monkeypatch, caplog):
+        send(order)
+        calls = []
+
+        def flaky(batch_size):
+            calls.append(batch_size)
+            if len(calls) == 1:
+                raise OperationalError("could not obtain lock")
+            return process_webhook_batch(batch_size)
+        monkeypatch.setattr("api.management.commands.process_webhook_inbox.process_webhook_batch", flaky)
+
+        out = StringIO()
+        call_command("process_webhook_inbox", "--once", "--poll-interval", "0", stdout=out)
+
+        assert "Processed events: 1" in out.getvalue()
+        assert "Webhook inbox batch failed" in caplog.text
+
+
+@pytest.mark.django_db
+def test_cleanup_deletes_old_events(order):
+    old = PaymentEvent.objects.create(
+        transaction_id="TXN1", order_id=order.id, status="paid", payload={},
+        processed_at=timezone.now() - timedelta(days=8),
+    )
+    PaymentEvent.objects.create(transaction_id="TXN2", order_id=order.id, status="paid", payload={})
+
+    out = StringIO()
+    call_command("cleanup_stale_data", stdout=out)
+
+    assert "Deleted processed webhook events: 1" in out.getvalue()
+    assert not PaymentEvent.objects.filter(pk=old.pk).exists()
+    assert PaymentEvent.objects.count() == 1
@@ -14,6 +14,12 @@ from .views import (
     product_list_create,
     product_detail,
     product_statistics,
+    product_import,
+    product_export,
+
+    # cache
+    cache_stats,
+    retry_stats,
 
     # categories
     category_list_create,
@@ -21,6 +27,8 @@ from .views import (
 
     # cart
     cart_view,
+    cart_batch,
+    cart_summary_view,
     cart_item_detail,
 
     # wishlist
@@ -30,7 +38,9 @@ from .views import (
     # orders
     orders_view,
     orders_detail,
+    checkout_ticket_detail,
     update_order_status,
+    bulk_update_order_status,
     checkout_view,
 
     # payments
@@ -59,14 +69,22 @@ urlpatterns = [
     # ===== PRODUCTS =====
     path("products/", product_list_create, name="product-list-create"),
     path("products/statistics/", product_statistics, name="product-statistics"),
+    path("products/import/", product_import, name="product-import"),
+    path("products/export/", product_export, name="product-export"),
     path("products/<int:pk>/", product_detail, name="product-detail"),
 
+    # ===== CACHE =====
+    path("cache/stats/", cache_stats, name="cache-stats"),
+    path("retries/stats/", retry_stats, name="retry-stats"),
+
     # ===== CATEGORIES =====
     path("categories/", category_list_create, name="category-list-create"),
     path("categories/<int:pk>/", category_detail, name="category-detail"),
 
     # ===== CART =====
     path("cart/", cart_view, name="cart-view"),
+    path("cart/batch/", cart_batch, name="cart-batch"),
+    path("cart/summary/", cart_summary_view, name="cart-summary"),
     path("cart/items/<int:pk>/", cart_item_detail, name="cart-item-detail"),
 
     # ===== WISHLIST =====
@@ -76,7 +94,9 @@ urlpatterns = [
     # ===== ORDERS =====
     path("orders/", orders_view, name="order-list-create"),
     path("orders/<int:pk>/", orders_detail, name="order-detail"),
+    path("orders/tickets/<int:pk>/", checkout_ticket_detail, name="checkout-ticket-detail"),
     path("orders/<int:pk>/status/", update_order_status, name="update-order-status"),
+    path("orders/status/bulk/", bulk_update_order_status, name="bulk-update-order-status"),
     path("orders/<int:pk>/checkout/", checkout_view, name="checkout"),
 
     # ===== PAYMENTS (SPECIFIC → GENERIC) =====
@@ -2,39 +2,104 @@
 import hashlib
 import hmac
 import json
-import re
 import time
 
 from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from django.db import DatabaseError, IntegrityError, transaction
-from django.db.models import Avg, Count, F, Sum
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.views.decorators.cache import cache_page
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_datetime
 from drf_spectacular.utils import extend_schema
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from .cart import (
+    CartError,
+    add_to_cart,
+    apply_cart_batch,
+    cart_batch_max_items,
+    cart_summary,
+    remove_cart_item,
+    set_cart_item_quantity,
+)
+from .catalog_export import (
+    ACCEPTS_GZIP,
+    CONTENT_TYPES,
+    EXPORT_CSV,
+    EXPORT_FORMATS,
+    export_rows,
+    gzip_stream,
+    iter_export,
+)
+from .checkout import CheckoutError, checkout
+from .checkout_queue import checkout_async_enabled, enqueue_checkout
+from .conditional import catalog_condition
+from .facets import product_facets, wants_facets
+from .fast_serializers import serialize
+from .db_retry import get_retry_counters, retry_on_conflict
+from .filters import PRODUCT_LIST_FILTERS, ProductFilter
+from .idempotency import idempotent
 from .models import (
     Cart,
     CartItem,
+    CatalogVersion,
     Category,
+    CheckoutTicket,
     Order,
-    OrderItem,
     Payment,
     Permission,
     Product,
     Role,
     Wishlist,
 )
-from .pagination import ProductPagination
+from .order_status import (
+    BULK_FILTERS,
+    OrderStatusError,
+    bulk_transition,
+    order_status_bulk_max_ids,
+    transition_order,
+)
+from .pagination import (
+    OrderCursorPagination,
+    ProductCursorPagination,
+    ProductPagination,
+    product_list_max_rows,
+)
 from .permissions import IsAdminOrReadOnly, user_has_permission
+from .product_import import (
+    MATCH_FIELDS,
+    MATCH_ID,
+    ProductImporter,
+    format_for_content_type,
+    format_for_filename,
+    iter_rows,
+)
+from .product_stats import (
+    GLOBAL_KEY as GLOBAL_STATS_KEY,
+    average_price,
+    get_statistics,
+    stats_key,
+)
+from .search import search_products
+from .response_cache import (
+    CATEGORY_LIST_TAG,
+    PRODUCT_LIST_TAG,
+    PRODUCT_STATS_TAG,
+    bump_user_version,
+    cache_response,
+    category_tag,
+    get_cache_counters,
+    product_tag,
+)
 from .serializers import (
     CartItemSerializer,
     CartSerializer,
@@ -45,25 +110,21 @@ from .serializers import (
     RoleSerializer,
     WishlistSerializer,
 )
+from .stock_slots import set_slot_stock, with_slot_stock
+from .streaming import streaming_json_response, wants_stream
 from .throttles import CartRateThrottle, LoginRateThrottle, OrderRateThrottle
+from .webhook_inbox import (
+    PAYMENT_STATUS_FAILED,
+    PAYMENT_STATUS_PAID,
+    apply_payment_event,
+    enqueue_payment_event,
+    webhook_inbox_enabled,
+)
 
 def json_error(message, status_code=status.HTTP_400_BAD_REQUEST):
     """Return a standardized JSON error response."""
     return Response({"error": message}, status=status_code)
 
-API_CACHE_TTL = getattr(settings, "API_CACHE_TTL", 0)
-
-
-def cache_if_enabled(ttl):
-    def decorator(view_func):
-        if ttl <= 0:
-            return view_func
-        return cache_page(ttl)(view_func)
-    return decorator
-
-PAYMENT_STATUS_PENDING = "pending"
-PAYMENT_STATUS_PAID = "paid"
-PAYMENT_STATUS_FAILED = "failed"
 
 PAYMENT_STATUS_MAP = {
     "paid": PAYMENT_STATUS_PAID,
@@ -118,6 +179,92 @@ def _is_valid_payment_provider(provider):
     return provider in dict(Payment.PROVIDER_CHOICES)
 
 
+def _product_detail_category_tags(response):
+    # ProductDetailSerializer nests the category, so a rename must purge it too
+    category = response.data.get("category") if isinstance(response.data, dict) else None
+    return [category_tag(category["id"])] if category else []
+
+
+def _product_list_response(data, facets=None):
+    if facets is None:
+        return Response(data, status=status.HTTP_200_OK)
+    count, facets = facets
+    return Response({"count": count, "results": data, "facets": facets}, status=status.HTTP_200_OK)
+
+
+def _no_tags(request, *args, **kwargs):
+    return []
+
+
+def _item_product_tags(items):
+    # cart and wishlist items embed product price / stock
+    return [product_tag(item["product"]["id"]) for item in items]
+
+
+def _cart_product_tags(response):
+    return _item_product_tags(response.data.get("items", []))
+
+
+def _wishlist_product_tags(response):
+    return _item_product_tags(response.data)
+
+
+def _cart_data(user):
+    # ProductSerializer renders category as a pk, so the products are joined
+    # into the item query and category is never loaded: two queries in all.
+    items = Prefetch("items", queryset=CartItem.objects.select_related("product"))
+    try:
+        cart = Cart.objects.prefetch_related(items).get(user=user)
+    except Cart.DoesNotExist:
+        return {"id": None, "items": [], "total": 0, "user": user.id}
+    return serialize(CartSerializer, cart)
+
+
+def _ticket_payload(ticket):
+    data = {"ticket": ticket.id, "status": ticket.status}
+    if ticket.status == CheckoutTicket.DONE and ticket.order is not None:
+        data["order"] = _order_list_payload(ticket.order)
+    elif ticket.status == CheckoutTicket.FAILED:
+        data["error"] = ticket.error
+        data["error_status"] = ticket.error_status
+    return data
+
+
+ORDER_SUMMARY_QUERY_PARAM = "summary"
+ORDER_SUMMARY_FIELDS = ("id", "total", "item_count", "status", "created_at")
+
+
+def wants_order_summary(request):
+    """True when the client asked for the lean order listing (`?summary=1`)."""
+    value = request.query_params.get(ORDER_SUMMARY_QUERY_PARAM, "")
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _order_summary_payload(order):
+    return {
+        "id": order.id,
+        "total": order.total,
+        "item_count": order.item_count,
+        "status": order.status,
+        "created_at": serializers.DateTimeField().to_representation(order.created_at),
+    }
+
+
+def _order_list_payload(order):
+    return {
+        "id": order.id,
+        "total": order.total,
+        "items": [
+            {
+                "product_name": item.product_name,
+                "price": item.price,
+                "quantity": item.quantity
+            }
+            for item in order.items.all()
+        ]
+    }
+
+
 
 
 # -------------------------
@@ -136,8 +283,17 @@ def hello(request):
 # GET  /api/products/
 # POST /api/products/
 # -------------------------
-@cache_if_enabled(API_CACHE_TTL)
-@extend_schema(tags=['product'], summary='List or create products')
+@catalog_condition(CatalogVersion.PRODUCT)
+@cache_response(tags=lambda request: [PRODUCT_LIST_TAG])
+@extend_schema(
+    tags=['product'],
+    summary='List or create products',
+    description=(
+        'Filters: `search`, `category`, `min_price`, `max_price`, `in_stock`. '
+        '`?facets=1` returns `{count, results, facets}` with counts per category, '
+        'price bucket and stock state; each facet ignores its own filter.'
+    ),
+)
 @api_view(['GET', 'POST'])
 @permission_classes([IsAdminOrReadOnly])
 def product_list_create(request):
@@ -145,35 +301,85 @@ def product_list_create(request):
     if request.method == 'GET':
         products = Product.objects.select_related("category").all()
 
+        # search filter (AND of keywords). An empty search returns all products.
+        # PRODUCT_SEARCH_ENGINE selects icontains scans or the full-text index.
+        products, ranked = search_products(products, request.query_params.get('search'))
+        hits = products
+
         # category filter
         category_id = request.query_params.get('category')
         if category_id is not None and category_id != "":
+            try:
+                category_id = int(category_id)
+            except (TypeError, ValueError):
+                return json_error("category must be a valid integer", 400)
             products = products.filter(category_id=category_id)
+        else:
+            category_id = None
+
+        # min_price / max_price / in_stock (api.filters.ProductFilter)
+        product_filter = ProductFilter(
+            {key: request.query_params[key] for key in PRODUCT_LIST_FILTERS if key in request.query_params},
+            queryset=products,
+        )
+        if not product_filter.is_valid():
+            return Response(product_filter.errors, status=status.HTTP_400_BAD_REQUEST)
+        products = product_filter.qs
+
+        # Facet mode (?facets=1): counts per category, price bucket and stock
+        # state from one grouped query, returned next to the hits.
+        facets = None
+        if wants_facets(request):
+            if wants_stream(request):
+                return json_error("facets cannot be combined with stream", 400)
+            filters = product_filter.form.cleaned_data
+            facets = product_facets(
+                hits,
+                category_id=category_id,
+                min_price=filters.get('min_price'),
+                max_price=filters.get('max_price'),
+                in_stock=filters.get('in_stock'),
+            )
+
+        # Keyset pagination: ?cursor= (empty for the first page) and ?ordering=.
+        # Cursor pages follow `ordering`, not search relevance.
+        if 'cursor' in request.query_params:
+            paginator = ProductCursorPagination()
+            page = paginator.paginate_queryset(products, request)
+            response = paginator.get_paginated_response(serialize(ProductSerializer, page, many=True))
+            if facets is not None:
+                response.data["count"], response.data["facets"] = facets
+            return response
 
-        # search filter (case-insensitive contains). An empty search returns all products.
-        search = request.query_params.get('search')
-        if search is not None:
-            # Normalize whitespace and plus signs from query string
-            search = search.replace('+', ' ').strip()
-            if search != "":
-                # Support multiple keywords (AND semantics): all keywords must appear in name
-                keywords = [k for k in re.split(r"\s+", search) if k]
-                for kw in keywords:
-                    products = products.filter(name__icontains=kw)
-      
-        products = products.order_by('id')
+        if ranked:
+            products = products.order_by('-search_rank', 'id')
+        else:
+            products = products.order_by('id')
 
         # Only apply pagination when the caller explicitly requests it via query params.
         paginator = ProductPagination()
         if 'page' in request.query_params or 'page_size' in request.query_params:
             page = paginator.paginate_queryset(products, request)
             if page is not None:
-                serializer = ProductSerializer(page, many=True)
                 # Return a plain list for compatibility with tests (they expect a list)
-                return Response(serializer.data, status=status.HTTP_200_OK)
+                return _product_list_response(serialize(ProductSerializer, page, many=True), facets)
+
+        # Streamed listing (?stream=1): the full result set is written in chunks
+        # read through a server-side cursor, so it is not subject to the row cap.
+        if wants_stream(request):
+            return streaming_json_response(
+                products,
+                lambda chunk: serialize(ProductSerializer, chunk, many=True),
+            )
 
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Unpaginated listing: never pull more than PRODUCT_LIST_MAX_ROWS rows.
+        max_rows = product_list_max_rows()
+        rows = list(products[:max_rows + 1])
+        truncated = len(rows) > max_rows
+        response = _product_list_response(serialize(ProductSerializer, rows[:max_rows], many=True), facets)
+        if truncated:
+            response["X-Result-Limit"] = str(max_rows)
+        return response
 
     if request.method == 'POST':
         serializer = ProductSerializer(data=request.data)
@@ -193,7 +399,11 @@ def product_list_create(request):
 # PUT    /api/products/<id>/
 # DELETE /api/products/<id>/
 # -------------------------
-@cache_if_enabled(API_CACHE_TTL)
+@catalog_condition(CatalogVersion.PRODUCT, CatalogVersion.CATEGORY)
+@cache_response(
+    tags=lambda request, pk: [product_tag(pk)],
+    late_tags=_product_detail_category_tags,
+)
 @extend_schema(tags=['product'], summary='Retrieve, update or delete a product')
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAdminOrReadOnly])
@@ -201,20 +411,25 @@ def product_detail(request, pk):
 
     # FIND PRODUCT
     try:
-        product = Product.objects.select_related("category").get(pk=pk)
+        product = with_slot_stock(Product.objects.select_related("category")).get(pk=pk)
     except Product.DoesNotExist:
         return json_error("Product not found", status.HTTP_404_NOT_FOUND)
 
     # RETRIEVE PRODUCT
     if request.method == 'GET':
-        serializer = ProductDetailSerializer(product)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if product.slot_stock is not None:
+            # sharded: Product.stock is only refreshed by rebalancing
+            product.stock = product.slot_stock
+        return Response(serialize(ProductDetailSerializer, product), status=status.HTTP_200_OK)
 
     # UPDATE PRODUCT
     if request.method == 'PUT':
         serializer = ProductSerializer(product, data=request.data)
         if serializer.is_valid():
-            product = serializer.save()
+            with transaction.atomic():
+                product = serializer.save()
+                if product.slot_stock is not None:
+                    set_slot_stock(product.id, product.stock)
             return Response(
                 ProductSerializer(product).data,
                 status=status.HTTP_200_OK
@@ -230,7 +445,8 @@ def product_detail(request, pk):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-@cache_if_enabled(API_CACHE_TTL)
+@catalog_condition(CatalogVersion.CATEGORY)
+@cache_response(tags=lambda request: [CATEGORY_LIST_TAG])
 @api_view(['GET', 'POST'])
 @permission_classes([IsAdminOrReadOnly])
 def category_list_create(request):
@@ -253,7 +469,8 @@ def category_list_create(request):
 
 
 
-@cache_if_enabled(API_CACHE_TTL)
+@catalog_condition(CatalogVersion.CATEGORY)
+@cache_response(tags=lambda request, pk: [category_tag(pk)])
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAdminOrReadOnly])
 def category_detail(request, pk):
@@ -375,23 +592,12 @@ def register_admin(request):
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 @throttle_classes([CartRateThrottle])
+@cache_response(tags=_no_tags, late_tags=_cart_product_tags, per_user=True)
+@retry_on_conflict()
 def cart_view(request):
 
     if request.method == 'GET':
-        try:
-            cart = (
-                Cart.objects
-                .prefetch_related("items__product__category")
-                .get(user=request.user)
-            )
-        except Cart.DoesNotExist:
-            return Response({
-                "id": None,
-                "items": [],
-                "total": 0,
-                "user": request.user.id
-            }, 200)
-        return Response(CartSerializer(cart).data, 200)
+        return Response(_cart_data(request.user), 200)
 
 
     # ===================== POST =====================
@@ -408,71 +614,63 @@ def cart_view(request):
     if quantity <= 0:
         return json_error("quantity must be a positive integer", 400)
 
+    # CART_ADD_ENGINE: one INSERT ... ON CONFLICT statement (upsert) or the
+    # row-locking transaction (locking), see api.cart.
     try:
-        product = Product.objects.get(pk=product_id)
-    except Product.DoesNotExist:
-        return json_error("Product not found", 404)
+        cart_item = add_to_cart(request.user, product_id, quantity)
+    except CartError as exc:
+        return json_error(exc.message, exc.status)
+    bump_user_version(request.user.pk)
 
-    if product.stock <= 0:
-        return json_error("Not enough stock", 409)
+    return Response(serialize(CartItemSerializer, cart_item), status=201)
 
-    # 🔥 ALWAYS LOCK CART FIRST (fix deadlock!)
-    for _ in range(3):
-        try:
-            with transaction.atomic():
 
-                # Lock Cart row (prevent cart-level deadlock)
-                cart = (
-                    Cart.objects
-                    .select_for_update()
-                    .filter(user=request.user)
-                    .first()
-                )
-                if not cart:
-                    cart = Cart.objects.create(user=request.user)
-
-                # Lock CartItem (ordered → no deadlock)
-                cart_item = (
-                    CartItem.objects
-                    .select_for_update()
-                    .filter(cart=cart, product=product)
-                    .order_by("id")
-                    .first()
-                )
-
-                if cart_item:
-                    CartItem.objects.filter(id=cart_item.id).update(
-                        quantity=F('quantity') + quantity
-                    )
-                    cart_item.refresh_from_db()
-                else:
-                    cart_item = CartItem.objects.create(
-                        cart=cart,
-                        product=product,
-                        quantity=quantity
-                    )
-
-                Cart.objects.filter(id=cart.id).update(updated_at=timezone.now())
-
-                return Response(
-                    CartItemSerializer(cart_item).data,
-                    status=201
-                )
 
-        except IntegrityError:
-            continue
-        except DatabaseError:
-            return json_error("Database conflict, please retry", 409)
 
-    return json_error("Concurrency conflict, please retry", 409)
+@extend_schema(
+    tags=['cart'],
+    summary='Apply several cart changes at once',
+    description=(
+        'Body: `{"items": [{"product_id", "quantity", "op"}], "atomic": false}` with `op` one of '
+        '`add` (default), `set` or `remove`. Entries are applied in order in one transaction. '
+        'Failing entries are reported in `errors` and skipped; with `"atomic": true` any error '
+        'rejects the whole batch.'
+    ),
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([CartRateThrottle])
+@retry_on_conflict()
+def cart_batch(request):
+    entries = request.data.get('items') if isinstance(request.data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        return json_error("items must be a non-empty list", 400)
+
+    max_items = cart_batch_max_items()
+    if len(entries) > max_items:
+        return json_error(f"at most {max_items} items per batch", 400)
+
+    atomic = request.data.get('atomic', False)
+    if not isinstance(atomic, bool):
+        return json_error("atomic must be a boolean", 400)
 
+    try:
+        errors = apply_cart_batch(request.user, entries, atomic=atomic)
+    except CartError as exc:
+        return json_error(exc.message, exc.status)
+    bump_user_version(request.user.pk)
+
+    if atomic and errors:
+        return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
 
+    return Response({"cart": _cart_data(request.user), "errors": errors}, status=status.HTTP_200_OK)
 
 
 @extend_schema(tags=['cart'], summary='Update or delete cart item')
 @api_view(['PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
 @throttle_classes([CartRateThrottle])
+@retry_on_conflict()
 def cart_item_detail(request, pk):
     try:
         item = (
@@ -492,23 +690,16 @@ def cart_item_detail(request, pk):
         if quantity <= 0:
             return json_error("quantity must be a positive integer", 400)
 
-        try:
-            item.quantity = quantity
-            item.save()
-            Cart.objects.filter(id=item.cart_id).update(updated_at=timezone.now())
-        except DatabaseError:
-            return json_error("Database conflict, please retry", 409)
+        set_cart_item_quantity(item, quantity)
+        bump_user_version(request.user.pk)
         return Response(
             CartItemSerializer(item).data,
             status=status.HTTP_200_OK
         )
 
     if request.method == 'DELETE':
-        try:
-            item.delete()
-            Cart.objects.filter(id=item.cart_id).update(updated_at=timezone.now())
-        except DatabaseError:
-            return json_error("Database conflict, please retry", 409)
+        remove_cart_item(item)
+        bump_user_version(request.user.pk)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 @extend_schema(tags=['cart'], summary='Get cart (alias)')
@@ -516,27 +707,28 @@ def cart_item_detail(request, pk):
 @permission_classes([IsAuthenticated])
 @throttle_classes([CartRateThrottle])
 def cart_get(request):
-    try:
-        cart = (
-            Cart.objects
-            .prefetch_related("items__product__category")
-            .get(user=request.user)
-        )
-    except Cart.DoesNotExist:
-        return Response({
-            "id": None,
-            "items": [],
-            "total": 0,
-            "user": request.user.id
-        }, status=status.HTTP_200_OK)
+    return Response(_cart_data(request.user), status=status.HTTP_200_OK)
+
 
-    serializer = CartSerializer(cart)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+@extend_schema(
+    tags=['cart'],
+    summary='Cart item count and total',
+    description=(
+        '`item_count` (sum of quantities), `product_count` (distinct products) and `total`, '
+        'computed by one aggregate query. Meant for header badges that poll the cart.'
+    ),
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([CartRateThrottle])
+def cart_summary_view(request):
+    return Response(cart_summary(request.user), status=status.HTTP_200_OK)
 
 
 @extend_schema(tags=['wishlist'], summary='List or add wishlist items')
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@cache_response(tags=_no_tags, late_tags=_wishlist_product_tags, per_user=True)
 def wishlist_list_create(request):
 
     if request.method == 'GET':
@@ -546,8 +738,7 @@ def wishlist_list_create(request):
             .select_related("product__category")
             .order_by("id")
         )
-        serializer = WishlistSerializer(items, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serialize(WishlistSerializer, items, many=True), status=status.HTTP_200_OK)
 
     serializer = WishlistSerializer(data=request.data)
     if serializer.is_valid():
@@ -563,6 +754,7 @@ def wishlist_list_create(request):
             return json_error("Product already in wishlist", status.HTTP_400_BAD_REQUEST)
         except DatabaseError:
             return json_error("Database conflict, please retry", 409)
+        bump_user_version(request.user.pk)
         return Response(
             WishlistSerializer(wishlist).data,
             status=status.HTTP_201_CREATED
@@ -586,137 +778,107 @@ def wishlist_item_delete(request, product_id):
         wishlist.delete()
     except DatabaseError:
         return json_error("Database conflict, please retry", 409)
+    bump_user_version(request.user.pk)
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 @extend_schema(
     tags=['order'],
     summary='List orders or checkout (create order)',
-    description='GET: list user orders. POST: checkout cart → create order, decrease stock, clear cart.'
+    description=(
+        'GET: list user orders, newest first. `?cursor=` (empty for the first page) returns keyset '
+        'pages of `page_size`; `?summary=1` returns the stored `item_count` and `total` instead '
+        'of the items. POST: checkout cart → create order, decrease stock, clear cart; '
+        'with an `Idempotency-Key` header, retries return the first response.'
+    ),
 )
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 @throttle_classes([OrderRateThrottle])
+@cache_response(tags=_no_tags, per_user=True)
+@idempotent("orders")
+@retry_on_conflict("Checkout conflict, please retry")
 def orders_view(request):
 
     # ===== GET: LIST ORDERS =====
     if request.method == "GET":
-        orders = (
-            Order.objects
-            .filter(user=request.user)
-            .prefetch_related("items")
-            .order_by("-id")
-        )
-        data = [
-            {
-                "id": order.id,
-                "total": order.total,
-                "items": [
-                    {
-                        "product_name": item.product_name,
-                        "price": item.price,
-                        "quantity": item.quantity
-                    }
-                    for item in order.items.all()
-                ]
-            }
-            for order in orders
-        ]
+        orders = Order.objects.filter(user=request.user).order_by("-id")
+        if wants_order_summary(request):
+            # stored counts: no OrderItem rows are read
+            orders = orders.only(*ORDER_SUMMARY_FIELDS)
+            payload = _order_summary_payload
+        else:
+            orders = orders.prefetch_related("items")
+            payload = _order_list_payload
+
+        # Keyset pagination, newest first: ?cursor= (empty for the first page).
+        if "cursor" in request.query_params:
+            paginator = OrderCursorPagination()
+            page = paginator.paginate_queryset(orders, request)
+            return paginator.get_paginated_response([payload(order) for order in page])
+
+        if wants_stream(request):
+            return streaming_json_response(
+                orders,
+                lambda chunk: [payload(order) for order in chunk],
+            )
+        data = [payload(order) for order in orders]
         return Response(data, 200)
 
 
     # ===== POST: CHECKOUT =====
-    try:
-        with transaction.atomic():
-            # 1️⃣ LOCK CART + CARTITEMS THEO THỨ TỰ ỔN ĐỊNH
-            cart = (
-                Cart.objects
-                .select_for_update()
-                .filter(user=request.user)
-                .first()
-            )
-            if not cart:
-                return json_error("Cart is empty", 400)
-
-            cart_items = (
-                CartItem.objects
-                .select_for_update()
-                .filter(cart=cart)
-                .order_by("id")            # 🔥 FIX DEADLOCK
-            )
-
-            if not cart_items.exists():
-                return json_error("Cart is empty", 400)
-
-            product_ids = list(cart_items.values_list("product_id", flat=True))
-            products = (
-                Product.objects
-                .select_for_update()
-                .filter(id__in=product_ids)
-                .order_by("id")
-            )
-            product_map = {product.id: product for product in products}
-            if len(product_map) != len(product_ids):
-                return json_error("Product not found", 404)
-
-            # 2️⃣ CREATE ORDER
-            total = 0
-            order = Order.objects.create(user=request.user, total=0)
-
-            # 3️⃣ PROCESS ITEMS
-            order_items = []
-            for item in cart_items:
-                product = product_map[item.product_id]
-
-                if product.stock < item.quantity:
-                    raise IntegrityError("Not enough stock")
-
-                Product.objects.filter(id=product.id).update(
-                    stock=F('stock') - item.quantity
-                )
-
-                order_items.append(
-                    OrderItem(
-                        order=order,
-                        product_name=product.name,
-                        price=product.price,
-                        quantity=item.quantity,
-                    )
-                )
-
-                total += product.price * item.quantity
-
-            if order_items:
-                OrderItem.objects.bulk_create(order_items)
-
-            order.total = total
-            order.save()
-
-            # CLEAR CART
-            cart_items.delete()
-            Cart.objects.filter(id=cart.id).update(updated_at=timezone.now())
-
-    except IntegrityError:
-        return json_error("Checkout failed (concurrency/stock)", 400)
-    except DatabaseError:
-        return json_error("Checkout conflict, please retry", 409)
+    if checkout_async_enabled():
+        # queued for the worker, see api.checkout_queue
+        try:
+            ticket, _ = enqueue_checkout(request.user)
+        except CheckoutError as exc:
+            return json_error(exc.message, exc.status)
+        return Response(_ticket_payload(ticket), status=status.HTTP_202_ACCEPTED)
 
-    # RESPONSE
-    order_items = [
-        {
-            "product_name": oi.product_name,
-            "price": oi.price,
-            "quantity": oi.quantity
-        }
-        for oi in order.items.all()
-    ]
+    # One conditional set-based stock decrement, see api.checkout; conflicts
+    # are re-run by retry_on_conflict.
+    try:
+        order, order_items = checkout(request.user)
+    except CheckoutError as exc:
+        return json_error(exc.message, exc.status)
 
     return Response(
-        {"id": order.id, "total": order.total, "items": order_items},
+        {
+            "id": order.id,
+            "total": order.total,
+            "items": [
+                {"product_name": oi.product_name, "price": oi.price, "quantity": oi.quantity}
+                for oi in order_items
+            ],
+        },
         201
     )
 
 
 
+@extend_schema(
+    tags=['order'],
+    summary='Queued checkout status',
+    description=(
+        'Status of a ticket returned by POST /api/orders/ in async mode: `pending`, `done` '
+        'with the order, or `failed` with the error and status the synchronous checkout '
+        'would have returned.'
+    ),
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def checkout_ticket_detail(request, pk):
+    try:
+        ticket = (
+            CheckoutTicket.objects
+            .select_related("order")
+            .prefetch_related("order__items")
+            .get(pk=pk, user=request.user)
+        )
+    except CheckoutTicket.DoesNotExist:
+        return json_error("Ticket not found", status.HTTP_404_NOT_FOUND)
+    return Response(_ticket_payload(ticket), status=status.HTTP_200_OK)
+
+
 @extend_schema(tags=['order'], summary='Retrieve order details')
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -754,49 +916,93 @@ def checkout_view(request, pk):
     )
 
 
-@extend_schema(tags=['order'], summary='Update order status', description='Admin or authorized users may transition order status along allowed flow. Request body: {"status": "next_status"}.')
+@extend_schema(tags=['order'], summary='Update order status', description='Admin or authorized users may transition order status along allowed flow. Request body: {"status": "next_status"}. Applied as one conditional update: a concurrent change of the same order makes it fail as an invalid transition.')
 @api_view(["PATCH"])
 @permission_classes([IsAuthenticated])
 def update_order_status(request, pk):
-    try:
-        order = Order.objects.get(pk=pk)
-    except Order.DoesNotExist:
-        return json_error("Order not found", status.HTTP_404_NOT_FOUND)
-
     # chỉ admin or role with permission
     if not (request.user.is_staff or user_has_permission(request.user, 'update_order_status')):
         return json_error("You do not have permission to perform this action.", status.HTTP_403_FORBIDDEN)
 
     new_status = request.data.get("status")
+    try:
+        transition_order(pk, new_status)
+    except OrderStatusError as exc:
+        return json_error(exc.message, exc.status)
 
-    # use string statuses so we don't depend on model constants
-    STATUS_PENDING = "pending"
-    STATUS_PAID = "paid"
-    STATUS_SHIPPED = "shipped"
-    STATUS_COMPLETED = "completed"
+    return Response({"id": pk, "status": new_status}, status=status.HTTP_200_OK)
 
-    valid_flow = {
-        STATUS_PENDING: STATUS_PAID,
-        STATUS_PAID: STATUS_SHIPPED,
-        STATUS_SHIPPED: STATUS_COMPLETED,
-    }
 
-    current_status = getattr(order, "status", STATUS_PENDING)
+def _parse_bulk_filter(data):
+    filters = {}
+    for name in BULK_FILTERS:
+        value = data.get(name)
+        if value is None:
+            continue
+        if name == "user_id":
+            try:
+                filters[name] = int(value)
+            except (TypeError, ValueError):
+                raise OrderStatusError("user_id must be a valid integer", 400)
+            continue
+        parsed = parse_datetime(str(value))
+        if parsed is None:
+            raise OrderStatusError(f"{name} must be an ISO 8601 datetime", 400)
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        filters[name] = parsed
+    # an empty filter would move every order in the previous status
+    if not filters and data.get("all") is not True:
+        raise OrderStatusError(
+            f"filter needs at least one of: {', '.join(BULK_FILTERS)} (or \"all\": true)", 400
+        )
+    return filters
 
-    if current_status not in valid_flow:
-        return json_error("Order already completed", status.HTTP_400_BAD_REQUEST)
 
-    if new_status != valid_flow[current_status]:
-        return json_error("Invalid status transition", status.HTTP_400_BAD_REQUEST)
+@extend_schema(
+    tags=['order'],
+    summary='Bulk update order status',
+    description=(
+        'Admin or authorized users. Body: `{"status": "shipped", "ids": [...]}` or '
+        '`{"status": "shipped", "filter": {"user_id", "created_after", "created_before"}}`; '
+        'an unrestricted filter must say `{"all": true}`. Orders in the status before the target are moved in one conditional update; '
+        '`skipped` lists the ids that were missing or in another status.'
+    ),
+)
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def bulk_update_order_status(request):
+    if not (request.user.is_staff or user_has_permission(request.user, 'update_order_status')):
+        return json_error("You do not have permission to perform this action.", status.HTTP_403_FORBIDDEN)
 
-    # update if model supports it, otherwise return new status in response
-    if hasattr(order, "status"):
-        order.status = new_status
-        order.save()
+    new_status = request.data.get("status")
+    ids = request.data.get("ids")
+    filter_data = request.data.get("filter")
+    if (ids is None) == (filter_data is None):
+        return json_error("Provide either ids or filter", 400)
 
-    response_status = getattr(order, "status", new_status)
+    try:
+        if ids is not None:
+            if not isinstance(ids, list) or not ids:
+                return json_error("ids must be a non-empty list", 400)
+            if len(ids) > order_status_bulk_max_ids():
+                return json_error(f"At most {order_status_bulk_max_ids()} ids per request", 400)
+            try:
+                ids = [int(order_id) for order_id in ids]
+            except (TypeError, ValueError):
+                return json_error("ids must be integers", 400)
+            updated, skipped = bulk_transition(new_status, ids=ids)
+        else:
+            if not isinstance(filter_data, dict):
+                return json_error("filter must be an object", 400)
+            updated, skipped = bulk_transition(new_status, filters=_parse_bulk_filter(filter_data))
+    except OrderStatusError as exc:
+        return json_error(exc.message, exc.status)
 
-    return Response({"id": order.id, "status": response_status}, status=status.HTTP_200_OK)
+    return Response(
+        {"status": new_status, "updated": updated, "skipped": skipped},
+        status=status.HTTP_200_OK,
+    )
 
 
 # -------------------------
@@ -887,31 +1093,128 @@ def role_assign_user(request, role_pk, user_pk):
     return Response({'message': 'unassigned'}, status=status.HTTP_200_OK)
 
 
-@cache_if_enabled(API_CACHE_TTL)
+@cache_response(tags=lambda request: [PRODUCT_STATS_TAG])
 @api_view(['GET'])
 def product_statistics(request):
-    stats = Product.objects.aggregate(
-        total_products=Count('id'),
-        total_value=Sum('price'),
-        average_price=Avg('price')
-    )
+    # Counters are maintained incrementally (api.signals), so this is one
+    # indexed lookup instead of an aggregate over the whole product table.
+    category_id = request.query_params.get('category')
+    key = GLOBAL_STATS_KEY
+    if category_id is not None and category_id != "":
+        try:
+            key = stats_key(int(category_id))
+        except (TypeError, ValueError):
+            return json_error("category must be a valid integer", 400)
 
-    total_products = stats.get('total_products') or 0
-    total_value = stats.get('total_value') or 0
-    # ensure integer average for tests
-    avg = stats.get('average_price')
-    average_price = int(avg) if avg is not None else 0
+    stats = get_statistics(key)
 
-    return Response({
-        "total_products": total_products,
-        "total_value": total_value,
-        "average_price": average_price
-    }, status=status.HTTP_200_OK)
+    data = {
+        "total_products": stats["product_count"],
+        "total_value": stats["price_sum"],
+        # ensure integer average for tests
+        "average_price": average_price(stats),
+        "total_stock": stats["stock_sum"],
+        "stock_value": stats["stock_value"],
+    }
+    if key != GLOBAL_STATS_KEY:
+        data["category"] = int(category_id)
+    return Response(data, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=['product'],
+    summary='Stream the whole catalog as CSV or NDJSON',
+    description=(
+        'Admin only. Every product with its category name, ordered by id and streamed '
+        'through a server-side cursor. `?output=csv` (default) or `ndjson`; `?after=<id>` resumes '
+        'after the last id received (CSV continuations have no header row). '
+        'Compressed with gzip when the client sends Accept-Encoding: gzip.'
+    ),
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def product_export(request):
+    fmt = request.query_params.get('output', EXPORT_CSV)
+    if fmt not in EXPORT_FORMATS:
+        return json_error(f"output must be one of: {', '.join(EXPORT_FORMATS)}", 400)
 
+    after = request.query_params.get('after')
+    if after not in (None, ''):
+        try:
+            after = int(after)
+        except (TypeError, ValueError):
+            return json_error("after must be a valid integer", 400)
+    else:
+        after = None
+
+    chunks = iter_export(export_rows(after=after), fmt, header=after is None)
+    compress = ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')) is not None
+    if compress:
+        chunks = gzip_stream(chunks)
+
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="products.{fmt}"'
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+@extend_schema(
+    tags=['product'],
+    summary='Bulk import / upsert products',
+    description=(
+        'Admin only. Send CSV (Content-Type: text/csv) or NDJSON (application/x-ndjson) '
+        'as the request body, or as a multipart `file` named *.csv / *.ndjson. '
+        'Columns: id, name, price, stock, category. `?match=id` (default) updates rows '
+        'that carry an id and creates the rest; `?match=name` upserts by product name. '
+        'Invalid rows are reported per row and skipped.'
+    ),
+)
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def product_import(request):
+    match = request.query_params.get('match', MATCH_ID)
+    if match not in MATCH_FIELDS:
+        return json_error(f"match must be one of: {', '.join(MATCH_FIELDS)}", 400)
+
+    if request.content_type.startswith('multipart/form-data'):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return json_error("file is required", 400)
+        fmt = format_for_filename(upload.name)
+        stream = upload
+    else:
+        fmt = format_for_content_type(request.content_type)
+        stream = request.stream
 
-@extend_schema(tags=['payment'], summary='Create payment for an order', description='Authenticated users call this to create a payment for their order; returns a `payment_url` and `transaction_id`. Provider must be one of the supported choices.')
+    if fmt is None:
+        return json_error("Send text/csv or application/x-ndjson", status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+    if stream is None:
+        return json_error("Request body is empty", 400)
+
+    result = ProductImporter(match=match).run(iter_rows(stream, fmt))
+    return Response(result.as_dict(), status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=['cache'], summary='Response cache counters', description='Admin only. Hit / miss / coalesced / stale counts per cached endpoint.')
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    return Response(get_cache_counters(), status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=['cache'], summary='Database conflict retry counters', description='Admin only. Per endpoint: transactions re-run after a deadlock / serialization / lock timeout error (`retried`), requests that then succeeded (`recovered`) and requests answered 409 after the last retry (`exhausted`).')
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def retry_stats(request):
+    return Response(get_retry_counters(), status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=['payment'], summary='Create payment for an order', description='Authenticated users call this to create a payment for their order; returns a `payment_url` and `transaction_id`. Provider must be one of the supported choices. An `Idempotency-Key` header makes retries return the first response.')
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@idempotent("payments")
 def create_payment(request):
     order_id = request.data.get("order_id")
     provider = request.data.get("provider")
@@ -949,7 +1252,7 @@ def create_payment(request):
     )
 
 
-@extend_schema(tags=['payment'], summary='Payment provider webhook', description='Called by external payment providers. Requires `X-Webhook-Timestamp` and `X-Webhook-Signature` (HMAC SHA256). Expects `transaction_id` (starts with "TXN"), `status`, and `order_id`. Idempotent. Side effects: creates/updates `Payment` and marks `Order` as paid/failed.')
+@extend_schema(tags=['payment'], summary='Payment provider webhook', description='Called by external payment providers. Requires `X-Webhook-Timestamp` and `X-Webhook-Signature` (HMAC SHA256). Expects `transaction_id` (starts with "TXN"), `status`, and `order_id`. Idempotent. Side effects: creates/updates `Payment` and marks `Order` as paid/failed. With PAYMENT_WEBHOOK_INBOX the verified call is stored and answered 202; a worker applies it.')
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def payment_webhook(request):
@@ -981,60 +1284,14 @@ def payment_webhook(request):
     if provider and not _is_valid_payment_provider(provider):
         return json_error("Invalid payment provider", 400)
 
-    # perform DB updates in a transaction
-    with transaction.atomic():
-        # find or create payment for this transaction
-        payment = Payment.objects.filter(transaction_id=transaction_id).first()
-
-        if payment is None:
-            # try to find order
-            order = Order.objects.filter(id=order_id).first()
-            if order is None:
-                return json_error("Order not found", 400)
-
-            # try to reuse an existing pending payment for the order (tests expect this)
-            existing = Payment.objects.filter(order=order, status=PAYMENT_STATUS_PENDING).first()
-            if existing is not None:
-                payment = existing
-                # attach transaction id to the existing payment
-                payment.transaction_id = transaction_id
-                update_fields = ["transaction_id"]
-                if provider:
-                    payment.provider = provider
-                    update_fields.append("provider")
-                payment.save(update_fields=update_fields)
-            else:
-                if not provider:
-                    return json_error("provider is required", 400)
-                payment = Payment.objects.create(
-                    order=order,
-                    provider=provider,
-                    amount=order.total,
-                    transaction_id=transaction_id,
-                    status=PAYMENT_STATUS_PENDING,
-                )
-
-        # idempotency: if already paid, return OK
-        if payment.status == PAYMENT_STATUS_PAID and normalized_status == PAYMENT_STATUS_PAID:
-            return Response({"message": "Already processed"}, status=200)
-        if payment.status == PAYMENT_STATUS_FAILED and normalized_status == PAYMENT_STATUS_FAILED:
-            return Response({"message": "Already processed"}, status=200)
-        if payment.status == PAYMENT_STATUS_PAID and normalized_status != PAYMENT_STATUS_PAID:
-            return json_error("Payment already paid", 409)
-        if payment.status == PAYMENT_STATUS_FAILED and normalized_status != PAYMENT_STATUS_FAILED:
-            return json_error("Payment already failed", 409)
-
-        if normalized_status == PAYMENT_STATUS_PAID:
-            payment.status = PAYMENT_STATUS_PAID
-            payment.save(update_fields=["status"])
-
-            payment.order.status = PAYMENT_STATUS_PAID
-            payment.order.save(update_fields=["status"])
-        else:
-            payment.status = PAYMENT_STATUS_FAILED
-            payment.save(update_fields=["status"])
+    if webhook_inbox_enabled():
+        # applied by the inbox worker, see api.webhook_inbox
+        payload = request.data.dict() if hasattr(request.data, "dict") else request.data
+        event = enqueue_payment_event(transaction_id, order_id, normalized_status, provider, payload)
+        return Response({"message": "Webhook accepted", "event": event.id}, status=202)
 
-    return Response({"message": "Webhook processed"}, status=200)
+    body, status_code = apply_payment_event(transaction_id, order_id, normalized_status, provider)
+    return Response(body, status=status_code)
 
 
 class ProductViewSet(ModelViewSet):
@@ -0,0 +1,187 @@
+"""
+Payment webhook processing and the webhook inbox (PAYMENT_WEBHOOK_INBOX).
+
+`apply_payment_event` is what POST /api/payments/webhook/ has always done
+once the call is verified: find or attach the Payment of the transaction,
+apply the idempotency rules (a repeated status is "Already processed", a
+contradicting one 409) and mark the payment and order. It returns the
+response body and status.
+
+In inbox mode the endpoint only verifies and validates the call, appends it
+to the PaymentEvent inbox and answers 202, so provider retry storms cost one
+insert each. `process_webhook_batch` (run by `manage.py
+process_webhook_inbox`, any number of processes or threads) claims up to
+PAYMENT_WEBHOOK_INBOX_BATCH events with `FOR UPDATE SKIP LOCKED` and applies
+them in id order in one transaction:
+
+* each event runs `apply_payment_event` in a savepoint and stores the
+  response the synchronous webhook would have returned;
+* a repeat of the previous event of the same transaction_id in the batch is
+  answered from that event's outcome, without touching the database;
+* an event failing with a database error is left in the inbox, with the
+  later events of its transaction_id, for the next batch.
+"""
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .models import Order, Payment, PaymentEvent
+from .response_cache import bump_user_version
+
+PAYMENT_STATUS_PENDING = "pending"
+PAYMENT_STATUS_PAID = "paid"
+PAYMENT_STATUS_FAILED = "failed"
+
+ALREADY_PROCESSED = {"message": "Already processed"}
+
+
+def webhook_inbox_enabled():
+    return getattr(settings, "PAYMENT_WEBHOOK_INBOX", False)
+
+
+def webhook_inbox_batch_size():
+    return getattr(settings, "PAYMENT_WEBHOOK_INBOX_BATCH", 100)
+
+
+def apply_payment_event(transaction_id, order_id, status, provider=None):
+    """
+    Apply a verified webhook event with a normalized `status` (paid /
+    failed). Returns the response as `(body, status_code)`.
+    """
+    with transaction.atomic():
+        # find or create payment for this transaction
+        payment = (
+            Payment.objects
+            .select_for_update()
+            .select_related("order")
+            .filter(transaction_id=transaction_id)
+            .first()
+        )
+
+        if payment is None:
+            # try to find order
+            order = Order.objects.filter(id=order_id).first()
+            if order is None:
+                return {"error": "Order not found"}, 400
+
+            # try to reuse an existing pending payment for the order (tests expect this)
+            existing = (
+                Payment.objects
+                .select_for_update()
+                .filter(order=order, status=PAYMENT_STATUS_PENDING)
+                .first()
+            )
+            if existing is not None:
+                payment = existing
+                # attach transaction id to the existing payment
+                payment.transaction_id = transaction_id
+                update_fields = ["transaction_id"]
+                if provider:
+                    payment.provider = provider
+                    update_fields.append("provider")
+                payment.save(update_fields=update_fields)
+            else:
+                if not provider:
+                    return {"error": "provider is required"}, 400
+                payment = Payment.objects.create(
+                    order=order,
+                    provider=provider,
+                    amount=order.total,
+                    transaction_id=transaction_id,
+                    status=PAYMENT_STATUS_PENDING,
+                )
+
+        # idempotency: if already paid, return OK
+        if payment.status == PAYMENT_STATUS_PAID and status == PAYMENT_STATUS_PAID:
+            return ALREADY_PROCESSED, 200
+        if payment.status == PAYMENT_STATUS_FAILED and status == PAYMENT_STATUS_FAILED:
+            return ALREADY_PROCESSED, 200
+        if payment.status == PAYMENT_STATUS_PAID and status != PAYMENT_STATUS_PAID:
+            return {"error": "Payment already paid"}, 409
+        if payment.status == PAYMENT_STATUS_FAILED and status != PAYMENT_STATUS_FAILED:
+            return {"error": "Payment already failed"}, 409
+
+        if status == PAYMENT_STATUS_PAID:
+            payment.status = PAYMENT_STATUS_PAID
+            payment.save(update_fields=["status"])
+
+            payment.order.status = PAYMENT_STATUS_PAID
+            payment.order.save(update_fields=["status"])
+            # order reads (?summary=1 included) are cached per user
+            bump_user_version(payment.order.user_id)
+        else:
+            payment.status = PAYMENT_STATUS_FAILED
+            payment.save(update_fields=["status"])
+
+    return {"message": "Webhook processed"}, 200
+
+
+def enqueue_payment_event(transaction_id, order_id, status, provider, payload):
+    """Append a verified webhook call to the inbox."""
+    return PaymentEvent.objects.create(
+        transaction_id=transaction_id,
+        order_id=order_id,
+        status=status,
+        provider=provider or "",
+        payload=payload,
+    )
+
+
+def _repeat_outcome(outcome, outcome_status):
+    # what applying the same event again returns: nothing changed in between
+    if outcome_status == 200:
+        return ALREADY_PROCESSED, 200
+    return outcome, outcome_status
+
+
+def process_webhook_batch(batch_size=None):
+    """Apply one batch of inbox events. Returns the number processed."""
+    batch_size = batch_size or webhook_inbox_batch_size()
+    with transaction.atomic():
+        events = list(
+            PaymentEvent.objects
+            .select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .order_by("id")[:batch_size]
+        )
+        if not events:
+            return 0
+
+        now = timezone.now()
+        # transaction_id -> (event fields, outcome, outcome status)
+        previous = {}
+        blocked = set()
+        processed = []
+        for event in events:
+            if event.transaction_id in blocked:
+                continue
+            fields = (event.order_id, event.status, event.provider)
+            last = previous.get(event.transaction_id)
+            if last is not None and last[0] == fields:
+                outcome, outcome_status = _repeat_outcome(last[1], last[2])
+            else:
+                try:
+                    outcome, outcome_status = apply_payment_event(
+                        event.transaction_id,
+                        event.order_id,
+                        event.status,
+                        event.provider,
+                    )
+                except DatabaseError:
+                    # retried by a later batch, still before its successors
+                    blocked.add(event.transaction_id)
+                    continue
+            previous[event.transaction_id] = (fields, outcome, outcome_status)
+            event.outcome = outcome
+            event.outcome_status = outcome_status
+            event.processed_at = now
+            processed.append(event)
+
+        PaymentEvent.objects.bulk_update(processed, ["outcome", "outcome_status", "processed_at"])
+    return len(processed)
+
+
+def delete_processed_events(before):
+    """Drop events processed before `before`. Returns the number deleted."""
+    deleted, _ = PaymentEvent.objects.filter(processed_at__lt=before).delete()
+    return deleted
@@ -159,6 +159,83 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 API_CACHE_TTL = env_int("API_CACHE_TTL", 0)
+# Stampede protection for cached responses (api.response_cache):
+# expired entries stay servable this long while one request refreshes them,
+API_CACHE_STALE_TTL = env_int("API_CACHE_STALE_TTL", 30)
+# a refresh lock expires after this many seconds,
+API_CACHE_LOCK_TIMEOUT = env_int("API_CACHE_LOCK_TIMEOUT", 10)
+# requests with nothing valid to serve wait this long for the refresh,
+API_CACHE_COALESCE_TIMEOUT_MS = env_int("API_CACHE_COALESCE_TIMEOUT_MS", 2000)
+# and entries are refreshed early with probability scaled by this (0 = off).
+API_CACHE_EARLY_REFRESH_BETA = float(os.getenv("API_CACHE_EARLY_REFRESH_BETA", "1.0"))
+
+# Product search engine for GET /api/products/?search=
+# "icontains" (ILIKE scan per keyword) or "fulltext" (GIN-indexed, ranked).
+PRODUCT_SEARCH_ENGINE = os.getenv("PRODUCT_SEARCH_ENGINE", "icontains")
+
+# Upper bound for GET /api/products/ without page/page_size/cursor params.
+PRODUCT_LIST_MAX_ROWS = env_int("PRODUCT_LIST_MAX_ROWS", 1000)
+
+# Price bucket lower bounds for GET /api/products/?facets=1 (api.facets).
+PRODUCT_FACET_PRICE_BUCKETS = [
+    int(bound) for bound in env_list("PRODUCT_FACET_PRICE_BUCKETS", "1000000,5000000,10000000,20000000,50000000")
+]
+
+# Rows fetched per server-side cursor round trip for ?stream=1 listings.
+STREAM_CHUNK_SIZE = env_int("STREAM_CHUNK_SIZE", 500)
+
+# Rows validated and written per transaction by the bulk product import.
+PRODUCT_IMPORT_BATCH_SIZE = env_int("PRODUCT_IMPORT_BATCH_SIZE", 1000)
+
+# Add-to-cart engine for POST /api/cart/ (api.cart): "upsert" (one
+# INSERT ... ON CONFLICT statement) or "locking" (SELECT ... FOR UPDATE).
+CART_ADD_ENGINE = os.getenv("CART_ADD_ENGINE", "upsert")
+
+# Upper bound on entries per POST /api/cart/batch/ request.
+CART_BATCH_MAX_ITEMS = env_int("CART_BATCH_MAX_ITEMS", 100)
+
+# Stock reservations (api.reservations): add-to-cart takes the quantity out
+# of stock into a hold that expires STOCK_RESERVATION_TTL seconds after the
+# last add; `manage.py release_expired_reservations` gives expired holds back
+# STOCK_RESERVATION_SWEEP_BATCH at a time.
+STOCK_RESERVATIONS = env_bool("STOCK_RESERVATIONS", "False")
+STOCK_RESERVATION_TTL = env_int("STOCK_RESERVATION_TTL", 900)
+STOCK_RESERVATION_SWEEP_BATCH = env_int("STOCK_RESERVATION_SWEEP_BATCH", 1000)
+
+# Slots a hot product's stock is split into by `manage.py shard_stock`
+# (api.stock_slots); `manage.py rebalance_stock_slots` evens them out.
+STOCK_SLOT_COUNT = env_int("STOCK_SLOT_COUNT", 8)
+
+# Asynchronous checkout (api.checkout_queue): POST /api/orders/ answers 202
+# with a ticket and `manage.py process_checkout_queue` creates the orders,
+# CHECKOUT_QUEUE_BATCH tickets per transaction.
+CHECKOUT_ASYNC = env_bool("CHECKOUT_ASYNC", "False")
+CHECKOUT_QUEUE_BATCH = env_int("CHECKOUT_QUEUE_BATCH", 50)
+
+# Payment webhook inbox (api.webhook_inbox): POST /api/payments/webhook/
+# stores the verified call and answers 202, and `manage.py
+# process_webhook_inbox` applies PAYMENT_WEBHOOK_INBOX_BATCH events per
+# transaction.
+PAYMENT_WEBHOOK_INBOX = env_bool("PAYMENT_WEBHOOK_INBOX", "False")
+PAYMENT_WEBHOOK_INBOX_BATCH = env_int("PAYMENT_WEBHOOK_INBOX_BATCH", 100)
+
+# Seconds a POST response stored under an Idempotency-Key is replayed for
+# (api.idempotency); expired keys are deleted by cleanup_stale_data.
+IDEMPOTENCY_KEY_TTL = env_int("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60)
+
+# Upper bound on order ids per POST /api/orders/status/bulk/ request.
+ORDER_STATUS_BULK_MAX_IDS = env_int("ORDER_STATUS_BULK_MAX_IDS", 10000)
+
+# Deadlocked / serialization-failed / lock-timed-out transactions of the
+# checkout and cart endpoints are re-run in the request (api.db_retry): up
+# to DB_RETRY_ATTEMPTS times, after a random sleep below
+# DB_RETRY_BACKOFF_MS * 2**n, capped at DB_RETRY_MAX_BACKOFF_MS.
+DB_RETRY_ATTEMPTS = env_int("DB_RETRY_ATTEMPTS", 3)
+DB_RETRY_BACKOFF_MS = env_int("DB_RETRY_BACKOFF_MS", 10)
+DB_RETRY_MAX_BACKOFF_MS = env_int("DB_RETRY_MAX_BACKOFF_MS", 200)
+
+# Compiled read-only serializers on hot GET endpoints (api.fast_serializers).
+FAST_SERIALIZERS = env_bool("FAST_SERIALIZERS", "True")
 
 CACHES = {
     "default": {
@@ -265,6 +342,36 @@ CACHES = {
     }
 }
 
+# CACHE_BACKEND=shared: one memory-mapped cache for all gunicorn workers on
+# the host, so cached responses and throttle counters are not per process.
+# The file takes at most SHARED_CACHE_SIZE_BYTES (tmpfs such as Docker's
+# 64 MB /dev/shm is small); when that is more than the directory has free,
+# the per-process LocMemCache above is kept.
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "/dev/shm/tmdt-cache")
+SHARED_CACHE_SIZE_BYTES = env_int("SHARED_CACHE_SIZE_BYTES", 32 * 1024 * 1024)
+if os.getenv("CACHE_BACKEND", "locmem").lower() == "shared":
+    from api.shared_cache import fits
+
+    if fits(SHARED_CACHE_PATH, SHARED_CACHE_SIZE_BYTES):
+        CACHES["default"] = {
+            "BACKEND": "api.shared_cache.SharedMemoryCache",
+            "LOCATION": SHARED_CACHE_PATH,
+            "OPTIONS": {
+                "MAX_ENTRIES": env_int("SHARED_CACHE_MAX_ENTRIES", 10000),
+                # Larger pickled values are not cached (e.g. unpaginated lists)
+                "MAX_VALUE_SIZE": env_int("SHARED_CACHE_MAX_VALUE_SIZE", 64 * 1024),
+                # File size; split into small / larger value slots (see api.shared_cache)
+                "SIZE_BYTES": SHARED_CACHE_SIZE_BYTES,
+            },
+        }
+    else:
+        import warnings
+
+        warnings.warn(
+            f"{SHARED_CACHE_PATH}: less than SHARED_CACHE_SIZE_BYTES={SHARED_CACHE_SIZE_BYTES} free; "
+            "using the per-process LocMemCache instead of the shared cache"
+        )
+
 # Session settings for load testing
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
 SESSION_CACHE_ALIAS = 'default'
@@ -0,0 +1,101 @@
+"""
+Benchmark the shared-memory cache backend against LocMemCache.
+
+Forks BENCH_WORKERS processes (like gunicorn workers) that each run
+BENCH_OPS read-through operations over BENCH_KEYS keys: get, and set on a
+miss. Prints throughput and the hit ratio per backend. LocMemCache is
+per process, so every worker warms its own copy; the shared backend is
+warmed once for all of them.
+
+    python benchmark_cache.py
+    BENCH_WORKERS=8 BENCH_VALUE_SIZE=4096 python benchmark_cache.py
+"""
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+import django
+
+django.setup()
+
+from django.core.cache.backends.locmem import LocMemCache
+
+from api.shared_cache import SharedMemoryCache
+
+
+def env_int(name, default):
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+WORKERS = env_int("BENCH_WORKERS", multiprocessing.cpu_count())
+OPS = env_int("BENCH_OPS", 50000)
+KEYS = env_int("BENCH_KEYS", 2000)
+VALUE_SIZE = env_int("BENCH_VALUE_SIZE", 1024)
+MAX_ENTRIES = env_int("BENCH_MAX_ENTRIES", 10000)
+
+
+def make_backends(directory):
+    options = {"OPTIONS": {"MAX_ENTRIES": MAX_ENTRIES}}
+    return {
+        "locmem": lambda: LocMemCache("bench-cache", options),
+        "shared": lambda: SharedMemoryCache(
+            os.path.join(directory, "bench-cache"),
+            {"OPTIONS": {"MAX_ENTRIES": MAX_ENTRIES, "MAX_VALUE_SIZE": VALUE_SIZE * 2}},
+        ),
+    }
+
+
+def worker(factory, seed, results):
+    cache = factory()
+    rng = random.Random(seed)
+    value = b"x" * VALUE_SIZE
+    hits = 0
+    start = time.perf_counter()
+    for _ in range(OPS):
+        key = f"bench:{rng.randrange(KEYS)}"
+        if cache.get(key) is None:
+            cache.set(key, value, 300)
+        else:
+            hits += 1
+    results.put((time.perf_counter() - start, hits))
+
+
+def run(factory):
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(factory, seed, results))
+        for seed in range(WORKERS)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    wall = time.perf_counter() - start
+
+    total_ops = OPS * WORKERS
+    hits = sum(hit for _, hit in collected)
+    per_worker = sorted(elapsed for elapsed, _ in collected)
+    return total_ops / wall, hits / total_ops, per_worker[len(per_worker) // 2]
+
+
+def main():
+    print("===== CACHE BACKEND BENCHMARK =====")
+    print(f"Workers: {WORKERS}  ops/worker: {OPS}  keys: {KEYS}  value: {VALUE_SIZE} B")
+    print(f"{'backend':<10}{'ops/s':>14}{'hit ratio':>12}{'median worker s':>18}")
+    with tempfile.TemporaryDirectory(dir="/dev/shm" if os.path.isdir("/dev/shm") else None) as directory:
+        for name, factory in make_backends(directory).items():
+            throughput, hit_ratio, median = run(factory)
+            print(f"{name:<10}{throughput:>14,.0f}{hit_ratio:>12.1%}{median:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
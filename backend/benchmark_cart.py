@@ -0,0 +1,122 @@
+"""
+Benchmark add-to-cart engines: single-statement upsert vs row locking.
+
+Seeds BENCH_USERS users and BENCH_PRODUCTS products (prefixed with
+BENCH_PREFIX), then runs BENCH_THREADS threads that call api.cart.add_to_cart
+for BENCH_SECONDS per engine. Each thread cycles over a few users, so carts
+are shared between threads and rows contend the way they do under
+load_test_cart.py. Prints adds/sec, latency and error counts. Seeded rows are
+removed at the end.
+
+    python benchmark_cart.py
+    BENCH_THREADS=32 BENCH_SECONDS=10 python benchmark_cart.py
+"""
+import os
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection
+
+from api.cart import CART_ENGINE_LOCKING, CART_ENGINE_UPSERT, CartError, add_to_cart
+from api.models import Cart, Product
+
+
+def env_int(name, default):
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+THREADS = env_int("BENCH_THREADS", 16)
+SECONDS = env_int("BENCH_SECONDS", 5)
+USERS = env_int("BENCH_USERS", 8)
+PRODUCTS = env_int("BENCH_PRODUCTS", 4)
+BENCH_PREFIX = "benchcart"
+
+
+def seed():
+    users = [
+        User.objects.create_user(username=f"{BENCH_PREFIX}_{index}", password="bench")
+        for index in range(USERS)
+    ]
+    products = Product.objects.bulk_create(
+        Product(name=f"{BENCH_PREFIX} product {index}", price=1000, stock=1_000_000)
+        for index in range(PRODUCTS)
+    )
+    return users, [product.id for product in products]
+
+
+def run(engine, users, product_ids):
+    Cart.objects.filter(user__in=users).delete()
+    stop = time.perf_counter() + SECONDS
+    latencies = []
+    errors = Counter()
+    lock = threading.Lock()
+
+    def worker(seed_value):
+        rng = random.Random(seed_value)
+        local = []
+        local_errors = Counter()
+        try:
+            while time.perf_counter() < stop:
+                start = time.perf_counter()
+                try:
+                    add_to_cart(rng.choice(users), rng.choice(product_ids), 1, engine=engine)
+                except CartError as exc:
+                    local_errors[exc.status] += 1
+                except DatabaseError:
+                    # deadlock / lock timeout, retried by the view in the API
+                    local_errors[409] += 1
+                local.append(time.perf_counter() - start)
+        finally:
+            connection.close()
+        with lock:
+            latencies.extend(local)
+            errors.update(local_errors)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        "adds_per_sec": count / SECONDS,
+        "median_ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p95_ms": latencies[int(count * 0.95) - 1] * 1000 if latencies else 0,
+        "errors": sum(errors.values()),
+    }
+
+
+def main():
+    print("===== ADD-TO-CART BENCHMARK =====")
+    print(f"Threads: {THREADS}, seconds per engine: {SECONDS}, users: {USERS}, products: {PRODUCTS}")
+
+    users, product_ids = seed()
+    try:
+        print(f"\n{'engine':<10}{'adds/s':>10}{'median ms':>12}{'p95 ms':>10}{'errors':>8}")
+        for engine in (CART_ENGINE_LOCKING, CART_ENGINE_UPSERT):
+            result = run(engine, users, product_ids)
+            print(
+                f"{engine:<10}{result['adds_per_sec']:>10.0f}{result['median_ms']:>12.2f}"
+                f"{result['p95_ms']:>10.2f}{result['errors']:>8}"
+            )
+    finally:
+        User.objects.filter(username__startswith=f"{BENCH_PREFIX}_").delete()
+        Product.objects.filter(name__startswith=f"{BENCH_PREFIX} ").delete()
+
+
+if __name__ == "__main__":
+    main()
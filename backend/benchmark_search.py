@@ -0,0 +1,135 @@
+"""
+Benchmark product search engines: icontains scans vs the full-text GIN index.
+
+Seeds synthetic products (prefixed with BENCH_PREFIX) up to every size in
+BENCH_SEARCH_SIZES, runs the same keyword queries through both engines and
+prints median / p95 latency. Seeded rows are removed at the end unless
+BENCH_KEEP_DATA=true.
+
+    python benchmark_search.py
+    BENCH_SEARCH_SIZES=10000,100000 python benchmark_search.py
+"""
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+import django
+
+django.setup()
+
+from django.db import connection
+
+from api.models import Product
+from api.search import SEARCH_ENGINE_FULLTEXT, SEARCH_ENGINE_ICONTAINS, search_products
+
+
+def env_int(name, default):
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def env_bool(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "y", "on"}
+
+
+SIZES = [
+    int(size)
+    for size in os.getenv("BENCH_SEARCH_SIZES", "10000,100000,1000000").split(",")
+    if size.strip()
+]
+REPEAT = env_int("BENCH_REPEAT", 20)
+BATCH_SIZE = env_int("BENCH_BATCH_SIZE", 5000)
+KEEP_DATA = env_bool("BENCH_KEEP_DATA", False)
+BENCH_PREFIX = "Bench"
+
+BRANDS = ["Apple", "Samsung", "Xiaomi", "Sony", "Dell", "Lenovo", "Asus", "Oppo", "Nokia", "Canon"]
+KINDS = ["Phone", "Laptop", "Tablet", "Camera", "Headphones", "Monitor", "Speaker", "Watch", "Charger", "Keyboard"]
+TAGS = ["Pro", "Max", "Mini", "Ultra", "Lite", "Plus", "Air", "Neo", "Edge", "Prime"]
+
+QUERIES = [
+    "samsung",
+    "laptop pro",
+    "sony camera ultra",
+    "watch",
+    "nonexistent",
+]
+
+random.seed(42)
+
+
+def product_name(index):
+    return (
+        f"{BENCH_PREFIX} {random.choice(BRANDS)} {random.choice(KINDS)} "
+        f"{random.choice(TAGS)} {index}"
+    )
+
+
+def seed_until(target, current):
+    batch = []
+    for index in range(current, target):
+        batch.append(Product(name=product_name(index), price=1000 + index % 5000, stock=100))
+        if len(batch) >= BATCH_SIZE:
+            Product.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+            batch = []
+    if batch:
+        Product.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"ANALYZE {Product._meta.db_table}")
+    return target
+
+
+def time_query(engine, search):
+    timings = []
+    for _ in range(REPEAT):
+        queryset, ranked = search_products(Product.objects.all(), search, engine=engine)
+        queryset = queryset.order_by("-search_rank", "id") if ranked else queryset.order_by("id")
+        start = time.perf_counter()
+        list(queryset.values_list("id", flat=True)[:100])
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main():
+    existing = Product.objects.filter(name__startswith=f"{BENCH_PREFIX} ").count()
+    seeded = existing
+
+    print("===== PRODUCT SEARCH BENCHMARK =====")
+    print(f"Repeat per query: {REPEAT}")
+
+    try:
+        for size in sorted(SIZES):
+            if seeded < size:
+                start = time.perf_counter()
+                seeded = seed_until(size, seeded)
+                print(f"\nSeeded {size} products in {time.perf_counter() - start:.1f}s")
+
+            print(f"\n--- {size} products ---")
+            print(f"{'query':<22}{'engine':<12}{'median ms':>12}{'p95 ms':>12}")
+            for search in QUERIES:
+                for engine in (SEARCH_ENGINE_ICONTAINS, SEARCH_ENGINE_FULLTEXT):
+                    median, p95 = time_query(engine, search)
+                    print(f"{search:<22}{engine:<12}{median:>12.2f}{p95:>12.2f}")
+    finally:
+        if not KEEP_DATA:
+            # Raw DELETE: seeded rows have no dependents and were bulk-created
+            # without statistics signals, so skip the per-row collector.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {Product._meta.db_table} WHERE name LIKE %s",
+                    [f"{BENCH_PREFIX} %"],
+                )
+                deleted = cursor.rowcount
+            print(f"\nRemoved {deleted} benchmark products")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Microbenchmark: DRF serializers vs the compiled read-only fast path.
+
+Builds in-memory rows (no database access) for the hot read serializers and
+prints rows/sec for `Serializer(rows, many=True).data` and for
+`api.fast_serializers.serialize()`, after checking that both render to
+identical JSON.
+
+    python benchmark_serializers.py
+    BENCH_ROWS=50000 python benchmark_serializers.py
+"""
+import os
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+import django
+
+django.setup()
+
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.fast_serializers import compile_serializer, serialize
+from api.models import CartItem, Category, Product, Wishlist
+from api.serializers import (
+    CartItemSerializer,
+    ProductDetailSerializer,
+    ProductSerializer,
+    WishlistSerializer,
+)
+
+
+def env_int(name, default):
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+ROWS = env_int("BENCH_ROWS", 20000)
+REPEAT = env_int("BENCH_REPEAT", 5)
+
+
+def build_rows():
+    now = timezone.now()
+    categories = [Category(id=i, name=f"Category {i}") for i in range(1, 11)]
+    products = [
+        Product(
+            id=i,
+            name=f"Product {i}",
+            price=1000 + i,
+            stock=i % 50,
+            category=categories[i % 10] if i % 7 else None,
+            created_at=now,
+        )
+        for i in range(1, ROWS + 1)
+    ]
+    cart_items = [
+        CartItem(id=i, cart_id=1, product=product, quantity=1 + i % 3)
+        for i, product in enumerate(products, start=1)
+    ]
+    wishlist = [
+        Wishlist(id=i, user_id=1, product=product, created_at=now)
+        for i, product in enumerate(products, start=1)
+    ]
+    return {
+        ProductSerializer: products,
+        ProductDetailSerializer: products,
+        CartItemSerializer: cart_items,
+        WishlistSerializer: wishlist,
+    }
+
+
+def best_rate(func, rows):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func(rows)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(rows) / best
+
+
+def main():
+    render = JSONRenderer().render
+    print("===== SERIALIZER BENCHMARK =====")
+    print(f"Rows: {ROWS}  best of {REPEAT}")
+    print(f"{'serializer':<26}{'drf rows/s':>14}{'fast rows/s':>14}{'speedup':>10}")
+
+    for serializer_class, rows in build_rows().items():
+        compile_serializer(serializer_class)
+        sample = rows[:200]
+        if render(serializer_class(sample, many=True).data) != render(
+            serialize(serializer_class, sample, many=True)
+        ):
+            raise SystemExit(f"{serializer_class.__name__}: output differs")
+
+        drf = best_rate(lambda data: serializer_class(data, many=True).data, rows)
+        fast = best_rate(lambda data: serialize(serializer_class, data, many=True), rows)
+        print(f"{serializer_class.__name__:<26}{drf:>14,.0f}{fast:>14,.0f}{fast / drf:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
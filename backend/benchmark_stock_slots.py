@@ -0,0 +1,123 @@
+"""
+Benchmark checkout on a single hot product, with and without stock slots.
+
+Seeds one product (prefixed with BENCH_PREFIX) with plenty of stock and
+BENCH_USERS users. BENCH_THREADS threads then fill their users' carts with
+one unit of that product and call api.checkout.checkout for BENCH_SECONDS,
+first with the stock on the product row, then with it split across
+BENCH_SLOTS slots (api.stock_slots). Prints checkouts/sec, latency and error
+counts. Seeded rows are removed at the end.
+
+    python benchmark_stock_slots.py
+    BENCH_THREADS=32 BENCH_SLOTS=16 python benchmark_stock_slots.py
+"""
+import os
+import statistics
+import threading
+import time
+from collections import Counter
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection
+
+from api.checkout import CheckoutError, checkout
+from api.models import Cart, CartItem, Order, Product
+from api.stock_slots import shard_product, unshard_product
+
+
+def env_int(name, default):
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+THREADS = env_int("BENCH_THREADS", 16)
+SECONDS = env_int("BENCH_SECONDS", 5)
+SLOTS = env_int("BENCH_SLOTS", 8)
+BENCH_PREFIX = "benchslots"
+
+
+def seed():
+    users = [
+        User.objects.create_user(username=f"{BENCH_PREFIX}_{index}", password="bench")
+        for index in range(THREADS)
+    ]
+    product = Product.objects.create(name=f"{BENCH_PREFIX} hot product", price=1000, stock=10_000_000)
+    return users, product
+
+
+def run(users, product):
+    stop = time.perf_counter() + SECONDS
+    latencies = []
+    errors = Counter()
+    lock = threading.Lock()
+
+    def worker(user):
+        local = []
+        local_errors = Counter()
+        try:
+            cart, _ = Cart.objects.get_or_create(user=user)
+            while time.perf_counter() < stop:
+                CartItem.objects.create(cart=cart, product=product, quantity=1)
+                start = time.perf_counter()
+                try:
+                    checkout(user)
+                except CheckoutError:
+                    local_errors["short"] += 1
+                    CartItem.objects.filter(cart=cart).delete()
+                except DatabaseError:
+                    local_errors["conflict"] += 1
+                    CartItem.objects.filter(cart=cart).delete()
+                local.append(time.perf_counter() - start)
+        finally:
+            connection.close()
+        with lock:
+            latencies.extend(local)
+            errors.update(local_errors)
+
+    threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        "checkouts_per_sec": count / SECONDS,
+        "median_ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p95_ms": latencies[int(count * 0.95) - 1] * 1000 if latencies else 0,
+        "errors": sum(errors.values()),
+    }
+
+
+def main():
+    print("===== HOT PRODUCT CHECKOUT BENCHMARK =====")
+    print(f"Threads: {THREADS}, seconds per mode: {SECONDS}, slots: {SLOTS}")
+
+    users, product = seed()
+    try:
+        print(f"\n{'mode':<12}{'checkouts/s':>13}{'median ms':>12}{'p95 ms':>10}{'errors':>8}")
+        for mode in ("row", "slots"):
+            if mode == "slots":
+                shard_product(product.id, slots=SLOTS)
+            result = run(users, product)
+            print(
+                f"{mode:<12}{result['checkouts_per_sec']:>13.0f}{result['median_ms']:>12.2f}"
+                f"{result['p95_ms']:>10.2f}{result['errors']:>8}"
+            )
+        unshard_product(product.id)
+    finally:
+        Order.objects.filter(user__username__startswith=f"{BENCH_PREFIX}_").delete()
+        User.objects.filter(username__startswith=f"{BENCH_PREFIX}_").delete()
+        Product.objects.filter(name__startswith=f"{BENCH_PREFIX} ").delete()
+
+
+if __name__ == "__main__":
+    main()
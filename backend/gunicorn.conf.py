@@ -8,6 +8,10 @@ backlog = 2048
 
 # Worker processes
 workers = multiprocessing.cpu_count() * 2 + 1
+# Workers share one memory-mapped cache (api.shared_cache) instead of one
+# LocMemCache each; set before the app is preloaded. Settings fall back to
+# LocMemCache when SHARED_CACHE_SIZE_BYTES does not fit in /dev/shm.
+os.environ.setdefault("CACHE_BACKEND", "shared")
 worker_class = "sync"
 worker_connections = 1000
 max_requests = 1000
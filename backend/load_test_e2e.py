@@ -8,6 +8,7 @@ import psutil
 import random
 import re
 import time
+import uuid
 from collections import Counter, defaultdict
 from asgiref.sync import sync_to_async
 
@@ -22,6 +23,7 @@ from django.contrib.auth import get_user_model
 from django.db import connection
 
 from api.models import Category, Product, Wishlist
+from api.product_stats import rebuild_statistics
 
 BASE_URL = "http://127.0.0.1:8000"
 
@@ -32,18 +34,22 @@ REGISTER_ADMIN_URL = f"{BASE_URL}/api/auth/register-admin/"
 ME_URL = f"{BASE_URL}/api/auth/me/"
 
 PRODUCTS_URL = f"{BASE_URL}/api/products/"
+PRODUCT_LOOKUP_URL = f"{PRODUCTS_URL}?search=Load+Test+Product"
 PRODUCT_STATS_URL = f"{BASE_URL}/api/products/statistics/"
+PRODUCT_IMPORT_URL = f"{BASE_URL}/api/products/import/"
 CATEGORIES_URL = f"{BASE_URL}/api/categories/"
 WISHLIST_URL = f"{BASE_URL}/api/wishlist/"
 
 CART_URL = f"{BASE_URL}/api/cart/"
 ORDERS_URL = f"{BASE_URL}/api/orders/"
 PAYMENTS_CREATE_URL = f"{BASE_URL}/api/payments/create/"
+IDEMPOTENT_POST_URLS = {ORDERS_URL, PAYMENTS_CREATE_URL}
 PAYMENTS_STATUS_URL = f"{BASE_URL}/api/payments/"
 PAYMENTS_WEBHOOK_URL = f"{BASE_URL}/api/payments/webhook/"
 
 PERMISSIONS_URL = f"{BASE_URL}/api/permissions/"
 ROLES_URL = f"{BASE_URL}/api/roles/"
+CACHE_STATS_URL = f"{BASE_URL}/api/cache/stats/"
 
 PASSWORD = "123456"
 ADMIN_USERNAME = "loadadmin"
@@ -174,6 +180,8 @@ def seed_bulk_data():
 
     if products:
         Product.objects.bulk_create(products, batch_size=SEED_BATCH_SIZE)
+        # bulk_create bypasses the statistics signals
+        rebuild_statistics()
 
 
 def ensure_required_tables():
@@ -320,7 +328,11 @@ async def request_json(session, method, url, **kwargs):
             # Reset circuit breaker
             CIRCUIT_BREAKER_FAILURES = 0
 
-    read_retries = READ_RETRIES if method in {"GET", "HEAD"} else 0
+    idempotent = method == "POST" and url in IDEMPOTENT_POST_URLS
+    if idempotent:
+        # One key for every attempt, so a retry replays instead of running checkout/payment again
+        kwargs["headers"] = {**kwargs.get("headers", {}), "Idempotency-Key": uuid.uuid4().hex}
+    read_retries = READ_RETRIES if method in {"GET", "HEAD"} or idempotent else 0
     read_attempts = 0
     connect_attempts = 0
     max_total_attempts = max(CONNECT_RETRIES + read_retries + 1, 5)  # Ensure minimum attempts
@@ -433,57 +445,51 @@ async def ensure_category(session, admin_headers, results):
 
 
 async def ensure_products(session, admin_headers, category_id, stock_needed, results):
-    status, data = await request_json(session, "GET", PRODUCTS_URL, headers=admin_headers)
-    results.append(("products_list_admin", status))
-    if status != 200:
-        raise RuntimeError(f"Failed to list products: {data}")
-
-    existing = {item.get("name"): item for item in data}
-    product_ids = []
+    # Unpaginated listings are capped (PRODUCT_LIST_MAX_ROWS); look the load test products up by name.
+    existing = await lookup_products(session, admin_headers, results)
 
+    # Missing products and restocks go out as one NDJSON bulk upsert.
+    rows = []
     for index, name in enumerate(PRODUCT_NAMES, start=1):
         product = existing.get(name)
         if product is None:
-            payload = {
+            rows.append({
                 "name": name,
                 "price": 1000 + index * 100,
                 "stock": stock_needed,
                 "category": category_id,
-            }
-            status, data = await request_json(
-                session,
-                "POST",
-                PRODUCTS_URL,
-                headers=admin_headers,
-                json=payload,
-            )
-            results.append(("products_create_admin", status))
-            if status != 201:
-                raise RuntimeError(f"Failed to create product: {data}")
-            product_ids.append(data["id"])
-            continue
-
-        product_id = product["id"]
-        product_ids.append(product_id)
-        if product.get("stock", 0) < stock_needed:
-            payload = {
+            })
+        elif product.get("stock", 0) < stock_needed:
+            rows.append({
+                "id": product["id"],
                 "name": product["name"],
                 "price": product["price"],
                 "stock": stock_needed,
                 "category": category_id,
-            }
-            status, data = await request_json(
-                session,
-                "PUT",
-                f"{PRODUCTS_URL}{product_id}/",
-                headers=admin_headers,
-                json=payload,
-            )
-            results.append(("products_update_admin", status))
-            if status != 200:
-                raise RuntimeError(f"Failed to update product stock: {data}")
+            })
+
+    if rows:
+        status, data = await request_json(
+            session,
+            "POST",
+            PRODUCT_IMPORT_URL,
+            headers={**admin_headers, "Content-Type": "application/x-ndjson"},
+            data="\n".join(json.dumps(row) for row in rows),
+        )
+        results.append(("products_import_admin", status))
+        if status != 200 or not isinstance(data, dict) or data.get("error_count"):
+            raise RuntimeError(f"Failed to import products: {data}")
+        existing = await lookup_products(session, admin_headers, results)
 
-    return product_ids
+    return [existing[name]["id"] for name in PRODUCT_NAMES]
+
+
+async def lookup_products(session, admin_headers, results):
+    status, data = await request_json(session, "GET", PRODUCT_LOOKUP_URL, headers=admin_headers)
+    results.append(("products_list_admin", status))
+    if status != 200:
+        raise RuntimeError(f"Failed to list products: {data}")
+    return {item.get("name"): item for item in data}
 
 
 def load_product_ids(min_stock):
@@ -1080,6 +1086,9 @@ async def main():
             )
             admin_results.append(("permissions_delete_update_order_status", status))
 
+        status, cache_stats = await request_json(session, "GET", CACHE_STATS_URL, headers=admin_headers)
+        admin_results.append(("cache_stats_admin", status))
+
     duration = time.time() - start
 
     # Final memory optimization
@@ -1111,6 +1120,11 @@ async def main():
     print("Status breakdown:")
     for key in sorted(counters.keys()):
         print(f"- {key}: {dict(counters[key])}")
+    if isinstance(cache_stats, dict) and cache_stats:
+        # Counters live in the Django cache: per worker unless the cache is shared
+        print("Response cache:")
+        for view_name in sorted(cache_stats):
+            print(f"- {view_name}: {cache_stats[view_name]}")
     if LOG_ERROR_SAMPLES and ERROR_SAMPLES:
         print("Error samples:")
         for key in sorted(ERROR_SAMPLES.keys()):
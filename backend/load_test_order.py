@@ -70,7 +70,8 @@ async def get_admin_token(session):
 
 
 async def ensure_products(session, admin_headers, stock_needed):
-    async with session.get(PRODUCTS_URL) as r:
+    # Unpaginated listings are capped (PRODUCT_LIST_MAX_ROWS); look the load test products up by name.
+    async with session.get(PRODUCTS_URL, params={"search": "Load Test Product"}) as r:
         products = await r.json()
         if r.status != 200:
             raise RuntimeError(f"Failed to list products: {products}")